@@ -0,0 +1,198 @@
+"""
+Local recommendation tier
+
+A curated catalog of learning resources, practice projects, durations and
+success metrics per skill. Plans for catalogued skills are built from
+templates in microseconds; only uncovered skills (or actions HR flags for
+more detail) go to Gemini.
+"""
+from ai_engine.skill_matcher import normalize_skill
+
+# normalized skill -> (course, practice project, weeks for a mid-level employee, metric)
+SKILL_CATALOG = {
+    'python': ('the "Python for Everybody" specialization or an equivalent internal Python course',
+               'automate a recurring team task with a tested Python script',
+               8, 'Script in production use with unit tests and a peer code review passed'),
+    'javascript': ('a modern JavaScript (ES6+) course covering async code and modules',
+                   'build a small interactive feature in one of the team\'s web apps',
+                   8, 'Feature merged to the main branch with no review rework on language basics'),
+    'typescript': ('the official TypeScript handbook and a typed-refactoring workshop',
+                   'convert an existing JavaScript module to strict TypeScript',
+                   6, 'Module compiles under strict mode with zero `any` types'),
+    'react': ('a React fundamentals course covering hooks and state management',
+              'ship a reusable React component with tests',
+              8, 'Component used in two screens with test coverage above 80%'),
+    'angular': ('an Angular fundamentals course covering components, services and RxJS',
+                'implement a feature module with routing in an Angular app',
+                10, 'Feature module released and reviewed by an Angular maintainer'),
+    'vue': ('the Vue.js official guide and a composition API course',
+            'build a small Vue single-page tool for the team',
+            8, 'Tool deployed and used by the team for one sprint'),
+    'node.js': ('a Node.js backend course covering Express, async I/O and error handling',
+                'build a small REST service in Node.js with automated tests',
+                8, 'Service deployed to a test environment with passing CI'),
+    'java': ('a Java SE course through collections, streams and concurrency',
+             'implement a backlog ticket in a Java service end to end',
+             10, 'Two Java changes merged with reviewer sign-off'),
+    'spring': ('a Spring Boot course covering dependency injection, data and testing',
+               'build a CRUD microservice with Spring Boot',
+               8, 'Microservice passes integration tests and a design review'),
+    'go': ('the "Tour of Go" and an intermediate Go concurrency course',
+           'write a small command-line tool or service in Go',
+           8, 'Tool released internally with documentation and tests'),
+    'sql': ('an intermediate SQL course covering joins, window functions and indexing',
+            'write and optimize five reporting queries against a team database',
+            6, 'Queries in use and each runs under agreed performance targets'),
+    'postgresql': ('a PostgreSQL administration and query tuning course',
+                   'analyze and tune the slowest queries of one application with EXPLAIN',
+                   6, 'Measured latency improvement on at least three production queries'),
+    'mysql': ('a MySQL performance and schema design course',
+              'design and migrate a schema change for an existing MySQL database',
+              6, 'Migration applied without downtime and reviewed by a DBA'),
+    'mongodb': ('MongoDB University developer path',
+                'model and implement a document collection for a real feature',
+                6, 'Collection in use with indexes validated against query patterns'),
+    'redis': ('a Redis fundamentals course covering data types and caching patterns',
+              'add a Redis cache to a slow endpoint',
+              4, 'Endpoint latency reduced by 50% with cache hit rate tracked'),
+    'git': ('a Git course covering branching, rebasing and conflict resolution',
+            'follow the team branching workflow for all changes for a sprint',
+            3, 'Sprint completed with clean history and no broken merges'),
+    'rest apis': ('an API design course covering REST conventions, versioning and errors',
+                  'design and document a REST endpoint with an OpenAPI spec',
+                  6, 'Endpoint spec approved in API review and implemented'),
+    'docker': ('a Docker course covering images, multi-stage builds and compose',
+               'containerize an existing service and run it locally with compose',
+               4, 'Service image builds in CI and runs with documented compose setup'),
+    'kubernetes': ('a Kubernetes course preparing for the CKAD certification',
+                   'deploy a service to a test cluster with health checks and autoscaling',
+                   12, 'CKAD passed or service deployed with working probes and HPA'),
+    'linux': ('a Linux system administration course (LFCS level)',
+              'take over routine Linux maintenance tasks for one environment',
+              8, 'Handle five operational tickets on Linux hosts independently'),
+    'aws': ('AWS Cloud Practitioner followed by Solutions Architect Associate preparation',
+            'deploy a small service on AWS using managed services',
+            12, 'AWS certification earned and service running in a sandbox account'),
+    'azure': ('Microsoft Azure Fundamentals (AZ-900) and AZ-104 preparation',
+              'deploy a small workload to Azure with infrastructure as code',
+              12, 'Azure certification earned and workload documented'),
+    'gcp': ('Google Cloud Digital Leader and Associate Cloud Engineer preparation',
+            'deploy a small workload to Google Cloud',
+            12, 'GCP certification earned and workload documented'),
+    'terraform': ('HashiCorp Terraform Associate preparation',
+                  'codify an existing piece of manually managed infrastructure in Terraform',
+                  8, 'Terraform module merged and applied through CI'),
+    'ci/cd': ('a CI/CD pipelines course covering build, test and deployment stages',
+              'add automated tests and deployment to one project pipeline',
+              6, 'Pipeline deploys automatically with tests gating every merge'),
+    'monitoring': ('an observability course covering metrics, logs, traces and alerting',
+                   'build a dashboard and alerts for one production service',
+                   6, 'Dashboard in use and alerts tuned to zero false pages for a month'),
+    'machine learning': ('Andrew Ng\'s Machine Learning Specialization',
+                         'train and evaluate a model on a real business dataset',
+                         16, 'Model beats the agreed baseline and results presented to stakeholders'),
+    'deep learning': ('the Deep Learning Specialization',
+                      'fine-tune a pretrained model for a team use case',
+                      16, 'Model evaluated on a held-out set and write-up reviewed'),
+    'statistics': ('an applied statistics course covering inference, regression and A/B testing',
+                   'design and analyze an A/B test or statistical study for the team',
+                   10, 'Analysis reviewed by a senior analyst and used in a decision'),
+    'data visualization': ('a data visualization course covering chart choice and storytelling',
+                           'build a dashboard answering a recurring business question',
+                           6, 'Dashboard adopted by its audience and reviewed for clarity'),
+    'pandas': ('a pandas course covering indexing, groupby, merges and time series',
+               'replace a manual spreadsheet workflow with a pandas notebook',
+               4, 'Notebook produces the same results as the manual process in a fraction of the time'),
+    'numpy': ('a NumPy course covering arrays, broadcasting and vectorization',
+              'vectorize a slow loop-based computation in an existing script',
+              4, 'Computation at least 10x faster with identical results'),
+    'spark': ('a Spark course covering DataFrames, partitioning and tuning',
+              'port a large batch job to Spark',
+              8, 'Job runs on the full dataset within the agreed time window'),
+    'excel': ('an advanced Excel course covering pivot tables, lookups and Power Query',
+              'rebuild a team report with pivot tables and Power Query',
+              3, 'Report refreshes in one click and is used by the team'),
+    'tableau': ('Tableau Desktop Specialist preparation',
+                'publish a Tableau dashboard for a team KPI',
+                6, 'Certification earned or dashboard published and in use'),
+    'power bi': ('Microsoft PL-300 (Power BI Data Analyst) preparation',
+                 'publish a Power BI report for a team KPI',
+                 6, 'Certification earned or report published and in use'),
+    'html': ('an HTML and accessibility fundamentals course',
+             'build an accessible page or form for an internal tool',
+             3, 'Page passes an automated accessibility audit'),
+    'css': ('a modern CSS course covering flexbox, grid and responsive design',
+            'implement a responsive layout for an internal page',
+            4, 'Layout works on mobile and desktop and passes design review'),
+    'agile': ('an Agile fundamentals course',
+              'actively participate in planning and retrospectives and propose one process improvement',
+              4, 'Improvement adopted by the team'),
+    'scrum': ('Professional Scrum Master I preparation',
+              'facilitate sprint ceremonies for one sprint',
+              6, 'PSM I certification earned or ceremonies facilitated with positive team feedback'),
+    'project management': ('a project management course (CAPM or PRINCE2 Foundation level)',
+                           'plan and run a small cross-team project',
+                           12, 'Project delivered on time with a documented plan and retrospective'),
+    'communication': ('a business communication and presentation skills workshop',
+                      'present a technical topic at a team or department meeting',
+                      6, 'Two presentations given with positive feedback from attendees'),
+    'leadership': ('a leadership development program for new leads',
+                   'mentor a junior colleague and lead one team initiative',
+                   12, 'Initiative delivered and mentee feedback collected'),
+    'security': ('a secure development course covering the OWASP Top 10',
+                 'run a threat model and fix the findings for one service',
+                 8, 'Threat model documented and all high findings resolved'),
+    'testing': ('a software testing course covering unit, integration and test design',
+                'raise automated test coverage of one module',
+                6, 'Module coverage above 80% with tests running in CI'),
+}
+
+
+def catalog_entry(skill):
+    """Catalog entry for a skill (after alias normalization), or None if uncovered"""
+    return SKILL_CATALOG.get(normalize_skill(skill))
+
+
+def _timeline(weeks, experience):
+    # Experienced employees ramp up faster, juniors get extra time
+    if (experience or 0) >= 5:
+        weeks = weeks * 0.75
+    elif (experience or 0) < 2:
+        weeks = weeks * 1.25
+    weeks = max(2, round(weeks))
+    if weeks >= 12:
+        return f'{round(weeks / 4.3)} months'
+    return f'{weeks} weeks'
+
+
+def local_recommendation(user, target_role, skill):
+    """
+    Build a SMART action from the catalog
+
+    Returns:
+        SMART action dictionary, or None if the skill is not catalogued
+    """
+    entry = catalog_entry(skill)
+    if entry is None:
+        return None
+    course, project, weeks, metric = entry
+    return {
+        'skill_gap': skill,
+        'action': f'Complete {course}, then {project} to apply {skill} in the {target_role} role.',
+        'timeline': _timeline(weeks, user.experience),
+        'metric': metric,
+        'status': 'pending',
+        'source': 'catalog'
+    }
+
+
+def template_recommendation(skill):
+    """Generic placeholder action for an uncovered skill, to be enriched by Gemini"""
+    return {
+        'skill_gap': skill,
+        'action': f'Complete online course or certification in {skill}. Practice through hands-on projects.',
+        'timeline': '3 months',
+        'metric': f'Earn certification and complete 2 practical projects using {skill}',
+        'status': 'pending',
+        'source': 'template'
+    }
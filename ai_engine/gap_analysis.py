@@ -1,14 +1,27 @@
-def analyze_skill_gap(user_skills, required_skills):
+import re
+
+import numpy as np
+
+
+DEFAULT_MATCH_THRESHOLD = 0.7  # Minimum similarity for a partial-credit match
+
+
+def analyze_skill_gap(user_skills, required_skills, matcher=None, threshold=DEFAULT_MATCH_THRESHOLD):
     """
     Analyze the gap between user skills and required skills
     
     Args:
         user_skills: List of current user skills
         required_skills: List of required skills for target role
+        matcher: SkillMatcher for similarity matching (exact matching if None)
+        threshold: Minimum similarity that counts as having the skill
     
     Returns:
         Dictionary with gap analysis results
     """
+    if matcher is not None:
+        return _analyze_with_matcher(user_skills, required_skills, matcher, threshold)
+    
     user_skills_lower = [skill.lower().strip() for skill in user_skills]
     required_skills_lower = [skill.lower().strip() for skill in required_skills]
     
@@ -26,22 +39,84 @@ def analyze_skill_gap(user_skills, required_skills):
     return {
         'missing_skills': missing_skills,
         'matching_skills': matching_skills,
+        'partial_matches': [],
         'gap_percentage': round(gap_percentage, 2),
         'total_required': total_required,
         'skills_acquired': len(matching_skills)
     }
 
 
-def prioritize_skills(missing_skills, user_goal=None):
+def _analyze_with_matcher(user_skills, required_skills, matcher, threshold):
+    # One batched similarity query: required skills x user skills
+    scores = matcher.similarity(required_skills, user_skills)
+    best = scores.argmax(axis=1) if len(user_skills) else np.zeros(len(required_skills), dtype=int)
+    best_scores = scores.max(axis=1) if len(user_skills) else np.zeros(len(required_skills))
+    
+    missing_skills, matching_skills, partial_matches = [], [], []
+    credit = 0.0
+    for i, skill in enumerate(required_skills):
+        score = float(best_scores[i])
+        if score >= 0.999:
+            matching_skills.append(skill)
+            credit += 1
+        elif score >= threshold:
+            matching_skills.append(skill)
+            partial_matches.append({
+                'required': skill,
+                'matched_by': user_skills[best[i]],
+                'score': round(score, 2)
+            })
+            credit += score
+        else:
+            missing_skills.append(skill)
+    
+    total_required = len(required_skills)
+    gap_percentage = ((total_required - credit) / total_required * 100) if total_required > 0 else 0
+    
+    return {
+        'missing_skills': missing_skills,
+        'matching_skills': matching_skills,
+        'partial_matches': partial_matches,
+        'gap_percentage': round(gap_percentage, 2),
+        'total_required': total_required,
+        'skills_acquired': len(matching_skills)
+    }
+
+
+GOAL_BOOST = 0.5  # Extra weight for skills mentioned in the employee's goal
+
+
+def prioritize_skills(missing_skills, user_goal=None, skill_weights=None, skill_demand=None, limit=5):
     """
     Prioritize skills based on importance and user goals
     
+    Each missing skill is scored as
+        role weight * (1 + org demand) * (1 + scarcity) * (1 + goal boost)
+    and the highest scores come first. Ties keep the role's listed order.
+    
     Args:
         missing_skills: List of skills the user is missing
         user_goal: User's career goal (optional)
+        skill_weights: Lowercased skill -> role weight (default 1.0)
+        skill_demand: Lowercased skill -> (demand, scarcity), both 0-1
+        limit: Maximum number of skills to return
     
     Returns:
         Ordered list of prioritized skills
     """
-    # For now, return as-is. Can be enhanced with ML-based prioritization
-    return missing_skills[:5]  # Limit to top 5 for focused development
+    if not missing_skills:
+        return []
+    
+    skill_weights = skill_weights or {}
+    skill_demand = skill_demand or {}
+    goal = (user_goal or '').lower()
+    keys = [skill.lower().strip() for skill in missing_skills]
+    
+    weights = np.array([skill_weights.get(k, 1.0) for k in keys], dtype=float)
+    demand_scarcity = np.array([skill_demand.get(k, (0.0, 0.0)) for k in keys], dtype=float).reshape(-1, 2)
+    in_goal = np.array([bool(goal) and re.search(r'(?<!\w)' + re.escape(k) + r'(?!\w)', goal) is not None
+                        for k in keys], dtype=float)
+    
+    scores = weights * (1 + demand_scarcity[:, 0]) * (1 + demand_scarcity[:, 1]) * (1 + GOAL_BOOST * in_goal)
+    order = np.argsort(-scores, kind='stable')[:limit]
+    return [missing_skills[i] for i in order]
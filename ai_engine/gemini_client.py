@@ -1,6 +1,15 @@
 import google.generativeai as genai
 from flask import current_app
 
+def reported_usage(response):
+    """Token counts from a response's usage metadata ({} if the SDK does not report them)"""
+    try:
+        metadata = response.usage_metadata
+        return {'prompt_tokens': metadata.prompt_token_count,
+                'response_tokens': metadata.candidates_token_count}
+    except (AttributeError, ValueError):
+        return {}
+
 class GeminiClient:
     def __init__(self):
         self.model = None
@@ -15,8 +24,8 @@ class GeminiClient:
             print(f"Error initializing Gemini: {e}")
             return False
     
-    def generate_content(self, prompt):
-        """Generate content using Gemini API"""
+    def generate_content(self, prompt, usage=None):
+        """Generate content using Gemini API; reported token counts are added to `usage`"""
         try:
             if not self.model:
                 api_key = current_app.config.get('GEMINI_API_KEY')
@@ -24,9 +33,28 @@ class GeminiClient:
                     return None
             
             response = self.model.generate_content(prompt)
+            if usage is not None:
+                usage.update(reported_usage(response))
             return response.text
         except Exception as e:
             print(f"Error generating content: {e}")
             return None
 
+    def stream_content(self, prompt, usage=None):
+        """Yield response text chunks as Gemini produces them (nothing on failure)"""
+        try:
+            if not self.model:
+                api_key = current_app.config.get('GEMINI_API_KEY')
+                if not self.initialize(api_key):
+                    return
+            
+            response = self.model.generate_content(prompt, stream=True)
+            for chunk in response:
+                if chunk.text:
+                    yield chunk.text
+            if usage is not None:
+                usage.update(reported_usage(response))
+        except Exception as e:
+            print(f"Error streaming content: {e}")
+
 gemini_client = GeminiClient()
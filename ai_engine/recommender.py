@@ -1,46 +1,208 @@
+import hashlib
+import json
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
 from ai_engine.gemini_client import gemini_client
 from ai_engine.gap_analysis import analyze_skill_gap, prioritize_skills
+from ai_engine.skill_stats import get_skill_demand
+from ai_engine.skill_matcher import get_skill_matcher, normalize_skill
+from ai_engine.catalog import local_recommendation, template_recommendation
+from models.models import db, User, IDP
+from services.metrics import metrics
+from services.gemini_usage import estimate_tokens, check_quota, record_usage
 
-def generate_smart_recommendations(user, target_role, required_skills):
+# Bump when the prompt, catalog or prioritization changes so unchanged inputs get a fresh plan
+PROMPT_VERSION = 2
+# Attempts to save an enriched plan while the employee keeps updating the IDP
+ENRICH_SAVE_ATTEMPTS = 3
+
+def generate_smart_recommendations(user, target_role, required_skills, skill_weights=None):
     """
-    Generate SMART IDP recommendations using Gemini API
+    Generate SMART IDP recommendations from the local skill catalog
+    
+    No Gemini call is made here: catalogued skills get a curated action and the
+    rest a template action (source 'template') for enrich_idps to improve later.
     
     Args:
         user: User object with current skills and profile
         target_role: Target role name
         required_skills: List of required skills for target role
+        skill_weights: Lowercased skill -> weight for the target role (optional)
     
     Returns:
-        List of SMART action dictionaries
+        List of SMART action dictionaries, each with a 'source'
     """
-    # Perform gap analysis
-    user_skills = user.get_skills_list()
-    gap_analysis = analyze_skill_gap(user_skills, required_skills)
+    priority_skills = prioritize_gaps(user, required_skills, skill_weights)
+    
+    if not priority_skills:
+        return [no_gap_recommendation(user, target_role)]
+    
+    recommendations = [
+        local_recommendation(user, target_role, skill) or template_recommendation(skill)
+        for skill in priority_skills
+    ]
+    for rec in recommendations:
+        metrics.inc('idp_actions_total', source=rec['source'])
+    return recommendations
+
+
+def prioritize_gaps(user, required_skills, skill_weights=None):
+    """
+    Find the employee's missing skills and keep the highest-impact ones
+    
+    Args:
+        user: User object with current skills and profile
+        required_skills: List of required skills for target role
+        skill_weights: Lowercased skill -> weight for the target role (optional)
+    
+    Returns:
+        List of at most IDP_MAX_LLM_SKILLS missing skills, empty if there is no gap
+    """
+    gap_analysis = analyze_skill_gap(
+        user.get_skills_list(),
+        required_skills,
+        matcher=get_skill_matcher(),
+        threshold=current_app.config.get('SKILL_MATCH_THRESHOLD', 0.7)
+    )
     
     if not gap_analysis['missing_skills']:
-        return [{
-            'skill_gap': 'No significant gaps found',
-            'action': f'Continue developing expertise in {", ".join(user_skills[:3])} to excel in {target_role} role.',
-            'timeline': '3-6 months',
-            'metric': 'Complete advanced certifications or lead complex projects',
-            'status': 'pending'
-        }]
-    
-    # Prioritize skills
-    priority_skills = prioritize_skills(gap_analysis['missing_skills'], user.goal)
-    
-    # Generate SMART recommendations using Gemini
-    recommendations = []
-    
-    for skill in priority_skills[:3]:  # Limit to top 3 for focused development
-        prompt = f"""
+        return []
+    
+    # Prioritize skills by role weight, org-wide demand/scarcity and the employee's goal
+    return prioritize_skills(
+        gap_analysis['missing_skills'],
+        user.goal,
+        skill_weights=skill_weights,
+        skill_demand=get_skill_demand(gap_analysis['missing_skills']),
+        limit=current_app.config.get('IDP_MAX_LLM_SKILLS', 3)
+    )
+
+
+def input_fingerprint(user, target_role, required_skills, skill_weights=None):
+    """
+    Hash of everything that shapes a generated plan
+    
+    Args:
+        user: User object with current skills and profile
+        target_role: Target role name
+        required_skills: List of required skills for target role
+        skill_weights: Lowercased skill -> weight for the target role (optional)
+    
+    Returns:
+        Hex SHA-256 digest; equal digests produce equivalent plans
+    """
+    payload = {
+        'skills': sorted({normalize_skill(s) for s in user.get_skills_list()}),
+        'experience': user.experience or 0,
+        'goal': (user.goal or '').strip().lower(),
+        'current_role': user.current_role or '',
+        'target_role': target_role or '',
+        'required_skills': sorted({normalize_skill(s) for s in required_skills}),
+        'skill_weights': sorted((skill_weights or {}).items()),
+        'max_skills': current_app.config.get('IDP_MAX_LLM_SKILLS', 3),
+        'prompt_version': PROMPT_VERSION,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def find_generated_plan(user_id, fingerprint=None, idempotency_key=None):
+    """
+    Existing, non-superseded IDPs created by the same submission or from the same inputs
+    
+    Returns:
+        List of IDP objects (empty if there is none)
+    """
+    query = IDP.query.filter(IDP.user_id == user_id, IDP.status != 'superseded')
+    if idempotency_key:
+        plan = query.filter(IDP.idempotency_key == idempotency_key).order_by(IDP.id).all()
+        if plan:
+            return plan
+    if fingerprint:
+        return query.filter(IDP.input_fingerprint == fingerprint).order_by(IDP.id).all()
+    return []
+
+
+def supersede_generated_plans(user_id):
+    """
+    Mark the employee's earlier generated IDPs that have not been started as superseded
+    
+    Manual IDPs and IDPs already in progress or completed are kept. Superseded
+    rows release their active_fingerprint, so the same inputs can be planned again.
+    
+    Returns:
+        Number of IDPs superseded
+    """
+    stale = IDP.query.filter(
+        IDP.user_id == user_id,
+        IDP.status == 'pending',
+        IDP.input_fingerprint.isnot(None)
+    ).all()
+    for idp in stale:
+        idp.status = 'superseded'
+        idp.active_fingerprint = None
+    return len(stale)
+
+
+def no_gap_recommendation(user, target_role):
+    return {
+        'skill_gap': 'No significant gaps found',
+        'action': f'Continue developing expertise in {", ".join(user.get_skills_list()[:3])} to excel in {target_role} role.',
+        'timeline': '3-6 months',
+        'metric': 'Complete advanced certifications or lead complex projects',
+        'status': 'pending',
+        'source': 'catalog'
+    }
+
+
+def _shorten(text, max_chars):
+    """Whitespace-normalized text cut at a word boundary to at most max_chars"""
+    text = ' '.join((text or '').split())
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars].rsplit(' ', 1)[0] or text[:max_chars]
+    return cut + '...'
+
+
+def build_prompt(user, target_role, skill):
+    """
+    Prompt for one skill gap, trimmed to GEMINI_PROMPT_TOKEN_BUDGET
+    
+    The skills list is capped at GEMINI_PROMPT_MAX_SKILLS (in the employee's
+    order, duplicates removed) and the goal at GEMINI_PROMPT_MAX_GOAL_CHARS.
+    If the prompt is still over budget, skills are dropped from the end, then
+    the goal is halved, so the same profile always yields the same prompt.
+    """
+    config = current_app.config
+    budget = config.get('GEMINI_PROMPT_TOKEN_BUDGET', 512)
+    skills = list(dict.fromkeys(user.get_skills_list()))
+    listed = skills[:config.get('GEMINI_PROMPT_MAX_SKILLS', 25)]
+    goal = _shorten(user.goal or 'Professional growth', config.get('GEMINI_PROMPT_MAX_GOAL_CHARS', 300))
+    
+    while True:
+        skills_text = ', '.join(listed)
+        if len(listed) < len(skills):
+            skills_text += f' (and {len(skills) - len(listed)} more)'
+        prompt = render_prompt(user, target_role, skill, skills_text, goal)
+        if estimate_tokens(prompt) <= budget:
+            return prompt
+        if len(listed) > 1:
+            listed = listed[:-1]
+        elif len(goal) > 40:
+            goal = _shorten(goal, len(goal) // 2)
+        else:
+            return prompt
+
+
+def render_prompt(user, target_role, skill, skills_text, goal):
+    return f"""
 You are an expert HR career development advisor. Generate a SMART (Specific, Measurable, Actionable, Relevant, Time-bound) development action for the following:
 
 Employee Profile:
-- Current Skills: {', '.join(user_skills)}
+- Current Skills: {skills_text}
 - Experience: {user.experience} years
 - Current Role: {user.current_role or 'Not specified'}
-- Career Goal: {user.goal or 'Professional growth'}
+- Career Goal: {goal}
 
 Target Role: {target_role}
 Skill Gap Identified: {skill}
@@ -53,24 +215,170 @@ Metric: [Measurable success criteria]
 
 Be specific, practical, and focused on real-world application. Keep the response concise and actionable.
 """
-        
-        response = gemini_client.generate_content(prompt)
-        
-        if response:
-            # Parse the response
-            action_dict = parse_gemini_response(response, skill)
-            recommendations.append(action_dict)
-        else:
-            # Fallback if API fails
-            recommendations.append({
-                'skill_gap': skill,
-                'action': f'Complete online course or certification in {skill}. Practice through hands-on projects.',
-                'timeline': '3 months',
-                'metric': f'Earn certification and complete 2 practical projects using {skill}',
-                'status': 'pending'
-            })
+
+
+def llm_recommendation(user, target_role, skill, on_chunk=None):
+    """
+    Ask Gemini for a detailed SMART action for a single skill gap
     
-    return recommendations
+    Args:
+        user: User object with current skills and profile
+        target_role: Target role name
+        skill: The missing skill
+        on_chunk: Called with each text chunk as it streams from Gemini (optional);
+                  without it the response is fetched in one call
+    
+    Returns:
+        SMART action dictionary, or None if the API call failed or a quota refused it
+    """
+    prompt = build_prompt(user, target_role, skill)
+    prompt_tokens = estimate_tokens(prompt)
+    refusal = check_quota(user.company_id, prompt_tokens)
+    if refusal:
+        current_app.logger.warning('Gemini call for company %s skipped: %s', user.company_id, refusal)
+        record_usage(user.company_id, rejected=True)
+        return None
+    metrics.inc('gemini_calls_total')
+    
+    usage = {}
+    if on_chunk:
+        chunks = []
+        for chunk in gemini_client.stream_content(prompt, usage=usage):
+            chunks.append(chunk)
+            on_chunk(chunk)
+        response = ''.join(chunks)
+    else:
+        response = gemini_client.generate_content(prompt, usage=usage)
+    
+    record_usage(
+        user.company_id,
+        prompt_tokens=usage.get('prompt_tokens', prompt_tokens if response else 0),
+        response_tokens=usage.get('response_tokens', estimate_tokens(response)),
+        estimated=bool(response) and 'prompt_tokens' not in usage,
+        failed=not response
+    )
+    if not response:
+        metrics.inc('gemini_failures_total')
+        return None
+    
+    rec = parse_gemini_response(response, skill)
+    rec['source'] = 'llm'
+    return rec
+
+
+def stream_idp_generation(job, user_id, target_role, required_skills, skill_weights=None,
+                          fingerprint=None, idempotency_key=None):
+    """
+    Background job: generate an IDP skill by skill, saving and emitting each action
+    
+    Catalogued skills are saved first and appear immediately; uncovered skills
+    are streamed from Gemini. Emits 'plan' with the prioritized skills, 'delta'
+    for each streamed text chunk, 'action' once a skill's IDP row is committed
+    and 'done' at the end, with `duplicate` set if a concurrent submission
+    already saved a plan for the same inputs.
+    
+    Args:
+        job: services.jobs.Job receiving the events
+        user_id: Employee id
+        target_role: Target role name
+        required_skills: List of required skills for target role
+        skill_weights: Lowercased skill -> weight for the target role (optional)
+        fingerprint: input_fingerprint stored on each saved IDP (optional)
+        idempotency_key: Submission key stored on each saved IDP (optional)
+    """
+    user = User.query.get(user_id)
+    priority_skills = prioritize_gaps(user, required_skills, skill_weights)
+    job.emit('plan', {'skills': priority_skills or ['No significant gaps found']})
+    
+    local = [(skill, local_recommendation(user, target_role, skill)) for skill in priority_skills]
+    uncovered = [skill for skill, rec in local if rec is None]
+    
+    def recommendations():
+        if not priority_skills:
+            yield no_gap_recommendation(user, target_role)
+        for skill, rec in local:
+            if rec is not None:
+                yield rec
+        for skill in uncovered:
+            yield llm_recommendation(
+                user, target_role, skill,
+                on_chunk=lambda text, skill=skill: job.emit('delta', {'skill': skill, 'text': text})
+            ) or template_recommendation(skill)
+    
+    # The old plan is replaced in the same commit as the first new action
+    supersede_generated_plans(user.id)
+    
+    count = 0
+    for rec in recommendations():
+        # Commit each row as soon as it is ready so nothing is lost if the job dies
+        idp = IDP(user_id=user.id, input_fingerprint=fingerprint, idempotency_key=idempotency_key,
+                  active_fingerprint=fingerprint if count == 0 else None, **rec)
+        db.session.add(idp)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Another worker saved the first action for the same inputs first; keep its plan
+            db.session.rollback()
+            job.emit('done', {'count': 0, 'duplicate': True})
+            return
+        metrics.inc('idp_actions_total', source=rec['source'])
+        if count == 0:
+            metrics.observe('idp_first_action_seconds', job.elapsed())
+        job.emit('action', {'id': idp.id, **rec})
+        count += 1
+    
+    metrics.observe('idp_generation_seconds', job.elapsed())
+    job.emit('done', {'count': count})
+
+
+def enrich_idps(job, idp_ids):
+    """
+    Background job: replace catalog/template actions with detailed Gemini plans
+    
+    Args:
+        job: services.jobs.Job receiving an 'action' event per enriched IDP
+        idp_ids: IDs of the IDPs to enrich
+    """
+    enriched = 0
+    for idp in IDP.query.filter(IDP.id.in_(idp_ids)).order_by(IDP.id).all():
+        user = idp.user
+        rec = llm_recommendation(user, user.target_role or user.current_role or 'their target role', idp.skill_gap)
+        if rec is None:
+            continue
+        if not _save_enrichment(idp, rec):
+            continue
+        job.emit('action', {'id': idp.id, **rec})
+        enriched += 1
+    
+    job.emit('done', {'count': enriched})
+
+
+def _save_enrichment(idp, rec):
+    """
+    Replace the IDP's plan text with rec
+    
+    The employee may save progress on the IDP while Gemini is answering. Their
+    fields do not overlap with the plan text, so after a version conflict the
+    text is applied again to the latest version instead of dropping the answer.
+    
+    Returns:
+        False if the IDP was deleted or kept changing, True once saved
+    """
+    idp_id = idp.id
+    for _ in range(ENRICH_SAVE_ATTEMPTS):
+        idp.action = rec['action']
+        idp.timeline = rec['timeline']
+        idp.metric = rec['metric']
+        idp.source = 'llm'
+        try:
+            db.session.commit()
+            return True
+        except StaleDataError:
+            db.session.rollback()
+            idp = db.session.get(IDP, idp_id)
+            if idp is None:
+                return False
+    return False
 
 
 def parse_gemini_response(response_text, skill):
@@ -0,0 +1,294 @@
+"""
+Suggested roles: rank every Role for each employee
+
+Employees and roles are mapped onto one skill vocabulary. Employee skills form
+a sparse binary matrix E (employees x skills) and role requirements a sparse
+matrix W (skills x roles) whose columns are the role's skill weights scaled to
+sum to 1, so E @ W is each employee's weighted coverage of each role. The
+score blends coverage with experience fit (experience relative to the average
+of people already in the role), and the top-k per employee is taken with a
+partial sort. Results are stored in role_suggestions, one row per
+(employee, rank), and upserted when a profile is saved, by the pipeline and by
+`flask skills suggest-roles`. Reads never write: stale rows are recomputed in
+memory until the next refresh.
+"""
+import hashlib
+import threading
+from datetime import datetime
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import bindparam
+from sqlalchemy.exc import IntegrityError
+
+from models.models import db, User, Role, RoleSuggestion
+from ai_engine.skill_matcher import normalize_skill
+from services.cache import bump_data_version, data_version
+from services.tenancy import current_company_id, per_company
+
+COVERAGE_WEIGHT = 0.8  # Remainder goes to experience fit
+DEFAULT_TOP_K = 3
+
+
+class RoleModel:
+    """Sparse role requirement matrix plus per-role experience baselines"""
+
+    def __init__(self, roles, avg_experience, version, company_id=None):
+        self.version = version
+        self.company_id = company_id
+        self.role_ids = [role.id for role in roles]
+        self.role_index = {role.role_name: i for i, role in enumerate(roles)}
+        self.vocabulary = {}
+
+        rows, cols, data = [], [], []
+        for j, role in enumerate(roles):
+            weights = role.get_skill_weights()
+            skills = {normalize_skill(s): weights.get(s.lower(), 1.0) for s in role.get_required_skills_list()}
+            total = sum(skills.values())
+            for skill, weight in skills.items():
+                rows.append(self.vocabulary.setdefault(skill, len(self.vocabulary)))
+                cols.append(j)
+                data.append(weight / total)
+
+        self.weights = sparse.csr_matrix(
+            (np.array(data, dtype=np.float32), (rows, cols)),
+            shape=(len(self.vocabulary), len(roles))
+        )
+        self.avg_experience = np.array(
+            [avg_experience.get(role.role_name) or 0.0 for role in roles], dtype=np.float32
+        )
+
+    def employee_matrix(self, skills_strings):
+        """Sparse binary (employees x vocabulary) matrix; unknown skills are ignored"""
+        rows, cols = [], []
+        for i, skills in enumerate(skills_strings):
+            held = {self.vocabulary.get(normalize_skill(s)) for s in (skills or '').split(',')}
+            held.discard(None)
+            rows.extend([i] * len(held))
+            cols.extend(held)
+        return sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, cols)),
+            shape=(len(skills_strings), len(self.vocabulary))
+        )
+
+    def top_k(self, skills_strings, experiences, current_roles, k=DEFAULT_TOP_K):
+        """
+        Score a batch of employees against every role
+
+        Returns:
+            (role column indices, scores, coverage), each of shape (employees x k),
+            best first
+        """
+        n, n_roles = len(skills_strings), len(self.role_ids)
+        k = min(k, n_roles)
+        if n == 0 or k == 0:
+            empty = np.zeros((n, 0))
+            return empty.astype(int), empty, empty
+
+        coverage = np.asarray((self.employee_matrix(skills_strings) @ self.weights).todense())
+        experience = np.asarray(experiences, dtype=np.float32).reshape(-1, 1)
+        baseline = self.avg_experience.reshape(1, -1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            fit = np.where(baseline > 0, np.minimum(experience / baseline, 1.0), 1.0)
+        scores = COVERAGE_WEIGHT * coverage + (1 - COVERAGE_WEIGHT) * fit
+
+        # Never suggest the role the employee already holds
+        for i, current in enumerate(current_roles):
+            j = self.role_index.get(current)
+            if j is not None:
+                scores[i, j] = -1.0
+
+        if k < n_roles:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.tile(np.arange(n_roles), (n, 1))
+        order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1, kind='stable')[:, :k]
+        top = np.take_along_axis(top, order, axis=1)
+        return top, np.take_along_axis(scores, top, axis=1), np.take_along_axis(coverage, top, axis=1)
+
+
+_model_cache = {}  # company id -> RoleModel
+_model_lock = threading.Lock()
+
+
+def get_role_model(force=False):
+    """RoleModel for the current company's role catalog, rebuilt when roles change"""
+    version = data_version('roles')
+    company_id = current_company_id()
+    with _model_lock:
+        model = _model_cache.get(company_id)
+        if force or model is None or model.version != version:
+            avg_experience = dict(
+                db.session.query(User.current_role, db.func.avg(User.experience))
+                .filter(User.role == 'employee')
+                .group_by(User.current_role)
+                .all()
+            )
+            model = RoleModel(Role.query.order_by(Role.id).all(),
+                              {name: float(avg) for name, avg in avg_experience.items() if avg is not None},
+                              version, company_id)
+            _model_cache[company_id] = model
+        return model
+
+
+def profile_hash(skills, experience, current_role):
+    raw = f'{skills or ""}|{experience or 0}|{current_role or ""}'
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _suggestion_rows(model, user_ids, top, scores, coverage, hashes, now):
+    rows = []
+    for i, user_id in enumerate(user_ids):
+        for rank, (j, score, cov) in enumerate(zip(top[i], scores[i], coverage[i]), start=1):
+            if score < 0:
+                continue
+            rows.append({
+                'company_id': model.company_id,
+                'user_id': user_id,
+                'role_id': model.role_ids[j],
+                'rank': rank,
+                'score': round(float(score), 4),
+                'coverage': round(float(cov), 4),
+                'roles_version': model.version,
+                'profile_hash': hashes[i],
+                'computed_at': now,
+            })
+    return rows
+
+
+def _upsert_suggestions(user_ids, rows):
+    table = RoleSuggestion.__table__
+    existing = set(db.session.execute(
+        db.select(table.c.user_id, table.c.rank).where(table.c.user_id.in_(user_ids))
+    ).all())
+    updates = [dict(row, key_user_id=row['user_id'], key_rank=row['rank'])
+               for row in rows if (row['user_id'], row['rank']) in existing]
+    inserts = [row for row in rows if (row['user_id'], row['rank']) not in existing]
+    if updates:
+        db.session.execute(
+            table.update().where(table.c.user_id == bindparam('key_user_id'),
+                                 table.c.rank == bindparam('key_rank')),
+            updates
+        )
+    if inserts:
+        db.session.execute(table.insert(), inserts)
+
+    # Drop ranks a user no longer has (fewer roles, or their current role was in the list)
+    kept = {user_id: 0 for user_id in user_ids}
+    for row in rows:
+        kept[row['user_id']] = max(kept[row['user_id']], row['rank'])
+    by_count = {}
+    for user_id, count in kept.items():
+        by_count.setdefault(count, []).append(user_id)
+    for count, ids in by_count.items():
+        db.session.execute(table.delete().where(table.c.user_id.in_(ids), table.c.rank > count))
+
+
+def _store_suggestions(user_ids, rows):
+    """Upsert one batch of suggestions on (user_id, rank) and commit it"""
+    try:
+        _upsert_suggestions(user_ids, rows)
+        db.session.commit()
+    except IntegrityError:
+        # Another worker inserted the same ranks first; now they exist and are updated
+        db.session.rollback()
+        _upsert_suggestions(user_ids, rows)
+        db.session.commit()
+
+
+def _refresh_batch(model, employees, k, now):
+    user_ids = [row.id for row in employees]
+    top, scores, coverage = model.top_k(
+        [row.skills for row in employees],
+        [row.experience or 0 for row in employees],
+        [row.current_role for row in employees],
+        k
+    )
+    hashes = [profile_hash(row.skills, row.experience, row.current_role) for row in employees]
+    _store_suggestions(user_ids, _suggestion_rows(model, user_ids, top, scores, coverage, hashes, now))
+
+
+def _employee_profiles():
+    return (db.select(User.id, User.skills, User.experience, User.current_role)
+            .where(User.role == 'employee')
+            .order_by(User.id))
+
+
+@per_company
+def refresh_role_suggestions(k=DEFAULT_TOP_K, chunk_size=5000):
+    """
+    Recompute suggestions for every employee of the company in chunks
+
+    Each chunk is committed on its own, so pages keep serving the previous
+    rows while the refresh runs.
+
+    Returns:
+        Number of employees scored
+    """
+    model = get_role_model(force=True)
+    now = datetime.utcnow()
+    scored = 0
+    last_id = 0
+    while True:
+        chunk = db.session.execute(_employee_profiles().where(User.id > last_id).limit(chunk_size)).all()
+        if not chunk:
+            break
+        _refresh_batch(model, chunk, k, now)
+        scored += len(chunk)
+        last_id = chunk[-1].id
+
+    # Users who are no longer employees keep no suggestions
+    employee_ids = db.select(User.id).where(User.role == 'employee')
+    RoleSuggestion.query.filter(RoleSuggestion.user_id.not_in(employee_ids)).delete(synchronize_session=False)
+    db.session.commit()
+    bump_data_version('role_suggestions')
+    return scored
+
+
+def update_role_suggestions(user_ids, k=DEFAULT_TOP_K, chunk_size=5000):
+    """
+    Recompute stored suggestions for employees whose profile was just saved
+
+    Call after the profile commit; users who are not employees are skipped.
+    """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    model = get_role_model()
+    now = datetime.utcnow()
+    for start in range(0, len(user_ids), chunk_size):
+        batch = user_ids[start:start + chunk_size]
+        employees = db.session.execute(_employee_profiles().where(User.id.in_(batch))).all()
+        if employees:
+            _refresh_batch(model, employees, k, now)
+    bump_data_version('role_suggestions')
+
+
+def get_role_suggestions(user, k=DEFAULT_TOP_K):
+    """
+    Top-k suggestions for one employee, read-only
+
+    Stored rows are returned while they match the employee's profile and the
+    role catalog. Otherwise the ranking is computed in memory and returned as
+    unsaved RoleSuggestion objects; the stored rows are only refreshed from
+    write paths, the pipeline and the CLI.
+
+    Returns:
+        List of RoleSuggestion ordered by rank
+    """
+    model = get_role_model()
+    current_hash = profile_hash(user.skills, user.experience, user.current_role)
+    stored = (RoleSuggestion.query
+              .options(db.joinedload(RoleSuggestion.role))
+              .filter_by(user_id=user.id)
+              .order_by(RoleSuggestion.rank)
+              .all())
+    enough = len(stored) >= min(k, len(model.role_ids) - 1)
+    if stored and enough and all(s.roles_version == model.version and s.profile_hash == current_hash
+                                 for s in stored):
+        return stored[:k]
+
+    top, scores, coverage = model.top_k([user.skills], [user.experience or 0], [user.current_role], k)
+    rows = _suggestion_rows(model, [user.id], top, scores, coverage, [current_hash], datetime.utcnow())
+    roles = {role.id: role for role in Role.query.filter(Role.id.in_([row['role_id'] for row in rows]))}
+    return [RoleSuggestion(role=roles[row['role_id']], **row) for row in rows]
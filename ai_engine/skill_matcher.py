@@ -0,0 +1,216 @@
+"""
+Offline semantic skill matching
+
+A character n-gram TF-IDF model fitted on the organisation's skill vocabulary
+(role requirements plus known aliases). Similarity is the cosine of the
+n-gram vectors, so "Postgres" matches "PostgreSQL" and "React.js" matches
+"React" without any network call or GPU. Common abbreviations that share no
+characters with the full name ("JS", "K8s") are normalised through an alias
+table first, and skills that imply another ("PostgreSQL" implies "SQL") get
+fixed partial credit. A held skill whose words are only part of the required
+one ("Docker" for "Docker Compose") never counts; near-misses the other way
+("React Native" for "React", "Jython" for "Python") score about 0.6, below
+the default SKILL_MATCH_THRESHOLD of 0.7.
+"""
+import math
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from models.models import db, Role, SkillDemand
+
+NGRAM_SIZES = (2, 3, 4)
+VECTOR_CACHE_SIZE = 20000
+
+SKILL_ALIASES = {
+    'js': 'javascript',
+    'ecmascript': 'javascript',
+    'ts': 'typescript',
+    'py': 'python',
+    'python3': 'python',
+    'golang': 'go',
+    'postgres': 'postgresql',
+    'psql': 'postgresql',
+    'mssql': 'sql server',
+    'k8s': 'kubernetes',
+    'node': 'node.js',
+    'nodejs': 'node.js',
+    'reactjs': 'react',
+    'react.js': 'react',
+    'vuejs': 'vue',
+    'vue.js': 'vue',
+    'angularjs': 'angular',
+    'ml': 'machine learning',
+    'ai': 'artificial intelligence',
+    'dl': 'deep learning',
+    'nlp': 'natural language processing',
+    'dataviz': 'data visualization',
+    'data viz': 'data visualization',
+    'rest': 'rest apis',
+    'restful apis': 'rest apis',
+    'rest api': 'rest apis',
+    'cicd': 'ci/cd',
+    'ci cd': 'ci/cd',
+    'amazon web services': 'aws',
+    'google cloud': 'gcp',
+    'google cloud platform': 'gcp',
+    'microsoft azure': 'azure',
+    'sklearn': 'scikit-learn',
+    'scikit learn': 'scikit-learn',
+    'tf': 'tensorflow',
+    'pm': 'project management',
+}
+
+# Knowing the key skill gives partial credit for each implied skill
+SKILL_IMPLIES = {
+    'postgresql': ['sql'],
+    'mysql': ['sql'],
+    'sql server': ['sql'],
+    'sqlite': ['sql'],
+    'oracle': ['sql'],
+    'typescript': ['javascript'],
+    'react': ['javascript'],
+    'angular': ['javascript', 'typescript'],
+    'vue': ['javascript'],
+    'node.js': ['javascript'],
+    'pandas': ['python'],
+    'numpy': ['python'],
+    'django': ['python'],
+    'flask': ['python'],
+    'spring': ['java'],
+    'kubernetes': ['docker'],
+    'terraform': ['ci/cd'],
+    'deep learning': ['machine learning'],
+    'scikit-learn': ['machine learning', 'python'],
+    'tensorflow': ['machine learning', 'python'],
+}
+IMPLIED_SKILL_SCORE = 0.8
+
+
+def normalize_skill(skill):
+    """Lowercase, collapse whitespace and resolve known aliases"""
+    key = re.sub(r'\s+', ' ', (skill or '').lower().strip())
+    return SKILL_ALIASES.get(key, key)
+
+
+def _words(key):
+    return frozenset(re.findall(r'[a-z0-9+#]+', key))
+
+
+def _ngrams(text):
+    padded = f' {text} '
+    grams = []
+    for n in NGRAM_SIZES:
+        grams.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+    return grams
+
+
+class SkillMatcher:
+    """Char n-gram TF-IDF vectorizer fitted on a skill vocabulary"""
+
+    def __init__(self, vocabulary):
+        self.skills = sorted({normalize_skill(s) for s in vocabulary if s and s.strip()})
+        self.features = {}
+        document_frequency = []
+        for skill in self.skills:
+            for gram in set(_ngrams(skill)):
+                index = self.features.setdefault(gram, len(self.features))
+                if index == len(document_frequency):
+                    document_frequency.append(0)
+                document_frequency[index] += 1
+
+        n_docs = len(self.skills)
+        self.idf = np.array(
+            [math.log((1 + n_docs) / (1 + df)) + 1 for df in document_frequency], dtype=np.float32
+        )
+        # Unseen n-grams are as rare as possible; they still count towards the
+        # vector norm so unfamiliar skills cannot borrow a high score
+        self.unseen_idf = math.log(1 + n_docs) + 1
+        # Skill strings repeat heavily across employees, so vectors are memoized
+        self._vectors = {}
+
+    def _vector(self, skill):
+        key = normalize_skill(skill)
+        vector = self._vectors.get(key)
+        if vector is not None:
+            return vector
+
+        vector = np.zeros(len(self.features), dtype=np.float32)
+        unseen = 0.0
+        counts = {}
+        for gram in _ngrams(key):
+            counts[gram] = counts.get(gram, 0) + 1
+        for gram, count in counts.items():
+            col = self.features.get(gram)
+            if col is None:
+                unseen += (count * self.unseen_idf) ** 2
+            else:
+                vector[col] = count * self.idf[col]
+        norm = math.sqrt(float(np.dot(vector, vector)) + unseen)
+        if norm:
+            vector /= norm
+        if len(self._vectors) < VECTOR_CACHE_SIZE:
+            self._vectors[key] = vector
+        return vector
+
+    def transform(self, skills):
+        """Return an L2-normalised (len(skills) x features) matrix"""
+        if not skills:
+            return np.zeros((0, len(self.features)), dtype=np.float32)
+        return np.vstack([self._vector(skill) for skill in skills])
+
+    def similarity(self, left, right):
+        """
+        Similarity of each skill in `left` to each skill in `right`
+
+        Cosine of the n-gram vectors, 1.0 for identical skills and at least
+        IMPLIED_SKILL_SCORE when a `right` skill implies the `left` one, and
+        0.0 when a `right` skill's words are a strict subset of the `left` one's.
+
+        Returns:
+            numpy array of shape (len(left), len(right))
+        """
+        if not left or not right:
+            return np.zeros((len(left), len(right)), dtype=np.float32)
+        scores = self.transform(left) @ self.transform(right).T
+        left_keys = [normalize_skill(s) for s in left]
+        right_keys = [normalize_skill(s) for s in right]
+        left_words = [_words(key) for key in left_keys]
+        right_words = [_words(key) for key in right_keys]
+        for i, key in enumerate(left_keys):
+            for j, other in enumerate(right_keys):
+                if key == other:
+                    scores[i, j] = 1.0
+                    continue
+                if right_words[j] < left_words[i]:
+                    # Knowing "Docker" is not knowing "Docker Compose"
+                    scores[i, j] = 0.0
+                if key in SKILL_IMPLIES.get(other, ()):
+                    scores[i, j] = max(scores[i, j], IMPLIED_SKILL_SCORE)
+        return scores
+
+
+MATCHER_CACHE_SIZE = 32  # Distinct vocabularies (one per company) kept fitted
+_matcher_cache = OrderedDict()
+_matcher_lock = threading.Lock()
+
+
+def get_skill_matcher():
+    """Matcher fitted on the current company's role and skill-demand vocabulary"""
+    vocabulary = set(SKILL_ALIASES.values())
+    for (required,) in db.session.execute(db.select(Role.required_skills)):
+        vocabulary.update(s.strip() for s in (required or '').split(',') if s.strip())
+    vocabulary.update(skill for (skill,) in db.session.execute(db.select(SkillDemand.skill)))
+
+    key = hash(frozenset(normalize_skill(s) for s in vocabulary))
+    with _matcher_lock:
+        matcher = _matcher_cache.get(key)
+        if matcher is None:
+            matcher = _matcher_cache[key] = SkillMatcher(vocabulary)
+            while len(_matcher_cache) > MATCHER_CACHE_SIZE:
+                _matcher_cache.popitem(last=False)
+        else:
+            _matcher_cache.move_to_end(key)
+        return matcher
@@ -0,0 +1,126 @@
+"""
+Company-wide skill demand and scarcity statistics
+
+The skill_demand table is rebuilt in one pass over each company's employees
+and roles (``flask skills refresh-demand``) and read back per IDP generation
+with a single primary-key lookup, so prioritization never scans employees.
+"""
+from datetime import datetime
+
+import pandas as pd
+
+from models.models import db, User, Role, RoleSkill, SkillDemand
+from services.tenancy import current_company_id, per_company
+
+
+def split_skills(series):
+    """Explode a Series of comma-separated skill strings into one lowercased skill per row"""
+    exploded = series.fillna('').str.split(',').explode().str.strip()
+    return exploded[exploded != '']
+
+
+@per_company
+def refresh_skill_demand(chunk_size=10000):
+    """
+    Recompute demand and scarcity for every skill required by one of the company's roles
+
+    demand: sum over roles of (skill weight * (1 + employees targeting the role)),
+            scaled to 0-1
+    scarcity: share of employees who do not list the skill
+
+    Returns:
+        Number of skills written
+    """
+    frames = [
+        pd.DataFrame(chunk, columns=['skills', 'target_role'])
+        for chunk in db.session.execute(
+            db.select(User.skills, User.target_role).where(User.role == 'employee')
+            .execution_options(yield_per=chunk_size)
+        ).partitions(chunk_size)
+    ]
+    employees = pd.concat(frames) if frames else pd.DataFrame(columns=['skills', 'target_role'])
+    total_employees = len(employees)
+
+    supply = split_skills(employees['skills']).str.lower().value_counts()
+    targeting = employees['target_role'].value_counts()
+
+    weights = {(rs.role_id, rs.skill.lower()): rs.weight for rs in RoleSkill.query.all()}
+    rows = []
+    for role in Role.query.all():
+        for skill in role.get_required_skills_list():
+            rows.append({
+                'skill': skill,
+                'skill_key': skill.lower(),
+                'weight': weights.get((role.id, skill.lower()), 1.0),
+                'targeting': targeting.get(role.role_name, 0),
+            })
+
+    SkillDemand.query.delete()
+    if not rows:
+        db.session.commit()
+        return 0
+
+    required = pd.DataFrame(rows)
+    required['raw_demand'] = required['weight'] * (1 + required['targeting'])
+    stats = required.groupby('skill_key').agg(skill=('skill', 'first'), raw_demand=('raw_demand', 'sum'))
+    stats['demand'] = stats['raw_demand'] / stats['raw_demand'].max()
+    stats['employees_with_skill'] = supply.reindex(stats.index, fill_value=0)
+    stats['scarcity'] = (1 - stats['employees_with_skill'] / total_employees) if total_employees else 1.0
+
+    now = datetime.utcnow()
+    company_id = current_company_id()
+    db.session.execute(db.insert(SkillDemand), [
+        {
+            'company_id': company_id,
+            'skill_key': key,
+            'skill': row.skill,
+            'demand': float(row.demand),
+            'scarcity': float(row.scarcity),
+            'employees_with_skill': int(row.employees_with_skill),
+            'updated_at': now,
+        }
+        for key, row in stats.iterrows()
+    ])
+    db.session.commit()
+    return len(stats)
+
+
+def get_skill_demand(skills):
+    """
+    Look up precomputed statistics for the given skills
+
+    Returns:
+        Dictionary of lowercased skill -> (demand, scarcity)
+    """
+    keys = list({skill.lower().strip() for skill in skills})
+    if not keys:
+        return {}
+    rows = db.session.execute(
+        db.select(SkillDemand.skill_key, SkillDemand.demand, SkillDemand.scarcity)
+        .where(SkillDemand.skill_key.in_(keys))
+    ).all()
+    return {row.skill_key: (row.demand, row.scarcity) for row in rows}
+
+
+def parse_skill_weights(text):
+    """
+    Parse "Python:3, SQL:2" into {'Python': 3.0, 'SQL': 2.0}
+
+    Raises:
+        ValueError: If a weight is not a positive number
+    """
+    weights = {}
+    for part in (text or '').split(','):
+        if ':' not in part:
+            continue
+        skill, weight = part.rsplit(':', 1)
+        skill = skill.strip()
+        try:
+            value = float(weight)
+        except ValueError:
+            raise ValueError(f'Weight for {skill} must be a number')
+        if value <= 0:
+            raise ValueError(f'Weight for {skill} must be positive')
+        if skill:
+            weights[skill] = value
+    return weights
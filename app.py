@@ -4,12 +4,25 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from flask import Flask
+from werkzeug.middleware.proxy_fix import ProxyFix
 from flask_login import LoginManager
 from config import Config
 from models.models import db, User
 from routes.auth import auth_bp
 from routes.hr import hr_bp
 from routes.employee import employee_bp
+from routes.api import api_bp
+from cli import register_commands
+from services.cache import init_cache, seed_data_versions
+from services.schema import upgrade_schema
+from services.metrics import init_metrics
+from services.profiling import init_profiling
+from services.login_guard import login_guard
+from services.audit import audit_writer, ensure_audit_partitions
+from services.tenancy import init_tenancy, ensure_default_company
+from services.assets import init_assets
+from services.search import ensure_search_index
+from services.hierarchy import init_hierarchy, ensure_hierarchy
 
 def create_app():
     app = Flask(__name__)
@@ -21,13 +34,39 @@ def create_app():
     app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
     app.config['REMEMBER_COOKIE_DURATION'] = 3600 * 24  # 24 hours
     
+    # Behind a reverse proxy remote_addr is the proxy; take the client from X-Forwarded-For
+    if app.config['TRUSTED_PROXY_COUNT']:
+        proxies = app.config['TRUSTED_PROXY_COUNT']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxies, x_proto=proxies)
+    
     # Initialize database
     db.init_app(app)
     
+    # Template bytecode/fragment caching and data version tracking
+    init_cache(app)
+    
+    # Request latency metrics, opt-in profiling and login admission control
+    init_metrics(app)
+    init_profiling(app)
+    login_guard.init_app(app)
+    
+    # Write-behind audit log of model changes
+    audit_writer.init_app(app)
+    
+    # Scope queries to the logged-in user's company
+    init_tenancy(app)
+    
+    # Reporting-line closure table and team rollups, kept current on writes
+    init_hierarchy(app)
+    
+    # Fingerprinted, precompressed CSS/JS (flask assets build)
+    init_assets(app)
+    
     # Initialize login manager
     login_manager = LoginManager()
     login_manager.init_app(app)
     login_manager.login_view = 'auth.login'
+    login_manager.blueprint_login_views = {'api': None}  # 401 instead of redirect
     
     @login_manager.user_loader
     def load_user(user_id):
@@ -37,10 +76,20 @@ def create_app():
     app.register_blueprint(auth_bp)
     app.register_blueprint(hr_bp)
     app.register_blueprint(employee_bp)
+    app.register_blueprint(api_bp)
+    
+    # Register CLI commands
+    register_commands(app)
     
     # Create database tables
     with app.app_context():
         db.create_all()
+        upgrade_schema()
+        ensure_audit_partitions()
+        ensure_search_index()
+        ensure_default_company()
+        ensure_hierarchy()
+        seed_data_versions()
         
         # Create default users if none exist
         if User.query.count() == 0:
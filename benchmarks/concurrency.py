@@ -0,0 +1,180 @@
+"""
+Concurrency stress test for optimistic locking of progress updates
+
+Seeds a small SQLite database in WAL mode, then lets many threads update the
+same few progress rows at once, each thread in its own app context and
+session. Every update is a read-modify-write through the ORM that appends a
+unique token to the row's feedback, the way two browser tabs or an employee
+and HR would edit the same plan. Version conflicts (StaleDataError) and
+SQLite busy errors are rolled back and retried.
+
+At the end every committed token must still be in its row (no lost updates)
+and each row's version must have grown by exactly its committed updates. The
+script reports sustained write throughput, update latency and how often
+conflicts were retried, and exits 1 if any update was lost.
+
+--unversioned runs the same workload with plain UPDATEs that skip the version
+check, to show the lost updates optimistic locking prevents. Those bypass the
+ORM (and with it the audit and cache hooks), so their throughput is not a
+like-for-like comparison.
+
+Usage:
+    python benchmarks/concurrency.py
+    python benchmarks/concurrency.py --threads 16 --updates 200 --rows 2
+    python benchmarks/concurrency.py --unversioned
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['USE_MYSQL'] = 'False'
+
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm.exc import StaleDataError
+
+from config import Config
+from benchmarks.run import build_app, percentile
+from benchmarks.seed import seed_dataset
+
+
+def enable_wal(engine, busy_timeout_ms):
+    """WAL journal and a busy timeout on every pooled SQLite connection"""
+    def on_connect(dbapi_connection, _):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute(f'PRAGMA busy_timeout={busy_timeout_ms}')
+        cursor.close()
+
+    event.listen(engine, 'connect', on_connect)
+    engine.dispose()
+    with engine.connect() as conn:
+        return conn.exec_driver_sql('PRAGMA journal_mode').scalar()
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.committed = {}
+        self.latencies = []
+        self.conflicts = 0
+        self.busy = 0
+
+    def record(self, row_id, token, latency, conflicts, busy):
+        with self.lock:
+            self.committed.setdefault(row_id, []).append(token)
+            self.latencies.append(latency)
+            self.conflicts += conflicts
+            self.busy += busy
+
+
+def worker(app, row_ids, number, updates, versioned, stats, start):
+    from models.models import db, Progress
+
+    table = Progress.__table__
+    with app.app_context():
+        start.wait()
+        for n in range(updates):
+            row_id = row_ids[(number + n) % len(row_ids)]
+            token = f'[{number}:{n}]'
+            conflicts = busy = 0
+            started = time.perf_counter()
+            while True:
+                try:
+                    if versioned:
+                        progress = db.session.get(Progress, row_id)
+                        progress.feedback = (progress.feedback or '') + token
+                    else:
+                        feedback = db.session.execute(db.select(table.c.feedback).where(table.c.id == row_id)).scalar()
+                        db.session.execute(table.update().where(table.c.id == row_id)
+                                           .values(feedback=(feedback or '') + token))
+                    db.session.commit()
+                    break
+                except StaleDataError:
+                    db.session.rollback()
+                    conflicts += 1
+                except OperationalError:
+                    db.session.rollback()
+                    busy += 1
+            stats.record(row_id, token, (time.perf_counter() - started) * 1000, conflicts, busy)
+
+
+def run(args):
+    from services.audit import audit_writer
+
+    workdir = tempfile.mkdtemp(prefix='idp-concurrency-')
+    # Each thread holds its session's connection while the after-commit cache bump opens another
+    Config.SQLALCHEMY_ENGINE_OPTIONS = {'pool_size': 2 * args.threads, 'max_overflow': 0}
+    try:
+        app = build_app(os.path.join(workdir, 'bench.db'), os.path.join(workdir, 'jinja'))
+        from models.models import db, Progress
+
+        with app.app_context():
+            journal_mode = enable_wal(db.engine, args.busy_timeout)
+            seed_dataset(args.employees)
+            row_ids = [row.id for row in Progress.query.with_entities(Progress.id).order_by(Progress.id).limit(args.rows)]
+            db.session.execute(db.update(Progress).where(Progress.id.in_(row_ids)).values(feedback=''))
+            db.session.commit()
+            initial_versions = dict(db.session.query(Progress.id, Progress.version).filter(Progress.id.in_(row_ids)))
+
+        stats = Stats()
+        start = threading.Barrier(args.threads + 1)
+        threads = [
+            threading.Thread(target=worker, args=(app, row_ids, number, args.updates, not args.unversioned, stats, start))
+            for number in range(args.threads)
+        ]
+        for thread in threads:
+            thread.start()
+        start.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        lost = 0
+        version_mismatches = 0
+        with app.app_context():
+            for progress in Progress.query.filter(Progress.id.in_(row_ids)):
+                tokens = stats.committed.get(progress.id, [])
+                lost += sum(1 for token in tokens if token not in progress.feedback)
+                if not args.unversioned and progress.version != initial_versions[progress.id] + len(tokens):
+                    version_mismatches += 1
+
+        committed = len(stats.latencies)
+        print(f'\n== {args.threads} threads x {args.updates} updates on {len(row_ids)} progress rows '
+              f'({"unversioned" if args.unversioned else "optimistic locking"}, journal_mode={journal_mode}) ==')
+        print(f'committed updates   {committed}')
+        print(f'elapsed             {elapsed:.2f}s')
+        print(f'throughput          {committed / elapsed:.1f} updates/s')
+        print(f'latency p50/p95/max {percentile(stats.latencies, 50):.1f} / {percentile(stats.latencies, 95):.1f} / '
+              f'{max(stats.latencies):.1f} ms (including retries)')
+        print(f'version conflicts   {stats.conflicts} retried')
+        print(f'busy errors         {stats.busy} retried')
+        print(f'lost updates        {lost}')
+        if not args.unversioned:
+            print(f'version mismatches  {version_mismatches}')
+        return 1 if (lost or version_mismatches) and not args.unversioned else 0
+    finally:
+        # Write the queued audit events while the database still exists
+        audit_writer.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--updates', type=int, default=100, help='Updates per thread')
+    parser.add_argument('--rows', type=int, default=4, help='Progress rows shared by all threads')
+    parser.add_argument('--employees', type=int, default=100, help='Size of the seeded dataset')
+    parser.add_argument('--busy-timeout', type=int, default=5000, help='SQLite busy_timeout in ms')
+    parser.add_argument('--unversioned', action='store_true', help='Write without the version check')
+    return run(parser.parse_args())
+
+
+if __name__ == '__main__':
+    sys.exit(main())
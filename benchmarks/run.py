@@ -0,0 +1,279 @@
+"""
+Benchmark suite for the hot paths
+
+Seeds a fresh SQLite database per dataset size, then measures latency
+percentiles, SQL query counts and peak Python memory for:
+
+    analyze_skill_gap, upload_csv, hr.dashboard, hr.reports, hr.employees,
+    login, generate_idp (against a stub Gemini client), hr.team (the whole
+    org under its top manager), update_progress (including the team rollup
+    increments of every manager above) and team_refresh
+
+Usage:
+    python benchmarks/run.py                          # 1k, 10k, 100k
+    python benchmarks/run.py --sizes 1000 10000 --repeat 20
+    python benchmarks/run.py --update-baseline        # rewrite baseline.json
+    python benchmarks/run.py --check                  # exit 1 on regressions
+"""
+import argparse
+import io
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['USE_MYSQL'] = 'False'
+
+from sqlalchemy import event
+
+from config import Config
+from benchmarks.seed import seed_dataset, SKILL_VOCABULARY, BENCH_PASSWORD
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+STUB_GEMINI_RESPONSE = """Action: Complete a hands-on course and build a small production-style project.
+Timeline: 3 months
+Metric: Ship one project reviewed by a senior engineer"""
+
+
+class QueryCounter:
+    """Counts SQL statements sent through an engine by the measuring thread
+
+    Statements of background threads (the audit writer's batched inserts) run
+    whenever their timer fires, so counting them would make counts vary.
+    """
+
+    def __init__(self, engine):
+        self.count = 0
+        self.thread_id = threading.get_ident()
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, *args):
+        if threading.get_ident() == self.thread_id:
+            self.count += 1
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def measure(fn, repeat, counter, setup=None):
+    """
+    Time fn() `repeat` times, then run it once more under tracemalloc
+
+    Returns:
+        Dictionary with p50/p95/p99/max in ms, queries per call (the most
+        common count, so one unusual iteration does not shift it) and peak KiB
+    """
+    timings, queries = [], []
+    for i in range(repeat):
+        if setup:
+            setup(i)
+        counter.count = 0
+        start = time.perf_counter()
+        fn(i)
+        timings.append((time.perf_counter() - start) * 1000)
+        queries.append(counter.count)
+
+    if setup:
+        setup(repeat)
+    tracemalloc.start()
+    fn(repeat)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'p50_ms': round(percentile(timings, 50), 2),
+        'p95_ms': round(percentile(timings, 95), 2),
+        'p99_ms': round(percentile(timings, 99), 2),
+        'max_ms': round(max(timings), 2),
+        'queries': max(statistics.multimode(queries)),
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def build_app(db_path, cache_dir):
+    Config.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + db_path
+    Config.TEMPLATE_CACHE_DIR = cache_dir
+
+    from app import create_app
+    app = create_app()
+    app.config['TESTING'] = True
+    return app
+
+
+def stub_gemini():
+    from ai_engine.gemini_client import gemini_client
+    gemini_client.generate_content = lambda prompt, usage=None: STUB_GEMINI_RESPONSE
+
+
+def run_size(size, repeat):
+    from services.audit import audit_writer
+
+    workdir = tempfile.mkdtemp(prefix=f'idp-bench-{size}-')
+    try:
+        app = build_app(os.path.join(workdir, 'bench.db'), os.path.join(workdir, 'jinja'))
+        stub_gemini()
+
+        from models.models import db, User, Progress
+        from services.hierarchy import refresh_team_rollups
+        from ai_engine.gap_analysis import analyze_skill_gap
+        from services.cache import fragment_cache
+
+        with app.app_context():
+            started = time.perf_counter()
+            counts = seed_dataset(size)
+            seed_seconds = round(time.perf_counter() - started, 1)
+            counter = QueryCounter(db.engine)
+            employee_ids = [row.id for row in User.query.filter_by(role='employee').with_entities(User.id).limit(repeat + 1)]
+            director_id = User.query.filter_by(role='employee', manager_id=None).with_entities(User.id).first().id
+            progress_ids = [row.id for row in Progress.query.with_entities(Progress.id).order_by(Progress.id.desc()).limit(repeat + 1)]
+
+        client = app.test_client()
+        client.post('/login', data={'email': 'hr@bench.local', 'password': BENCH_PASSWORD})
+        client.get('/hr/dashboard')  # consume the login flash message
+
+        def cold(_):
+            # Measure the real rendering work, not the fragment cache
+            fragment_cache.clear()
+
+        def get(url):
+            def run(_):
+                response = client.get(url)
+                assert response.status_code == 200, (url, response.status_code)
+            return run
+
+        def gap(_):
+            for i in range(100):
+                analyze_skill_gap(SKILL_VOCABULARY[i % 7:i % 7 + 6], SKILL_VOCABULARY[i % 11:i % 11 + 8])
+
+        def login(i):
+            anon = app.test_client()
+            response = anon.post('/login', data={'email': f'employee{i}@bench.local', 'password': BENCH_PASSWORD})
+            assert response.status_code == 302, response.status_code
+
+        def upload(i):
+            rows = ['name,email,skills,experience,goal,current_role,target_role,password']
+            rows += [f'Upload {i}-{n},upload{i}-{n}@bench.local,"Python, SQL",3,Grow,Analyst,Data Scientist,pw'
+                     for n in range(20)]
+            data = {'file': (io.BytesIO('\n'.join(rows).encode()), 'employees.csv')}
+            response = client.post('/hr/upload-csv', data=data, content_type='multipart/form-data')
+            assert response.status_code == 302, response.status_code
+
+        def update_progress(i):
+            with app.app_context():
+                progress = db.session.get(Progress, progress_ids[i % len(progress_ids)])
+                progress.completion = (progress.completion + 7) % 101
+                db.session.commit()
+
+        def team_refresh(_):
+            with app.app_context():
+                refresh_team_rollups()
+
+        def generate(i):
+            user_id = employee_ids[i % len(employee_ids)]
+            response = client.post(f'/hr/generate-idp/{user_id}', data={'target_role': 'Data Scientist'})
+            assert response.status_code == 302, response.status_code
+
+        # Requests push their own app context; sharing one would leak g._login_user
+        results = {
+            'analyze_skill_gap_x100': measure(gap, repeat, counter),
+            'login': measure(login, repeat, counter),
+            'hr.dashboard': measure(get('/hr/dashboard'), repeat, counter, cold),
+            'hr.reports': measure(get('/hr/reports'), repeat, counter, cold),
+            'hr.employees': measure(get('/hr/employees'), min(repeat, 5), counter, cold),
+            'upload_csv_20_rows': measure(upload, min(repeat, 5), counter),
+            'generate_idp': measure(generate, repeat, counter),
+            'hr.team': measure(get(f'/hr/team/{director_id}'), repeat, counter, cold),
+            'update_progress': measure(update_progress, repeat, counter),
+            'team_refresh': measure(team_refresh, min(repeat, 5), counter),
+        }
+
+        return {'dataset': counts, 'seed_seconds': seed_seconds, 'benchmarks': results}
+    finally:
+        # Write the queued audit events while the database still exists
+        audit_writer.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of human readable regressions against the baseline"""
+    regressions = []
+    for size, run in results.items():
+        base_run = baseline.get(size)
+        if not base_run:
+            continue
+        for name, metrics in run['benchmarks'].items():
+            base = base_run['benchmarks'].get(name)
+            if not base:
+                continue
+            if metrics['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+                regressions.append(f"{size} {name}: p95 {metrics['p95_ms']}ms > baseline {base['p95_ms']}ms")
+            if metrics['queries'] > base['queries']:
+                regressions.append(f"{size} {name}: {metrics['queries']} queries > baseline {base['queries']}")
+    return regressions
+
+
+def print_table(size, run):
+    print(f"\n== {size} employees ({run['dataset']['idps']} IDPs, {run['dataset']['progress']} progress, "
+          f"seeded in {run['seed_seconds']}s) ==")
+    print(f"{'benchmark':<24}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>10}{'peak KiB':>12}")
+    for name, m in run['benchmarks'].items():
+        print(f"{name:<24}{m['p50_ms']:>10}{m['p95_ms']:>10}{m['p99_ms']:>10}{m['queries']:>10}{m['peak_kib']:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed p95 slowdown before flagging (0.25 = 25%%)')
+    parser.add_argument('--update-baseline', action='store_true')
+    parser.add_argument('--check', action='store_true', help='Exit 1 if any benchmark regressed')
+    parser.add_argument('--output', help='Also write results JSON here')
+    args = parser.parse_args()
+
+    results = {}
+    for size in args.sizes:
+        results[str(size)] = run_size(size, args.repeat)
+        print_table(size, results[str(size)])
+
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(results, fh, indent=2)
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as fh:
+                baseline = json.load(fh)
+        baseline.update(results)
+        with open(args.baseline, 'w') as fh:
+            json.dump(baseline, fh, indent=2, sort_keys=True)
+        print(f'\nBaseline written to {args.baseline}')
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as fh:
+            regressions = compare(results, json.load(fh), args.tolerance)
+        if regressions:
+            print('\nRegressions:')
+            for line in regressions:
+                print(f'  - {line}')
+            return 1 if args.check else 0
+        print('\nNo regressions against baseline')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
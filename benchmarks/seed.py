@@ -0,0 +1,149 @@
+"""
+Synthetic dataset generator for benchmarks
+
+Creates N employees with skills, target roles, IDPs and progress rows using
+bulk inserts. Employees form one reporting tree (ORG_FANOUT direct reports
+per manager) under employee 0. All employees share one password hash ('bench123') so seeding
+100k users does not spend minutes in scrypt.
+"""
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+from werkzeug.security import generate_password_hash
+
+from models.models import db, User, Role, IDP, Progress, UserHierarchy
+from services.hierarchy import rebuild_hierarchy
+from services.tenancy import current_company_id, default_company_id
+
+BENCH_PASSWORD = 'bench123'
+
+SKILL_VOCABULARY = [
+    'Python', 'JavaScript', 'TypeScript', 'React', 'Angular', 'Vue', 'Node.js', 'Java',
+    'Spring', 'Go', 'Rust', 'C#', '.NET', 'SQL', 'PostgreSQL', 'MySQL', 'MongoDB',
+    'Redis', 'Git', 'REST APIs', 'GraphQL', 'Docker', 'Kubernetes', 'Linux', 'AWS',
+    'Azure', 'GCP', 'Terraform', 'CI/CD', 'Monitoring', 'Machine Learning', 'Statistics',
+    'Data Visualization', 'Pandas', 'NumPy', 'Spark', 'Excel', 'Tableau', 'Power BI',
+    'HTML', 'CSS', 'Agile', 'Scrum', 'Project Management', 'Communication', 'Leadership',
+    'Security', 'Testing', 'Kafka', 'Airflow',
+]
+
+ROLE_TITLES = [
+    'Full Stack Developer', 'Data Scientist', 'DevOps Engineer', 'Backend Engineer',
+    'Frontend Engineer', 'Data Engineer', 'ML Engineer', 'Cloud Architect',
+    'Site Reliability Engineer', 'Business Analyst', 'QA Engineer', 'Security Engineer',
+    'Engineering Manager', 'Product Analyst', 'Platform Engineer',
+]
+
+STATUSES = ['pending', 'in_progress', 'completed']
+ORG_FANOUT = 8
+
+
+def seed_dataset(num_employees, seed=42, batch_size=5000):
+    """
+    Populate an empty database with synthetic employees, roles, IDPs and progress
+
+    Args:
+        num_employees: Number of employee users to create
+        seed: Random seed for reproducible datasets
+        batch_size: Rows per bulk INSERT
+
+    Returns:
+        Dictionary with row counts per table
+    """
+    rng = random.Random(seed)
+    company_id = current_company_id() or default_company_id()
+    password_hash = generate_password_hash(BENCH_PASSWORD)
+    now = datetime.utcnow()
+
+    hr_user = User(name='Bench HR', email='hr@bench.local', role='hr')
+    hr_user.password_hash = password_hash
+    db.session.add(hr_user)
+
+    existing_roles = {r.role_name for r in Role.query.all()}
+    for title in ROLE_TITLES:
+        if title not in existing_roles:
+            db.session.add(Role(
+                role_name=title,
+                required_skills=', '.join(rng.sample(SKILL_VOCABULARY, rng.randint(5, 9))),
+                description=f'{title} (synthetic)'
+            ))
+    db.session.commit()
+
+    first_user_id = db.session.query(db.func.max(User.id)).scalar() + 1
+    users = []
+    for i in range(num_employees):
+        users.append({
+            'company_id': company_id,
+            'name': f'Employee {i}',
+            'email': f'employee{i}@bench.local',
+            'password_hash': password_hash,
+            'role': 'employee',
+            'skills': ', '.join(rng.sample(SKILL_VOCABULARY, rng.randint(2, 8))),
+            'experience': rng.randint(0, 20),
+            'goal': rng.choice(['Become a tech lead', 'Move into data', 'Grow as an engineer', '']),
+            'current_role': rng.choice(ROLE_TITLES),
+            'target_role': rng.choice(ROLE_TITLES),
+            'manager_id': first_user_id + (i - 1) // ORG_FANOUT if i else None,
+            'created_at': now - timedelta(days=rng.randint(0, 1000)),
+        })
+        if len(users) >= batch_size:
+            db.session.execute(insert(User), users)
+            users = []
+    if users:
+        db.session.execute(insert(User), users)
+    db.session.commit()
+
+    first_idp_id = (db.session.query(db.func.max(IDP.id)).scalar() or 0) + 1
+    idps, progress = [], []
+    idp_count = progress_count = 0
+    next_idp_id = first_idp_id
+    for user_id in range(first_user_id, first_user_id + num_employees):
+        for _ in range(rng.randint(0, 5)):
+            status = rng.choice(STATUSES)
+            skill = rng.choice(SKILL_VOCABULARY)
+            created = now - timedelta(days=rng.randint(0, 700))
+            idps.append({
+                'company_id': company_id,
+                'id': next_idp_id,
+                'user_id': user_id,
+                'skill_gap': skill,
+                'action': f'Complete an online course in {skill} and ship a small project using it.',
+                'timeline': rng.choice(['6 weeks', '3 months', '6 months']),
+                'metric': f'Earn certification and complete 2 practical projects using {skill}',
+                'status': status,
+                'created_at': created,
+            })
+            if status != 'pending':
+                progress.append({
+                    'company_id': company_id,
+                    'idp_id': next_idp_id,
+                    'completion': 100 if status == 'completed' else rng.randint(5, 95),
+                    'feedback': rng.choice(['On track', 'Blocked on lab access', 'Finished module 2', '']),
+                    'updated_at': created + timedelta(days=rng.randint(1, 60)),
+                })
+            next_idp_id += 1
+        if len(idps) >= batch_size:
+            db.session.execute(insert(IDP), idps)
+            if progress:
+                db.session.execute(insert(Progress), progress)
+            idp_count += len(idps)
+            progress_count += len(progress)
+            idps, progress = [], []
+    if idps:
+        db.session.execute(insert(IDP), idps)
+        idp_count += len(idps)
+    if progress:
+        db.session.execute(insert(Progress), progress)
+        progress_count += len(progress)
+    db.session.commit()
+    # Bulk inserts bypass the flush hooks that maintain reporting lines
+    rebuild_hierarchy()
+
+    return {
+        'employees': num_employees,
+        'roles': Role.query.count(),
+        'idps': idp_count,
+        'progress': progress_count,
+        'reporting_lines': UserHierarchy.query.filter(UserHierarchy.depth > 0).count(),
+    }
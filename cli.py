@@ -0,0 +1,310 @@
+"""
+Flask CLI commands
+
+Usage:
+    flask --app app company create "Acme Corp" acme --hr-email hr@acme.com
+    flask --app app company list
+    flask --app app export employees --format csv --output employees.csv --company acme
+    flask --app app skills refresh-demand
+    flask --app app skills suggest-roles --top-k 3
+    flask --app app idp enrich --limit 100
+    flask --app app audit add-partitions --months 3
+    flask --app app audit prune --before 2025-01
+    flask --app app pipeline run --workers 4 --regenerate
+    flask --app app archive run --older-than-days 180
+    flask --app app assets build
+    flask --app app team refresh --company acme
+    flask --app app team rebuild
+    flask --app app trends aggregate
+"""
+import sys
+from contextlib import nullcontext
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from ai_engine.skill_stats import refresh_skill_demand
+from ai_engine.role_suggestions import refresh_role_suggestions, DEFAULT_TOP_K
+from ai_engine.recommender import enrich_idps
+from models.models import db, Company, IDP, User
+from services.jobs import Job
+from services.audit import ensure_audit_partitions, prune_audit_events
+from services.archive import archive_idps
+from services.assets import build_assets, load_manifest
+from services.hierarchy import HierarchyError, refresh_team_rollups, rebuild_hierarchy
+from services.trends import aggregate_daily_stats
+from services.pipeline import (PipelineError, ALL_STEPS, DEFAULT_CHUNK_SIZE as PIPELINE_CHUNK_SIZE,
+                               run_pipeline, run_summary)
+from services.tenancy import create_company, get_company, tenant_scope
+from services.export import (ExportError, EXPORT_FORMATS, DATASET_COLUMNS,
+                             DEFAULT_CHUNK_SIZE, export_to_file, stream_export, parse_date)
+
+
+def company_scope(slug):
+    """Context limiting queries to the company with this slug (all companies if None)"""
+    if slug is None:
+        return nullcontext()
+    company = get_company(slug)
+    if company is None:
+        raise click.ClickException(f'Unknown company: {slug}')
+    return tenant_scope(company.id)
+
+
+@click.group('company')
+def company_group():
+    """Tenants hosted by this deployment"""
+
+
+@company_group.command('create')
+@click.argument('name')
+@click.argument('slug')
+@click.option('--hr-email', default=None, help='Create an HR account for the company')
+@click.option('--hr-password', default=None, help='Password for the HR account (prompted if omitted)')
+@with_appcontext
+def create_company_command(name, slug, hr_email, hr_password):
+    """Add a company, optionally with its first HR user"""
+    if hr_email and User.query.execution_options(all_companies=True).filter_by(email=hr_email).first():
+        raise click.ClickException(f'Email {hr_email} is already registered')
+    try:
+        company = create_company(name, slug)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    if hr_email:
+        hr_user = User(name=f'{name} HR', email=hr_email, role='hr', company_id=company.id)
+        hr_user.set_password(hr_password or click.prompt('HR password', hide_input=True, confirmation_prompt=True))
+        db.session.add(hr_user)
+        db.session.commit()
+    click.echo(f'Created company {company.slug} (id {company.id})')
+
+
+@company_group.command('list')
+@with_appcontext
+def list_companies_command():
+    """Companies with their employee counts"""
+    counts = dict(db.session.query(User.company_id, db.func.count(User.id))
+                  .filter(User.role == 'employee').group_by(User.company_id).all())
+    for company in Company.query.order_by(Company.id):
+        click.echo(f'{company.id}\t{company.slug}\t{company.name}\t{counts.get(company.id, 0)} employees')
+
+
+@click.command('export')
+@click.argument('dataset', type=click.Choice(list(DATASET_COLUMNS)))
+@click.option('--format', 'fmt', type=click.Choice(list(EXPORT_FORMATS)), default='csv')
+@click.option('--output', '-o', default='-', help='Output file, "-" for stdout')
+@click.option('--role', default=None, help='Current or target role of the employee')
+@click.option('--status', default=None, help='IDP status (idps/progress only)')
+@click.option('--start', default=None, help='From date, YYYY-MM-DD (inclusive)')
+@click.option('--end', default=None, help='To date, YYYY-MM-DD (inclusive)')
+@click.option('--chunk-size', default=DEFAULT_CHUNK_SIZE, show_default=True)
+@click.option('--company', default=None, help='Company slug (default: all companies)')
+@with_appcontext
+def export_command(dataset, fmt, output, role, status, start, end, chunk_size, company):
+    """Stream a full export of employees, IDPs or progress"""
+    with company_scope(company):
+        _export(dataset, fmt, output, role, status, start, end, chunk_size)
+
+
+def _export(dataset, fmt, output, role, status, start, end, chunk_size):
+    try:
+        filters = {
+            'role': role,
+            'status': status,
+            'start': parse_date(start),
+            'end': parse_date(end, end_of_day=True),
+        }
+        if output == '-':
+            if fmt == 'parquet':
+                raise ExportError('Parquet export needs --output')
+            for block in stream_export(dataset, fmt, chunk_size, **filters):
+                sys.stdout.write(block)
+        else:
+            export_to_file(output, dataset, fmt, chunk_size, **filters)
+            click.echo(f'Exported {dataset} to {output}', err=True)
+    except ExportError as e:
+        raise click.ClickException(str(e))
+
+
+@click.group('skills')
+def skills_group():
+    """Skill statistics maintenance"""
+
+
+@skills_group.command('refresh-demand')
+@click.option('--company', default=None, help='Company slug (default: every company)')
+@with_appcontext
+def refresh_demand_command(company):
+    """Recompute company-wide demand and scarcity per skill"""
+    with company_scope(company):
+        count = refresh_skill_demand()
+    click.echo(f'Updated demand statistics for {count} skills')
+
+
+@skills_group.command('suggest-roles')
+@click.option('--top-k', default=DEFAULT_TOP_K, show_default=True)
+@click.option('--chunk-size', default=5000, show_default=True)
+@click.option('--company', default=None, help='Company slug (default: every company)')
+@with_appcontext
+def suggest_roles_command(top_k, chunk_size, company):
+    """Rank the best-fit roles for every employee"""
+    with company_scope(company):
+        count = refresh_role_suggestions(top_k, chunk_size)
+    click.echo(f'Stored top-{top_k} role suggestions for {count} employees')
+
+
+@click.group('idp')
+def idp_group():
+    """IDP maintenance"""
+
+
+@idp_group.command('enrich')
+@click.option('--limit', default=100, show_default=True, help='Maximum IDPs to send to Gemini')
+@with_appcontext
+def enrich_command(limit):
+    """Replace template actions (skills missing from the catalog) with Gemini plans"""
+    ids = [idp.id for idp in IDP.query.filter_by(source='template').order_by(IDP.id).limit(limit)]
+    job = Job()
+    enrich_idps(job, ids)
+    click.echo(f'Enriched {job.events[-1][1]["count"]} of {len(ids)} template IDPs')
+
+
+@click.group('audit')
+def audit_group():
+    """Audit log maintenance"""
+
+
+@audit_group.command('add-partitions')
+@click.option('--months', default=3, show_default=True, help='Months ahead to create')
+@with_appcontext
+def add_partitions_command(months):
+    """Partition the table if needed and create upcoming monthly partitions (MySQL)"""
+    created = ensure_audit_partitions(months)
+    click.echo(f'Created partitions: {", ".join(created)}' if created else 'No partitions needed')
+
+
+@audit_group.command('prune')
+@click.option('--before', required=True, help='Keep events from this month on, YYYY-MM')
+@with_appcontext
+def prune_command(before):
+    """Remove audit events older than a month"""
+    try:
+        year, month = (int(part) for part in before.split('-'))
+    except ValueError:
+        raise click.BadParameter('Use YYYY-MM', param_hint='--before')
+    removed = prune_audit_events(year * 100 + month)
+    click.echo(f'Pruned audit events before {before} ({removed} removed)')
+
+
+@click.group('pipeline')
+def pipeline_group():
+    """Batch recomputation of derived data"""
+
+
+@pipeline_group.command('run')
+@click.option('--step', 'steps', multiple=True, type=click.Choice(ALL_STEPS),
+              help='Run only these steps (repeatable, default all)')
+@click.option('--chunk-size', default=PIPELINE_CHUNK_SIZE, show_default=True)
+@click.option('--workers', default=1, show_default=True, help='Worker processes for per-employee work')
+@click.option('--regenerate', is_flag=True, help='Replace stale IDPs with a fresh catalog plan')
+@click.option('--restart', is_flag=True, help='Start a new run instead of resuming an unfinished one')
+@with_appcontext
+def pipeline_run_command(steps, chunk_size, workers, regenerate, restart):
+    """Recompute skill gaps, flag stale IDPs and refresh rollups (resumable)"""
+    try:
+        run = run_pipeline(steps or ALL_STEPS, chunk_size, workers, regenerate, resume=not restart,
+                           echo=lambda message: click.echo(message, err=True))
+    except PipelineError as e:
+        raise click.ClickException(str(e))
+    summary = run_summary(run)
+    click.echo(f'Pipeline run {run.id} completed: {summary["employees"]} employees, '
+               f'{summary["stale_idps"]} stale IDPs, {summary["regenerated"]} regenerated')
+
+
+@click.group('archive')
+def archive_group():
+    """Retention of finished IDPs"""
+
+
+@archive_group.command('run')
+@click.option('--older-than-days', 'days', type=int, default=None,
+              help='Days without activity (default ARCHIVE_AFTER_DAYS)')
+@click.option('--batch-size', type=int, default=None, help='IDPs moved per transaction')
+@click.option('--limit', type=int, default=None, help='Stop after this many IDPs')
+@with_appcontext
+def archive_run_command(days, batch_size, limit):
+    """Move completed and superseded IDPs and their progress to the archive tables"""
+    idps, progress = archive_idps(days, batch_size, limit)
+    click.echo(f'Archived {idps} IDPs and {progress} progress entries')
+
+
+@click.group('assets')
+def assets_group():
+    """Static asset build"""
+
+
+@assets_group.command('build')
+@with_appcontext
+def assets_build_command():
+    """Minify, fingerprint and precompress CSS/JS into static/dist"""
+    app = current_app._get_current_object()
+    manifest = build_assets(app.static_folder)
+    load_manifest(app)
+    for name, hashed in sorted(manifest.items()):
+        click.echo(f'{name} -> {hashed}')
+
+
+@click.group('team')
+def team_group():
+    """Reporting lines and team rollups"""
+
+
+@team_group.command('refresh')
+@click.option('--company', default=None, help='Company slug (default: every company)')
+@with_appcontext
+def team_refresh_command(company):
+    """Recompute every manager's team rollup from the base tables"""
+    with company_scope(company):
+        written = refresh_team_rollups()
+    click.echo(f'Refreshed {written} team rollups')
+
+
+@team_group.command('rebuild')
+@click.option('--company', default=None, help='Company slug (default: every company)')
+@with_appcontext
+def team_rebuild_command(company):
+    """Recreate the reporting-line closure table from users.manager_id"""
+    try:
+        with company_scope(company):
+            written = rebuild_hierarchy()
+    except HierarchyError as e:
+        raise click.ClickException(str(e))
+    click.echo(f'Wrote {written} reporting-line rows')
+
+
+@click.group('trends')
+def trends_group():
+    """Daily statistics for trend reports"""
+
+
+@trends_group.command('aggregate')
+@click.option('--company', default=None, help='Company slug (default: every company)')
+@with_appcontext
+def trends_aggregate_command(company):
+    """Record today's IDP counts and completion (re-running replaces today's rows)"""
+    with company_scope(company):
+        written = aggregate_daily_stats()
+    click.echo(f'Wrote {written} daily statistics rows')
+
+
+def register_commands(app):
+    """Attach CLI commands to the Flask app"""
+    app.cli.add_command(company_group)
+    app.cli.add_command(export_command)
+    app.cli.add_command(skills_group)
+    app.cli.add_command(idp_group)
+    app.cli.add_command(audit_group)
+    app.cli.add_command(pipeline_group)
+    app.cli.add_command(archive_group)
+    app.cli.add_command(assets_group)
+    app.cli.add_command(team_group)
+    app.cli.add_command(trends_group)
@@ -22,4 +22,59 @@ class Config:
     
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY') or 'your-gemini-api-key-here'
+    IDP_MAX_LLM_SKILLS = int(os.environ.get('IDP_MAX_LLM_SKILLS', 3))  # Skill gaps planned per generated IDP
+    IDP_AUTO_ENRICH = os.environ.get('IDP_AUTO_ENRICH', 'True').lower() == 'true'  # Gemini plans for skills missing from the catalog
+    SKILL_MATCH_THRESHOLD = float(os.environ.get('SKILL_MATCH_THRESHOLD', 0.7))  # Similarity counted as a match
+    
+    # Gemini prompt budgets, quotas (0 = unlimited, per UTC day) and pricing
+    GEMINI_PROMPT_TOKEN_BUDGET = int(os.environ.get('GEMINI_PROMPT_TOKEN_BUDGET', 512))  # Inputs are trimmed to fit
+    GEMINI_PROMPT_MAX_SKILLS = int(os.environ.get('GEMINI_PROMPT_MAX_SKILLS', 25))  # Employee skills listed in a prompt
+    GEMINI_PROMPT_MAX_GOAL_CHARS = int(os.environ.get('GEMINI_PROMPT_MAX_GOAL_CHARS', 300))
+    GEMINI_RESPONSE_TOKEN_ESTIMATE = int(os.environ.get('GEMINI_RESPONSE_TOKEN_ESTIMATE', 300))  # Reserved per call by quota checks
+    GEMINI_DAILY_CALL_QUOTA = int(os.environ.get('GEMINI_DAILY_CALL_QUOTA', 0))  # Per company
+    GEMINI_DAILY_TOKEN_QUOTA = int(os.environ.get('GEMINI_DAILY_TOKEN_QUOTA', 0))  # Per company
+    GEMINI_GLOBAL_DAILY_TOKEN_QUOTA = int(os.environ.get('GEMINI_GLOBAL_DAILY_TOKEN_QUOTA', 0))  # All companies
+    GEMINI_PROMPT_COST_PER_1K = float(os.environ.get('GEMINI_PROMPT_COST_PER_1K', 0.0))  # Currency per 1000 prompt tokens
+    GEMINI_RESPONSE_COST_PER_1K = float(os.environ.get('GEMINI_RESPONSE_COST_PER_1K', 0.0))
     PERMANENT_SESSION_LIFETIME = timedelta(hours=24)
+    
+    # Login admission control
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')  # Older hashes are upgraded on login
+    LOGIN_HASH_WORKERS = int(os.environ.get('LOGIN_HASH_WORKERS', 2))  # Concurrent password verifications per process
+    LOGIN_HASH_QUEUE_DEPTH = int(os.environ.get('LOGIN_HASH_QUEUE_DEPTH', 8))  # Waiting verifications before rejecting
+    LOGIN_HASH_TIMEOUT = float(os.environ.get('LOGIN_HASH_TIMEOUT', 5))
+    LOGIN_IP_LIMIT = int(os.environ.get('LOGIN_IP_LIMIT', 30))  # Failed attempts per IP per window
+    LOGIN_IP_WINDOW = int(os.environ.get('LOGIN_IP_WINDOW', 60))
+    LOGIN_ACCOUNT_FAILURE_LIMIT = int(os.environ.get('LOGIN_ACCOUNT_FAILURE_LIMIT', 5))  # Failed attempts per account per window
+    LOGIN_ACCOUNT_WINDOW = int(os.environ.get('LOGIN_ACCOUNT_WINDOW', 300))
+    # Reverse proxies in front of the app; their X-Forwarded-For/-Proto give the client IP per-IP limits use
+    TRUSTED_PROXY_COUNT = int(os.environ.get('TRUSTED_PROXY_COUNT', 0))
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # Bearer token for scraping /metrics
+    
+    # Request profiling (stack samples + SQL per request, listed at /hr/profiles)
+    PROFILE_ALL_REQUESTS = os.environ.get('PROFILE_ALL_REQUESTS', 'False').lower() == 'true'
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0.0))  # Share of requests profiled at random
+    PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN')  # Requests with "X-Profile: <token>" are profiled
+    PROFILE_INTERVAL = float(os.environ.get('PROFILE_INTERVAL', 0.005))  # Seconds between stack samples
+    PROFILE_DIR = os.environ.get('PROFILE_DIR')  # Defaults to <instance>/profiles
+    PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 200))  # Newest profiles kept on disk
+    
+    # Background jobs (streamed IDP generation)
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 4))  # Concurrent jobs per process
+    JOB_RETENTION_SECONDS = int(os.environ.get('JOB_RETENTION_SECONDS', 600))  # Keep finished jobs' events for reconnects
+    JOB_STALE_SECONDS = int(os.environ.get('JOB_STALE_SECONDS', 300))  # Running job without events this long counts as dead
+    SSE_RESPONSE_SECONDS = float(os.environ.get('SSE_RESPONSE_SECONDS', 5))  # Longest a stream response holds a worker, 0 = short polling
+    SSE_RETRY_MS = int(os.environ.get('SSE_RETRY_MS', 500))  # EventSource reconnect delay between responses
+    
+    # Write-behind audit log
+    AUDIT_QUEUE_SIZE = int(os.environ.get('AUDIT_QUEUE_SIZE', 10000))  # Buffered events before requests write batches themselves
+    AUDIT_BATCH_SIZE = int(os.environ.get('AUDIT_BATCH_SIZE', 500))
+    AUDIT_FLUSH_INTERVAL = float(os.environ.get('AUDIT_FLUSH_INTERVAL', 1.0))  # Seconds between background flushes
+    
+    # Archival of finished IDPs (flask archive run / nightly pipeline)
+    ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 180))  # Days without activity before completed/superseded IDPs move out
+    ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', 1000))  # IDPs moved per transaction
+    
+    # Template caching (defaults to <instance>/jinja_cache)
+    TEMPLATE_CACHE_DIR = os.environ.get('TEMPLATE_CACHE_DIR')
+    FRAGMENT_CACHE_SIZE = int(os.environ.get('FRAGMENT_CACHE_SIZE', 256))
@@ -6,9 +6,20 @@
 CREATE DATABASE IF NOT EXISTS idp_system CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
 USE idp_system;
 
+-- Companies (tenants); every other table is scoped by company_id
+CREATE TABLE IF NOT EXISTS companies (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    slug VARCHAR(50) NOT NULL UNIQUE COMMENT 'Short code, e.g. acme',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+INSERT IGNORE INTO companies (id, name, slug) VALUES (1, 'Default', 'default');
+
 -- Users table (HR and Employees)
 CREATE TABLE IF NOT EXISTS users (
     id INT AUTO_INCREMENT PRIMARY KEY,
+    company_id INT NOT NULL,
     name VARCHAR(100) NOT NULL,
     email VARCHAR(120) NOT NULL UNIQUE,
     password_hash VARCHAR(255) NOT NULL,
@@ -18,57 +29,346 @@ CREATE TABLE IF NOT EXISTS users (
     goal TEXT COMMENT 'Career goal',
     current_role VARCHAR(100),
     target_role VARCHAR(100),
+    manager_id INT COMMENT 'Direct manager (same company)',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (company_id) REFERENCES companies(id),
+    FOREIGN KEY (manager_id) REFERENCES users(id),
     INDEX idx_email (email),
-    INDEX idx_role (role)
+    INDEX idx_role (role),
+    INDEX ix_users_company_role (company_id, role),
+    INDEX ix_users_company_target_role (company_id, target_role),
+    INDEX ix_users_company_manager (company_id, manager_id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- Roles table (Job positions with required skills)
 CREATE TABLE IF NOT EXISTS roles (
     id INT AUTO_INCREMENT PRIMARY KEY,
-    role_name VARCHAR(100) NOT NULL UNIQUE,
+    company_id INT NOT NULL,
+    role_name VARCHAR(100) NOT NULL,
     required_skills TEXT COMMENT 'Comma-separated required skills',
     description TEXT,
-    INDEX idx_role_name (role_name)
+    FOREIGN KEY (company_id) REFERENCES companies(id),
+    INDEX idx_role_name (role_name),
+    UNIQUE KEY uq_roles_company_name (company_id, role_name)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Role skill weights (relative importance of each required skill)
+CREATE TABLE IF NOT EXISTS role_skills (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    company_id INT NOT NULL,
+    role_id INT NOT NULL,
+    skill VARCHAR(100) NOT NULL,
+    weight FLOAT NOT NULL DEFAULT 1.0,
+    FOREIGN KEY (company_id) REFERENCES companies(id),
+    FOREIGN KEY (role_id) REFERENCES roles(id) ON DELETE CASCADE,
+    UNIQUE KEY uq_role_skill (role_id, skill),
+    INDEX ix_role_skills_company_role (company_id, role_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Per-company skill demand/scarcity (rebuilt by `flask skills refresh-demand`)
+CREATE TABLE IF NOT EXISTS skill_demand (
+    company_id INT NOT NULL,
+    skill_key VARCHAR(100) NOT NULL COMMENT 'Lowercased skill name',
+    skill VARCHAR(100) NOT NULL,
+    demand FLOAT NOT NULL DEFAULT 0 COMMENT '0-1',
+    scarcity FLOAT NOT NULL DEFAULT 0 COMMENT '0-1, share of employees lacking the skill',
+    employees_with_skill INT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (company_id, skill_key),
+    FOREIGN KEY (company_id) REFERENCES companies(id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Suggested roles per employee (top-k, upserted on profile saves and by `flask skills suggest-roles`)
+CREATE TABLE IF NOT EXISTS role_suggestions (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    company_id INT NOT NULL,
+    user_id INT NOT NULL,
+    role_id INT NOT NULL,
+    `rank` INT NOT NULL COMMENT '1 = best fit',
+    score FLOAT NOT NULL,
+    coverage FLOAT NOT NULL,
+    roles_version VARCHAR(20),
+    profile_hash VARCHAR(40),
+    computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (role_id) REFERENCES roles(id) ON DELETE CASCADE,
+    FOREIGN KEY (company_id) REFERENCES companies(id),
+    UNIQUE KEY uq_role_suggestions_user_rank (user_id, `rank`),
+    INDEX ix_role_suggestions_company_user (company_id, user_id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- IDPs table (Individual Development Plans)
 CREATE TABLE IF NOT EXISTS idps (
     id INT AUTO_INCREMENT PRIMARY KEY,
+    company_id INT NOT NULL,
     user_id INT NOT NULL,
     skill_gap TEXT COMMENT 'JSON or comma-separated missing skills',
     action TEXT NOT NULL COMMENT 'SMART action plan',
     timeline VARCHAR(100) COMMENT 'Time-bound goal',
     metric VARCHAR(255) COMMENT 'Measurable metric',
-    status VARCHAR(20) DEFAULT 'pending' COMMENT 'pending, in_progress, completed',
+    status VARCHAR(20) DEFAULT 'pending' COMMENT 'pending, in_progress, completed, superseded',
+    source VARCHAR(20) DEFAULT 'manual' COMMENT 'catalog, template (awaiting enrichment), llm, manual',
+    input_fingerprint VARCHAR(64) COMMENT 'Hash of the generation inputs (generated IDPs only)',
+    idempotency_key VARCHAR(64) COMMENT 'Form submission that created the IDP',
+    active_fingerprint VARCHAR(64) COMMENT 'input_fingerprint on the first row of a live generated plan, else NULL',
+    stale BOOLEAN DEFAULT FALSE COMMENT 'Inputs changed since generation (nightly pipeline)',
+    version INT NOT NULL DEFAULT 1 COMMENT 'Optimistic lock, incremented by every update',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
     INDEX idx_user_id (user_id),
-    INDEX idx_status (status)
+    INDEX idx_status (status),
+    INDEX ix_idps_source (source),
+    INDEX ix_idps_idempotency_key (idempotency_key),
+    INDEX ix_idps_user_fingerprint (user_id, input_fingerprint),
+    FOREIGN KEY (company_id) REFERENCES companies(id),
+    INDEX ix_idps_company_status (company_id, status),
+    INDEX ix_idps_company_user_status (company_id, user_id, status, input_fingerprint),
+    UNIQUE KEY uq_idps_user_active_fingerprint (user_id, active_fingerprint),
+    FULLTEXT INDEX ft_idps_text (action, metric, skill_gap)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- Progress table (Progress tracking for IDPs)
 CREATE TABLE IF NOT EXISTS progress (
     id INT AUTO_INCREMENT PRIMARY KEY,
+    company_id INT NOT NULL,
     idp_id INT NOT NULL,
     completion INT DEFAULT 0 COMMENT 'Percentage 0-100',
     feedback TEXT,
+    version INT NOT NULL DEFAULT 1 COMMENT 'Optimistic lock, incremented by every update',
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (idp_id) REFERENCES idps(id) ON DELETE CASCADE,
-    INDEX idx_idp_id (idp_id)
+    FOREIGN KEY (company_id) REFERENCES companies(id),
+    INDEX idx_idp_id (idp_id),
+    INDEX ix_progress_company_idp (company_id, idp_id, completion),
+    FULLTEXT INDEX ft_progress_feedback (feedback)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Data versions (bumped on every committed write, used for cache invalidation)
+CREATE TABLE IF NOT EXISTS data_versions (
+    namespace VARCHAR(50) PRIMARY KEY COMMENT 'Table name, e.g. users',
+    version INT NOT NULL DEFAULT 0
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+INSERT IGNORE INTO data_versions (namespace, version) VALUES
+('users', 0), ('roles', 0), ('idps', 0), ('progress', 0), ('gemini_usage', 0), ('team_rollups', 0),
+('daily_idp_stats', 0), ('role_suggestions', 0);
+
+-- Audit log (append-only, written in batches by a background thread)
+-- Partitioned by month so range queries prune old months and retention is a
+-- DROP PARTITION. Only the catch-all partition is created here: the app splits
+-- off the current and upcoming months at startup (and converts a table created
+-- by db.create_all()), `flask audit add-partitions` adds more and
+-- `flask audit prune` drops old ones.
+CREATE TABLE IF NOT EXISTS audit_events (
+    id BIGINT AUTO_INCREMENT,
+    company_id INT NOT NULL,
+    month INT NOT NULL COMMENT 'YYYYMM of created_at, partition key',
+    created_at DATETIME NOT NULL,
+    actor_id INT NULL COMMENT 'User who made the change, NULL for system jobs',
+    action VARCHAR(10) NOT NULL COMMENT 'create, update, delete',
+    entity_type VARCHAR(20) NOT NULL COMMENT 'Table name, e.g. idps',
+    entity_id INT NULL,
+    changes TEXT COMMENT 'Compact JSON of changed columns',
+    PRIMARY KEY (id, month),
+    INDEX ix_audit_entity_time (entity_type, entity_id, created_at),
+    INDEX ix_audit_actor_time (actor_id, created_at),
+    INDEX ix_audit_month (month),
+    INDEX ix_audit_company_time (company_id, created_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+PARTITION BY RANGE (month) (
+    PARTITION pmax VALUES LESS THAN MAXVALUE
+);
+
+-- Per-employee skill gap for the target role (rebuilt by `flask pipeline run`)
+CREATE TABLE IF NOT EXISTS skill_gaps (
+    user_id INT PRIMARY KEY,
+    company_id INT NOT NULL,
+    target_role VARCHAR(100),
+    total_required INT NOT NULL DEFAULT 0,
+    missing_count INT NOT NULL DEFAULT 0,
+    gap_percentage FLOAT NOT NULL DEFAULT 0,
+    missing_skills TEXT COMMENT 'Comma-separated',
+    input_fingerprint VARCHAR(64) COMMENT 'Fingerprint a plan generated now would get',
+    computed_at DATETIME,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (company_id) REFERENCES companies(id),
+    INDEX ix_skill_gaps_company_missing (company_id, missing_count)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Batch pipeline runs and their checkpoints (one row per finished chunk/step)
+CREATE TABLE IF NOT EXISTS pipeline_runs (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    status VARCHAR(20) NOT NULL DEFAULT 'running' COMMENT 'running, completed, failed',
+    steps VARCHAR(255) NOT NULL COMMENT 'Comma-separated step names',
+    regenerate BOOLEAN NOT NULL DEFAULT FALSE,
+    started_at DATETIME,
+    finished_at DATETIME,
+    error TEXT
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+CREATE TABLE IF NOT EXISTS pipeline_chunks (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    run_id INT NOT NULL,
+    step VARCHAR(50) NOT NULL,
+    chunk_index INT NOT NULL,
+    first_id INT COMMENT 'Inclusive employee id range (chunked steps only)',
+    last_id INT,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending' COMMENT 'pending, done',
+    processed INT NOT NULL DEFAULT 0,
+    stale INT NOT NULL DEFAULT 0 COMMENT 'IDPs flagged stale',
+    regenerated INT NOT NULL DEFAULT 0 COMMENT 'Employees given a new plan',
+    finished_at DATETIME,
+    FOREIGN KEY (run_id) REFERENCES pipeline_runs(id),
+    UNIQUE KEY uq_pipeline_chunk (run_id, step, chunk_index)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Background jobs and their events (streamed IDP generation), readable by every worker
+CREATE TABLE IF NOT EXISTS background_jobs (
+    id VARCHAR(32) PRIMARY KEY COMMENT 'uuid4 hex, part of the stream URL',
+    company_id INT NOT NULL,
+    owner_id INT COMMENT 'User who started it; only they can stream it',
+    dedup_key VARCHAR(255) COMMENT 'Starting a job with the key of a running one joins it',
+    status VARCHAR(20) NOT NULL DEFAULT 'running' COMMENT 'running, finished',
+    created_at DATETIME,
+    updated_at DATETIME COMMENT 'Last event; a running job gone quiet is abandoned',
+    finished_at DATETIME,
+    FOREIGN KEY (company_id) REFERENCES companies(id),
+    INDEX ix_background_jobs_dedup (dedup_key, status),
+    INDEX ix_background_jobs_updated (updated_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+CREATE TABLE IF NOT EXISTS job_events (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY COMMENT 'SSE event id',
+    job_id VARCHAR(32) NOT NULL,
+    event VARCHAR(20) NOT NULL COMMENT 'plan, delta, action, done, error',
+    data TEXT NOT NULL COMMENT 'JSON payload',
+    created_at DATETIME,
+    FOREIGN KEY (job_id) REFERENCES background_jobs(id),
+    INDEX ix_job_events_job (job_id, id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Archive of finished IDPs and their progress (moved by `flask archive run`)
+CREATE TABLE IF NOT EXISTS idps_archive (
+    id INT PRIMARY KEY COMMENT 'Same id as in idps',
+    company_id INT NOT NULL,
+    user_id INT NOT NULL,
+    skill_gap TEXT,
+    action TEXT NOT NULL,
+    timeline VARCHAR(100),
+    metric VARCHAR(255),
+    status VARCHAR(20),
+    source VARCHAR(20),
+    input_fingerprint VARCHAR(64),
+    idempotency_key VARCHAR(64),
+    stale BOOLEAN DEFAULT FALSE,
+    created_at DATETIME,
+    archived_at DATETIME,
+    INDEX ix_idps_archive_company_user (company_id, user_id, created_at)
+) ENGINE=InnoDB ROW_FORMAT=COMPRESSED DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+CREATE TABLE IF NOT EXISTS progress_archive (
+    id INT PRIMARY KEY COMMENT 'Same id as in progress',
+    company_id INT NOT NULL,
+    idp_id INT NOT NULL,
+    completion INT,
+    feedback TEXT,
+    updated_at DATETIME,
+    archived_at DATETIME,
+    INDEX ix_progress_archive_idp_id (idp_id)
+) ENGINE=InnoDB ROW_FORMAT=COMPRESSED DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Archived IDP counts per employee and status, added to live counts in reports
+CREATE TABLE IF NOT EXISTS archive_rollups (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    company_id INT NOT NULL,
+    user_id INT NOT NULL,
+    status VARCHAR(20) NOT NULL COMMENT 'Status of the IDPs when archived',
+    idp_count INT NOT NULL DEFAULT 0,
+    progress_count INT NOT NULL DEFAULT 0 COMMENT 'Archived progress entries with a completion',
+    completion_sum INT NOT NULL DEFAULT 0,
+    updated_at DATETIME,
+    FOREIGN KEY (company_id) REFERENCES companies(id),
+    UNIQUE KEY uq_archive_rollup_user_status (user_id, status),
+    INDEX ix_archive_rollups_company_status (company_id, status, idp_count)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Gemini token usage per company and UTC day (quotas and cost reporting)
+CREATE TABLE IF NOT EXISTS gemini_usage (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    company_id INT NOT NULL,
+    day DATE NOT NULL COMMENT 'UTC',
+    calls INT NOT NULL DEFAULT 0,
+    failures INT NOT NULL DEFAULT 0,
+    rejected INT NOT NULL DEFAULT 0 COMMENT 'Calls refused by a quota (not sent)',
+    estimated_calls INT NOT NULL DEFAULT 0 COMMENT 'Calls whose tokens were estimated locally',
+    prompt_tokens INT NOT NULL DEFAULT 0,
+    response_tokens INT NOT NULL DEFAULT 0,
+    updated_at DATETIME,
+    FOREIGN KEY (company_id) REFERENCES companies(id),
+    UNIQUE KEY uq_gemini_usage_company_day (company_id, day)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Reporting lines as a closure table: one row per (manager at any level, report),
+-- plus a depth-0 row per user, so a subtree is a single indexed lookup
+CREATE TABLE IF NOT EXISTS user_hierarchy (
+    company_id INT NOT NULL,
+    ancestor_id INT NOT NULL,
+    descendant_id INT NOT NULL,
+    depth INT NOT NULL COMMENT '0 = the user themselves, 1 = direct report, ...',
+    PRIMARY KEY (ancestor_id, descendant_id),
+    FOREIGN KEY (company_id) REFERENCES companies(id),
+    FOREIGN KEY (ancestor_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (descendant_id) REFERENCES users(id) ON DELETE CASCADE,
+    INDEX ix_user_hierarchy_descendant (descendant_id, depth)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Precomputed IDP stats per manager over everyone below them
+CREATE TABLE IF NOT EXISTS team_rollups (
+    manager_id INT PRIMARY KEY,
+    company_id INT NOT NULL,
+    headcount INT NOT NULL DEFAULT 0 COMMENT 'Everyone below the manager, at any depth',
+    direct_reports INT NOT NULL DEFAULT 0,
+    pending_idps INT NOT NULL DEFAULT 0 COMMENT 'Live and archived IDPs of the team',
+    in_progress_idps INT NOT NULL DEFAULT 0,
+    completed_idps INT NOT NULL DEFAULT 0,
+    progress_count INT NOT NULL DEFAULT 0 COMMENT 'Progress entries with a completion',
+    completion_sum INT NOT NULL DEFAULT 0,
+    top_gaps TEXT COMMENT 'JSON [[skill, employees missing it], ...]',
+    updated_at DATETIME,
+    FOREIGN KEY (company_id) REFERENCES companies(id),
+    FOREIGN KEY (manager_id) REFERENCES users(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Daily snapshot of IDP counts and completion per status and target role (trend reports)
+CREATE TABLE IF NOT EXISTS daily_idp_stats (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    company_id INT NOT NULL,
+    day DATE NOT NULL COMMENT 'UTC day the snapshot was taken',
+    role VARCHAR(100) NOT NULL DEFAULT '' COMMENT 'Employees target role, empty if none',
+    status VARCHAR(20) NOT NULL COMMENT 'pending, in_progress, completed',
+    idp_count INT NOT NULL DEFAULT 0 COMMENT 'Live and archived IDPs in this status',
+    progress_count INT NOT NULL DEFAULT 0 COMMENT 'Their progress entries with a completion',
+    completion_sum INT NOT NULL DEFAULT 0,
+    computed_at DATETIME,
+    FOREIGN KEY (company_id) REFERENCES companies(id),
+    UNIQUE KEY uq_daily_idp_stats (company_id, day, role, status)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- Insert default HR user (password: hr123)
 -- Password hash generated using werkzeug.security.generate_password_hash('hr123')
-INSERT INTO users (name, email, password_hash, role) VALUES 
-('HR Admin', 'hr@company.com', 'scrypt:32768:8:1$kV7xN5jGvXMz8WQp$c8b5f4e3d2a1b0c9d8e7f6a5b4c3d2e1f0a9b8c7d6e5f4a3b2c1d0e9f8a7b6c5d4e3f2a1b0c9d8e7f6a5b4c3d2e1', 'hr');
+INSERT INTO users (company_id, name, email, password_hash, role) VALUES 
+(1, 'HR Admin', 'hr@company.com', 'scrypt:32768:8:1$kV7xN5jGvXMz8WQp$c8b5f4e3d2a1b0c9d8e7f6a5b4c3d2e1f0a9b8c7d6e5f4a3b2c1d0e9f8a7b6c5d4e3f2a1b0c9d8e7f6a5b4c3d2e1', 'hr');
 
 -- Insert default Employee user (password: emp123)
-INSERT INTO users (name, email, password_hash, role, skills, experience, goal, current_role, target_role) VALUES 
-('John Doe', 'john@company.com', 'scrypt:32768:8:1$A2bC3dE4fG5hI6j7$a1b2c3d4e5f6a7b8c9d0e1f2a3b4c5d6e7f8a9b0c1d2e3f4a5b6c7d8e9f0a1b2c3d4e5f6a7b8c9d0e1f2a3b4c5d6', 'employee', 'Python, HTML, CSS', 2, 'Become a Full Stack Developer', 'Junior Developer', 'Full Stack Developer');
+INSERT INTO users (company_id, name, email, password_hash, role, skills, experience, goal, current_role, target_role) VALUES 
+(1, 'John Doe', 'john@company.com', 'scrypt:32768:8:1$A2bC3dE4fG5hI6j7$a1b2c3d4e5f6a7b8c9d0e1f2a3b4c5d6e7f8a9b0c1d2e3f4a5b6c7d8e9f0a1b2c3d4e5f6a7b8c9d0e1f2a3b4c5d6', 'employee', 'Python, HTML, CSS', 2, 'Become a Full Stack Developer', 'Junior Developer', 'Full Stack Developer');
 
 -- Insert sample roles
-INSERT INTO roles (role_name, required_skills, description) VALUES 
-('Full Stack Developer', 'Python, JavaScript, React, Node.js, SQL, Git, REST APIs, Docker', 'Develops both frontend and backend applications'),
-('Data Scientist', 'Python, Machine Learning, Statistics, SQL, Data Visualization, Pandas, NumPy', 'Analyzes data and builds ML models'),
-('DevOps Engineer', 'Linux, Docker, Kubernetes, CI/CD, AWS, Terraform, Monitoring', 'Manages infrastructure and deployment pipelines');
+INSERT INTO roles (company_id, role_name, required_skills, description) VALUES 
+(1, 'Full Stack Developer', 'Python, JavaScript, React, Node.js, SQL, Git, REST APIs, Docker', 'Develops both frontend and backend applications'),
+(1, 'Data Scientist', 'Python, Machine Learning, Statistics, SQL, Data Visualization, Pandas, NumPy', 'Analyzes data and builds ML models'),
+(1, 'DevOps Engineer', 'Linux, Docker, Kubernetes, CI/CD, AWS, Terraform, Monitoring', 'Manages infrastructure and deployment pipelines');
+
+-- Every user is their own depth-0 ancestor
+INSERT IGNORE INTO user_hierarchy (company_id, ancestor_id, descendant_id, depth)
+SELECT company_id, id, id, 0 FROM users;
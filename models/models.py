@@ -1,11 +1,42 @@
+from flask import current_app, has_app_context
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import declared_attr
+from sqlalchemy.schema import CreateColumn, PrimaryKeyConstraint
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
+import json
 
 db = SQLAlchemy()
 
-class User(UserMixin, db.Model):
+def password_hash_method():
+    if has_app_context():
+        return current_app.config.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    return 'scrypt:32768:8:1'
+
+
+class Company(db.Model):
+    __tablename__ = 'companies'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    slug = db.Column(db.String(50), unique=True, nullable=False)  # Short code, e.g. 'acme'
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<Company {self.slug}>'
+
+
+class TenantMixin:
+    """Row owned by one company; queries are filtered to the current company (services/tenancy.py)"""
+    
+    @declared_attr
+    def company_id(cls):
+        return db.Column(db.Integer, db.ForeignKey('companies.id'), nullable=False)
+
+
+class User(TenantMixin, UserMixin, db.Model):
     __tablename__ = 'users'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -18,16 +49,29 @@ class User(UserMixin, db.Model):
     goal = db.Column(db.Text)  # Career goal
     current_role = db.Column(db.String(100))
     target_role = db.Column(db.String(100))
+    # Direct manager (same company); active_history loads the replaced value for team rollup increments
+    manager_id = db.column_property(db.Column(db.Integer, db.ForeignKey('users.id')), active_history=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     idps = db.relationship('IDP', backref='user', lazy=True, cascade='all, delete-orphan')
+    manager = db.relationship('User', remote_side=[id], backref='direct_reports')
+    
+    __table_args__ = (
+        db.Index('ix_users_company_role', 'company_id', 'role'),
+        db.Index('ix_users_company_target_role', 'company_id', 'target_role'),
+        db.Index('ix_users_company_manager', 'company_id', 'manager_id'),
+    )
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = generate_password_hash(password, method=password_hash_method())
     
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
     
+    def password_needs_rehash(self):
+        """True if the stored hash was made with different parameters than PASSWORD_HASH_METHOD"""
+        return self.password_hash.split('$', 1)[0] != password_hash_method()
+    
     def get_skills_list(self):
         return [s.strip() for s in self.skills.split(',') if s.strip()] if self.skills else []
     
@@ -35,47 +79,416 @@ class User(UserMixin, db.Model):
         return f'<User {self.email}>'
 
 
-class Role(db.Model):
+class Role(TenantMixin, db.Model):
     __tablename__ = 'roles'
     
     id = db.Column(db.Integer, primary_key=True)
-    role_name = db.Column(db.String(100), unique=True, nullable=False)
+    role_name = db.Column(db.String(100), nullable=False)
     required_skills = db.Column(db.Text)  # Comma-separated required skills
     description = db.Column(db.Text)
     
+    skill_weights = db.relationship('RoleSkill', backref='role', lazy=True, cascade='all, delete-orphan')
+    
+    __table_args__ = (db.UniqueConstraint('company_id', 'role_name', name='uq_roles_company_name'),)
+    
     def get_required_skills_list(self):
         return [s.strip() for s in self.required_skills.split(',') if s.strip()] if self.required_skills else []
     
+    def get_skill_weights(self):
+        """Map of lowercased skill -> importance weight (skills without a row weigh 1.0)"""
+        return {rs.skill.lower(): rs.weight for rs in self.skill_weights}
+    
     def __repr__(self):
         return f'<Role {self.role_name}>'
 
 
-class IDP(db.Model):
+class RoleSkill(TenantMixin, db.Model):
+    __tablename__ = 'role_skills'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    role_id = db.Column(db.Integer, db.ForeignKey('roles.id'), nullable=False, index=True)
+    skill = db.Column(db.String(100), nullable=False)
+    weight = db.Column(db.Float, nullable=False, default=1.0)  # Relative importance for the role
+    
+    __table_args__ = (
+        db.UniqueConstraint('role_id', 'skill', name='uq_role_skill'),
+        db.Index('ix_role_skills_company_role', 'company_id', 'role_id'),
+    )
+    
+    def __repr__(self):
+        return f'<RoleSkill {self.skill}={self.weight} for Role {self.role_id}>'
+
+
+class SkillDemand(TenantMixin, db.Model):
+    __tablename__ = 'skill_demand'
+    
+    company_id = db.Column(db.Integer, db.ForeignKey('companies.id'), primary_key=True)
+    skill_key = db.Column(db.String(100), primary_key=True)  # Lowercased skill name
+    skill = db.Column(db.String(100), nullable=False)  # Display name
+    demand = db.Column(db.Float, nullable=False, default=0.0)  # 0-1, weighted by roles and employees targeting them
+    scarcity = db.Column(db.Float, nullable=False, default=0.0)  # 0-1, share of employees lacking the skill
+    employees_with_skill = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<SkillDemand {self.skill} demand={self.demand:.2f} scarcity={self.scarcity:.2f}>'
+
+
+class RoleSuggestion(TenantMixin, db.Model):
+    __tablename__ = 'role_suggestions'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    role_id = db.Column(db.Integer, db.ForeignKey('roles.id', ondelete='CASCADE'), nullable=False)
+    rank = db.Column(db.Integer, nullable=False)  # 1 = best fit
+    score = db.Column(db.Float, nullable=False)  # Combined coverage + experience fit, 0-1
+    coverage = db.Column(db.Float, nullable=False)  # Weighted share of the role's skills held, 0-1
+    roles_version = db.Column(db.String(20))  # data_version('roles') the score was computed at
+    profile_hash = db.Column(db.String(40))  # Hash of skills/experience/current role at compute time
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    role = db.relationship('Role')
+    
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'rank', name='uq_role_suggestions_user_rank'),
+        db.Index('ix_role_suggestions_company_user', 'company_id', 'user_id'),
+    )
+    
+    def __repr__(self):
+        return f'<RoleSuggestion #{self.rank} Role {self.role_id} for User {self.user_id}>'
+
+
+class IDP(TenantMixin, db.Model):
     __tablename__ = 'idps'
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    # active_history: team rollups need the replaced owner and status to move counts
+    user_id = db.column_property(db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False),
+                                 active_history=True)
     skill_gap = db.Column(db.Text)  # JSON or comma-separated missing skills
     action = db.Column(db.Text, nullable=False)  # SMART action
     timeline = db.Column(db.String(100))  # Time-bound goal
     metric = db.Column(db.String(255))  # Measurable metric
-    status = db.Column(db.String(20), default='pending')  # pending, in_progress, completed
+    status = db.column_property(db.Column(db.String(20), default='pending'),
+                                active_history=True)  # pending, in_progress, completed, superseded
+    source = db.Column(db.String(20), default='manual', index=True)  # catalog, template (awaiting enrichment), llm, manual
+    input_fingerprint = db.Column(db.String(64))  # Hash of the generation inputs (generated IDPs only)
+    idempotency_key = db.Column(db.String(64), index=True)  # Form submission that created the IDP
+    # input_fingerprint on the first row of a live generated plan, NULL otherwise; unique per employee
+    active_fingerprint = db.Column(db.String(64))
+    stale = db.Column(db.Boolean, default=False)  # Inputs changed since generation (set by the nightly pipeline)
+    version = db.Column(db.Integer, nullable=False, default=1)  # Optimistic lock, incremented by every ORM update
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     progress_entries = db.relationship('Progress', backref='idp', lazy=True, cascade='all, delete-orphan')
     
+    __table_args__ = (
+        db.Index('ix_idps_user_fingerprint', 'user_id', 'input_fingerprint'),
+        db.Index('ix_idps_company_status', 'company_id', 'status'),
+        # One employee's plans within the tenant filter; otherwise SQLite walks every IDP of the
+        # company through ix_idps_company_status to list or supersede them
+        db.Index('ix_idps_company_user_status', 'company_id', 'user_id', 'status', 'input_fingerprint'),
+        # Two submissions for the same inputs cannot both save a plan, whichever worker handles them
+        db.UniqueConstraint('user_id', 'active_fingerprint', name='uq_idps_user_active_fingerprint'),
+    )
+    # Updates of a row changed by someone else since it was loaded raise StaleDataError
+    __mapper_args__ = {'version_id_col': version}
+    
     def __repr__(self):
         return f'<IDP {self.id} for User {self.user_id}>'
 
 
-class Progress(db.Model):
+class Progress(TenantMixin, db.Model):
     __tablename__ = 'progress'
     
     id = db.Column(db.Integer, primary_key=True)
-    idp_id = db.Column(db.Integer, db.ForeignKey('idps.id'), nullable=False)
-    completion = db.Column(db.Integer, default=0)  # Percentage 0-100
+    # active_history: team rollups need the replaced IDP and completion to move sums
+    idp_id = db.column_property(db.Column(db.Integer, db.ForeignKey('idps.id'), nullable=False),
+                                active_history=True)
+    completion = db.column_property(db.Column(db.Integer, default=0), active_history=True)  # Percentage 0-100
     feedback = db.Column(db.Text)
+    version = db.Column(db.Integer, nullable=False, default=1)  # Optimistic lock, incremented by every ORM update
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (db.Index('ix_progress_company_idp', 'company_id', 'idp_id', 'completion'),)
+    __mapper_args__ = {'version_id_col': version}
+    
     def __repr__(self):
         return f'<Progress {self.id} for IDP {self.idp_id}>'
+
+
+class DataVersion(db.Model):
+    __tablename__ = 'data_versions'
+    
+    namespace = db.Column(db.String(50), primary_key=True)  # Table name, e.g. 'users'
+    version = db.Column(db.Integer, nullable=False, default=0)  # Bumped on every committed write
+    
+    def __repr__(self):
+        return f'<DataVersion {self.namespace}={self.version}>'
+
+
+@compiles(CreateColumn, 'sqlite')
+def _create_rowid_column(element, compiler, **kw):
+    # SQLite only autoincrements a lone INTEGER PRIMARY KEY; tables naming a
+    # 'sqlite_rowid_key' in their info keep a composite key elsewhere and this one here
+    column = element.element
+    if column.table is not None and column.table.info.get('sqlite_rowid_key') == column.name:
+        return f'{compiler.preparer.format_column(column)} INTEGER NOT NULL PRIMARY KEY'
+    return compiler.visit_create_column(element, **kw)
+
+
+@compiles(PrimaryKeyConstraint, 'sqlite')
+def _primary_key_constraint(constraint, compiler, **kw):
+    if constraint.table is not None and constraint.table.info.get('sqlite_rowid_key'):
+        return None
+    return compiler.visit_primary_key_constraint(constraint, **kw)
+
+
+class AuditEvent(TenantMixin, db.Model):
+    __tablename__ = 'audit_events'
+    
+    # MySQL partitions by month, and every unique key there must contain the partition column
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True, autoincrement=True)
+    month = db.Column(db.Integer, primary_key=True, autoincrement=False)  # YYYYMM of created_at; partition key on MySQL
+    created_at = db.Column(db.DateTime, nullable=False)
+    actor_id = db.Column(db.Integer)  # User who made the change, NULL for system jobs
+    action = db.Column(db.String(10), nullable=False)  # create, update, delete
+    entity_type = db.Column(db.String(20), nullable=False)  # Table name, e.g. 'idps'
+    entity_id = db.Column(db.Integer)
+    changes = db.Column(db.Text)  # Compact JSON: {column: value} on create, {column: [old, new]} on update
+    
+    __table_args__ = (
+        db.Index('ix_audit_entity_time', 'entity_type', 'entity_id', 'created_at'),
+        db.Index('ix_audit_actor_time', 'actor_id', 'created_at'),
+        db.Index('ix_audit_month', 'month'),
+        db.Index('ix_audit_company_time', 'company_id', 'created_at'),
+        {'info': {'sqlite_rowid_key': 'id'}},
+    )
+    
+    def __repr__(self):
+        return f'<AuditEvent {self.action} {self.entity_type}:{self.entity_id}>'
+
+
+class SkillGap(TenantMixin, db.Model):
+    __tablename__ = 'skill_gaps'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    target_role = db.Column(db.String(100))
+    total_required = db.Column(db.Integer, nullable=False, default=0)
+    missing_count = db.Column(db.Integer, nullable=False, default=0)
+    gap_percentage = db.Column(db.Float, nullable=False, default=0.0)
+    missing_skills = db.Column(db.Text)  # Comma-separated
+    input_fingerprint = db.Column(db.String(64))  # Fingerprint a plan generated now would get
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (db.Index('ix_skill_gaps_company_missing', 'company_id', 'missing_count'),)
+    
+    def __repr__(self):
+        return f'<SkillGap {self.missing_count}/{self.total_required} for User {self.user_id}>'
+
+
+class PipelineRun(db.Model):
+    __tablename__ = 'pipeline_runs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(20), nullable=False, default='running')  # running, completed, failed
+    steps = db.Column(db.String(255), nullable=False)  # Comma-separated step names
+    regenerate = db.Column(db.Boolean, nullable=False, default=False)
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    error = db.Column(db.Text)
+    
+    chunks = db.relationship('PipelineChunk', backref='run', lazy=True, cascade='all, delete-orphan')
+    
+    def __repr__(self):
+        return f'<PipelineRun {self.id} {self.status}>'
+
+
+class PipelineChunk(db.Model):
+    __tablename__ = 'pipeline_chunks'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    run_id = db.Column(db.Integer, db.ForeignKey('pipeline_runs.id'), nullable=False)
+    step = db.Column(db.String(50), nullable=False)
+    chunk_index = db.Column(db.Integer, nullable=False)
+    first_id = db.Column(db.Integer)  # Inclusive employee id range (chunked steps only)
+    last_id = db.Column(db.Integer)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, done
+    processed = db.Column(db.Integer, nullable=False, default=0)
+    stale = db.Column(db.Integer, nullable=False, default=0)  # IDPs flagged stale
+    regenerated = db.Column(db.Integer, nullable=False, default=0)  # Employees given a new plan
+    finished_at = db.Column(db.DateTime)
+    
+    __table_args__ = (db.UniqueConstraint('run_id', 'step', 'chunk_index', name='uq_pipeline_chunk'),)
+    
+    def __repr__(self):
+        return f'<PipelineChunk {self.step}#{self.chunk_index} {self.status}>'
+
+
+class BackgroundJob(TenantMixin, db.Model):
+    __tablename__ = 'background_jobs'
+    
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex, part of the stream URL
+    owner_id = db.Column(db.Integer)  # User who started it; only they can stream it
+    dedup_key = db.Column(db.String(255))  # Starting a job with the key of a running one joins it
+    status = db.Column(db.String(20), nullable=False, default='running')  # running, finished
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)  # Last event; a running job gone quiet is abandoned
+    finished_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.Index('ix_background_jobs_dedup', 'dedup_key', 'status'),
+        db.Index('ix_background_jobs_updated', 'updated_at'),
+    )
+    
+    def __repr__(self):
+        return f'<BackgroundJob {self.id} {self.status}>'
+
+
+class JobEvent(db.Model):
+    __tablename__ = 'job_events'
+    
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)  # SSE event id
+    job_id = db.Column(db.String(32), db.ForeignKey('background_jobs.id'), nullable=False)
+    event = db.Column(db.String(20), nullable=False)  # plan, delta, action, done, error
+    data = db.Column(db.Text, nullable=False)  # JSON payload
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (db.Index('ix_job_events_job', 'job_id', 'id'),)
+    
+    def __repr__(self):
+        return f'<JobEvent {self.job_id}#{self.id} {self.event}>'
+
+
+class ArchivedIDP(TenantMixin, db.Model):
+    __tablename__ = 'idps_archive'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # Same id as in idps
+    user_id = db.Column(db.Integer, nullable=False)
+    skill_gap = db.Column(db.Text)
+    action = db.Column(db.Text, nullable=False)
+    timeline = db.Column(db.String(100))
+    metric = db.Column(db.String(255))
+    status = db.Column(db.String(20))
+    source = db.Column(db.String(20))
+    input_fingerprint = db.Column(db.String(64))
+    idempotency_key = db.Column(db.String(64))
+    stale = db.Column(db.Boolean, default=False)
+    created_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    progress_entries = db.relationship('ArchivedProgress', lazy=True,
+                                       primaryjoin='ArchivedIDP.id == foreign(ArchivedProgress.idp_id)')
+    
+    __table_args__ = (db.Index('ix_idps_archive_company_user', 'company_id', 'user_id', 'created_at'),)
+    
+    def __repr__(self):
+        return f'<ArchivedIDP {self.id} for User {self.user_id}>'
+
+
+class ArchivedProgress(TenantMixin, db.Model):
+    __tablename__ = 'progress_archive'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # Same id as in progress
+    idp_id = db.Column(db.Integer, nullable=False, index=True)
+    completion = db.Column(db.Integer)
+    feedback = db.Column(db.Text)
+    updated_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ArchivedProgress {self.id} for IDP {self.idp_id}>'
+
+
+class ArchiveRollup(TenantMixin, db.Model):
+    __tablename__ = 'archive_rollups'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), nullable=False)  # Status of the IDPs when archived
+    idp_count = db.Column(db.Integer, nullable=False, default=0)
+    progress_count = db.Column(db.Integer, nullable=False, default=0)  # Archived progress entries with a completion
+    completion_sum = db.Column(db.Integer, nullable=False, default=0)  # Sum of archived progress completion
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'status', name='uq_archive_rollup_user_status'),
+        db.Index('ix_archive_rollups_company_status', 'company_id', 'status', 'idp_count'),
+    )
+    
+    def __repr__(self):
+        return f'<ArchiveRollup User {self.user_id} {self.status}={self.idp_count}>'
+
+
+class GeminiUsage(TenantMixin, db.Model):
+    __tablename__ = 'gemini_usage'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)  # UTC
+    calls = db.Column(db.Integer, nullable=False, default=0)
+    failures = db.Column(db.Integer, nullable=False, default=0)
+    rejected = db.Column(db.Integer, nullable=False, default=0)  # Calls refused by a quota (not sent)
+    estimated_calls = db.Column(db.Integer, nullable=False, default=0)  # Calls whose tokens were estimated locally
+    prompt_tokens = db.Column(db.Integer, nullable=False, default=0)
+    response_tokens = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (db.UniqueConstraint('company_id', 'day', name='uq_gemini_usage_company_day'),)
+    
+    def __repr__(self):
+        return f'<GeminiUsage {self.day} {self.prompt_tokens}+{self.response_tokens} tokens>'
+
+
+class UserHierarchy(TenantMixin, db.Model):
+    __tablename__ = 'user_hierarchy'
+    
+    ancestor_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    descendant_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    depth = db.Column(db.Integer, nullable=False)  # 0 = the user themselves, 1 = direct report, ...
+    
+    __table_args__ = (db.Index('ix_user_hierarchy_descendant', 'descendant_id', 'depth'),)
+    
+    def __repr__(self):
+        return f'<UserHierarchy {self.ancestor_id} -> {self.descendant_id} ({self.depth})>'
+
+
+class TeamRollup(TenantMixin, db.Model):
+    __tablename__ = 'team_rollups'
+    
+    manager_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    headcount = db.Column(db.Integer, nullable=False, default=0)  # Everyone below the manager, at any depth
+    direct_reports = db.Column(db.Integer, nullable=False, default=0)
+    pending_idps = db.Column(db.Integer, nullable=False, default=0)  # Live and archived IDPs of the team
+    in_progress_idps = db.Column(db.Integer, nullable=False, default=0)
+    completed_idps = db.Column(db.Integer, nullable=False, default=0)
+    progress_count = db.Column(db.Integer, nullable=False, default=0)  # Progress entries with a completion
+    completion_sum = db.Column(db.Integer, nullable=False, default=0)
+    top_gaps = db.Column(db.Text)  # JSON [[skill, employees missing it], ...], most common first
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def average_completion(self):
+        return round(self.completion_sum / self.progress_count, 1) if self.progress_count else None
+    
+    def get_top_gaps(self):
+        return json.loads(self.top_gaps) if self.top_gaps else []
+    
+    def __repr__(self):
+        return f'<TeamRollup Manager {self.manager_id} headcount={self.headcount}>'
+
+
+class DailyIDPStat(TenantMixin, db.Model):
+    __tablename__ = 'daily_idp_stats'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)  # UTC day the snapshot was taken
+    role = db.Column(db.String(100), nullable=False, default='')  # Employees' target role, '' if none
+    status = db.Column(db.String(20), nullable=False)  # pending, in_progress, completed
+    idp_count = db.Column(db.Integer, nullable=False, default=0)  # Live and archived IDPs in this status
+    progress_count = db.Column(db.Integer, nullable=False, default=0)  # Their progress entries with a completion
+    completion_sum = db.Column(db.Integer, nullable=False, default=0)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (db.UniqueConstraint('company_id', 'day', 'role', 'status', name='uq_daily_idp_stats'),)
+    
+    def __repr__(self):
+        return f'<DailyIDPStat {self.day} {self.role or "-"} {self.status}={self.idp_count}>'
@@ -0,0 +1,381 @@
+"""
+Versioned JSON API for dashboards and internal portals.
+
+List endpoints support:
+    ?fields=id,name     only select and return these fields
+    ?limit=50           page size (max 500)
+    ?cursor=<token>     continue after the last row of the previous page
+
+Responses carry ETags (304 on If-None-Match) and are gzip-compressed when
+the client accepts it.
+"""
+import base64
+import gzip
+
+from flask import Blueprint, jsonify, request, abort
+from flask_login import login_required, current_user
+from sqlalchemy import select, or_
+
+from models.models import db, User, Role, IDP, Progress
+from routes.hr import hr_required
+from services.cache import cached_page
+from ai_engine.role_suggestions import get_role_suggestions
+from services.archive import archived_status_counts, archived_progress_totals
+from services.gemini_usage import usage_summary
+from services.search import SearchError, DEFAULT_PER_PAGE as SEARCH_PAGE_SIZE, search as search_plans
+from services.hierarchy import can_view_team, team_rollup, direct_reports
+from services.trends import TrendError, trend_range, trend_range_key, completion_trend, parse_day
+
+api_bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+GZIP_MIN_SIZE = 1024
+
+EMPLOYEE_FIELDS = {
+    'id': User.id,
+    'name': User.name,
+    'email': User.email,
+    'skills': User.skills,
+    'experience': User.experience,
+    'goal': User.goal,
+    'current_role': User.current_role,
+    'target_role': User.target_role,
+    'created_at': User.created_at,
+}
+
+ROLE_FIELDS = {
+    'id': Role.id,
+    'role_name': Role.role_name,
+    'required_skills': Role.required_skills,
+    'description': Role.description,
+}
+
+IDP_FIELDS = {
+    'id': IDP.id,
+    'user_id': IDP.user_id,
+    'skill_gap': IDP.skill_gap,
+    'action': IDP.action,
+    'timeline': IDP.timeline,
+    'metric': IDP.metric,
+    'status': IDP.status,
+    'created_at': IDP.created_at,
+}
+
+PROGRESS_FIELDS = {
+    'id': Progress.id,
+    'idp_id': Progress.idp_id,
+    'completion': Progress.completion,
+    'feedback': Progress.feedback,
+    'updated_at': Progress.updated_at,
+}
+
+
+def api_error(message, status):
+    response = jsonify({'error': message})
+    response.status_code = status
+    return response
+
+
+@api_bp.errorhandler(400)
+def bad_request(e):
+    return api_error(e.description, 400)
+
+
+@api_bp.errorhandler(401)
+def unauthorized(e):
+    return api_error('Authentication required', 401)
+
+
+@api_bp.errorhandler(403)
+def forbidden(e):
+    return api_error('Access denied', 403)
+
+
+@api_bp.errorhandler(404)
+def not_found(e):
+    return api_error('Not found', 404)
+
+
+@api_bp.after_request
+def compress_response(response):
+    if (response.status_code != 200
+            or response.direct_passthrough
+            or 'gzip' not in request.headers.get('Accept-Encoding', '').lower()
+            or 'Content-Encoding' in response.headers):
+        return response
+
+    data = response.get_data()
+    if len(data) < GZIP_MIN_SIZE:
+        return response
+
+    response.set_data(gzip.compress(data, compresslevel=6))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def encode_cursor(last_id):
+    return base64.urlsafe_b64encode(str(last_id).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return int(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, UnicodeDecodeError):
+        abort(400, description='Invalid cursor')
+
+
+def selected_fields(available):
+    """Parse ?fields= against the allowed field map"""
+    requested = request.args.get('fields')
+    if not requested:
+        return list(available)
+
+    fields = [f.strip() for f in requested.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in available]
+    if unknown:
+        abort(400, description=f'Unknown fields: {", ".join(unknown)}')
+    return fields
+
+
+def serialize_value(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def paginate(query, available, id_column):
+    """
+    Run a keyset-paginated select of only the requested columns
+
+    Args:
+        query: Callable taking a Select and adding joins/filters
+        available: Field name -> column map
+        id_column: Primary key column used as the cursor
+
+    Returns:
+        JSON response with data and next_cursor
+    """
+    fields = selected_fields(available)
+    limit = min(max(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+
+    stmt = query(select(id_column, *[available[f] for f in fields]))
+    cursor = request.args.get('cursor')
+    if cursor:
+        stmt = stmt.where(id_column > decode_cursor(cursor))
+    rows = db.session.execute(stmt.order_by(id_column).limit(limit + 1)).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    return jsonify({
+        'data': [{f: serialize_value(v) for f, v in zip(fields, row[1:])} for row in rows],
+        'next_cursor': encode_cursor(rows[-1][0]) if has_more else None
+    })
+
+
+def get_one(available, id_column, object_id, where=None):
+    fields = selected_fields(available)
+    stmt = select(*[available[f] for f in fields]).where(id_column == object_id)
+    if where is not None:
+        stmt = stmt.where(where)
+    row = db.session.execute(stmt).first()
+    if row is None:
+        abort(404)
+    return jsonify({f: serialize_value(v) for f, v in zip(fields, row)})
+
+
+def idp_scope():
+    """HR users see every IDP, employees only their own"""
+    return None if current_user.role == 'hr' else IDP.user_id == current_user.id
+
+
+@api_bp.route('/employees')
+@login_required
+@hr_required
+@cached_page('users')
+def employees():
+    def query(stmt):
+        stmt = stmt.where(User.role == 'employee')
+        role = request.args.get('role')
+        if role:
+            stmt = stmt.where(or_(User.current_role == role, User.target_role == role))
+        return stmt
+    return paginate(query, EMPLOYEE_FIELDS, User.id)
+
+
+@api_bp.route('/employees/<int:user_id>')
+@login_required
+@hr_required
+@cached_page('users')
+def employee(user_id):
+    return get_one(EMPLOYEE_FIELDS, User.id, user_id, User.role == 'employee')
+
+
+@api_bp.route('/employees/<int:user_id>/suggested-roles')
+@login_required
+@hr_required
+@cached_page('users', 'roles', 'role_suggestions')
+def suggested_roles(user_id):
+    employee = User.query.filter_by(id=user_id, role='employee').first_or_404()
+    limit = min(max(request.args.get('limit', 3, type=int), 1), 20)
+    return jsonify({
+        'data': [
+            {
+                'rank': s.rank,
+                'role_id': s.role_id,
+                'role_name': s.role.role_name,
+                'score': s.score,
+                'coverage': s.coverage
+            }
+            for s in get_role_suggestions(employee, limit)
+        ]
+    })
+
+
+@api_bp.route('/roles')
+@login_required
+@cached_page('roles')
+def roles():
+    return paginate(lambda stmt: stmt, ROLE_FIELDS, Role.id)
+
+
+@api_bp.route('/idps')
+@login_required
+@cached_page('idps')
+def idps():
+    def query(stmt):
+        scope = idp_scope()
+        if scope is not None:
+            stmt = stmt.where(scope)
+        user_id = request.args.get('user_id', type=int)
+        if user_id:
+            stmt = stmt.where(IDP.user_id == user_id)
+        status = request.args.get('status')
+        if status:
+            stmt = stmt.where(IDP.status == status)
+        else:
+            stmt = stmt.where(IDP.status != 'superseded')
+        return stmt
+    return paginate(query, IDP_FIELDS, IDP.id)
+
+
+@api_bp.route('/idps/<int:idp_id>')
+@login_required
+@cached_page('idps')
+def idp(idp_id):
+    return get_one(IDP_FIELDS, IDP.id, idp_id, idp_scope())
+
+
+@api_bp.route('/idps/<int:idp_id>/progress')
+@login_required
+@cached_page('idps', 'progress')
+def idp_progress(idp_id):
+    def query(stmt):
+        stmt = stmt.join(IDP, Progress.idp_id == IDP.id).where(Progress.idp_id == idp_id)
+        scope = idp_scope()
+        return stmt.where(scope) if scope is not None else stmt
+    return paginate(query, PROGRESS_FIELDS, Progress.id)
+
+
+@api_bp.route('/stats')
+@login_required
+@hr_required
+@cached_page('users', 'roles', 'idps', 'progress', 'gemini_usage')
+def stats():
+    status_counts = dict(db.session.query(IDP.status, db.func.count(IDP.id)).group_by(IDP.status).all())
+    for status, count in archived_status_counts().items():
+        status_counts[status] = status_counts.get(status, 0) + count
+    superseded = status_counts.pop('superseded', 0)
+    
+    # Average over live and archived progress entries
+    live_count, live_sum = db.session.query(db.func.count(Progress.completion),
+                                            db.func.sum(Progress.completion)).one()
+    archived_count, archived_sum = archived_progress_totals()
+    entries = live_count + archived_count
+    avg_completion = ((live_sum or 0) + archived_sum) / entries if entries else None
+
+    return jsonify({
+        'total_employees': User.query.filter_by(role='employee').count(),
+        'total_roles': Role.query.count(),
+        'total_idps': sum(status_counts.values()),
+        'idps_by_status': status_counts,
+        'superseded_idps': superseded,
+        'average_completion': round(float(avg_completion), 1) if avg_completion is not None else None,
+        'gemini_usage': usage_summary()
+    })
+
+
+@api_bp.route('/trends')
+@login_required
+@hr_required
+@cached_page('daily_idp_stats', vary=lambda: trend_range_key(request.args))
+def trends():
+    """?start=YYYY-MM-DD&end=YYYY-MM-DD (or ?days=90)&role=Data Scientist, one point per aggregated day"""
+    try:
+        start, end = trend_range(parse_day(request.args.get('start')), parse_day(request.args.get('end')),
+                                 request.args.get('days', type=int))
+    except TrendError as e:
+        abort(400, description=str(e))
+    
+    return jsonify({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'data': [dict(point, day=point['day'].isoformat())
+                 for point in completion_trend(start, end, request.args.get('role') or None)],
+    })
+
+
+@api_bp.route('/search')
+@login_required
+@hr_required
+@cached_page('users', 'idps', 'progress')
+def search():
+    """?q=terms&type=all|idps|progress&page=1&per_page=20, best matches first"""
+    try:
+        results = search_plans(request.args.get('q', ''), request.args.get('type', 'all'),
+                               page=request.args.get('page', 1, type=int),
+                               per_page=request.args.get('per_page', SEARCH_PAGE_SIZE, type=int))
+    except SearchError as e:
+        abort(400, description=str(e))
+
+    return jsonify({
+        'data': [dict(hit, snippet=str(hit['snippet'])) for hit in results.hits],
+        'total': results.total,
+        'page': results.page,
+        'per_page': results.per_page,
+    })
+
+
+def rollup_json(rollup):
+    return {
+        'headcount': rollup.headcount,
+        'direct_reports': rollup.direct_reports,
+        'idps_by_status': {
+            'pending': rollup.pending_idps,
+            'in_progress': rollup.in_progress_idps,
+            'completed': rollup.completed_idps,
+        },
+        'average_completion': rollup.average_completion(),
+        'top_gaps': [{'skill': skill, 'employees': count} for skill, count in rollup.get_top_gaps()],
+        'updated_at': serialize_value(rollup.updated_at),
+    }
+
+
+@api_bp.route('/teams/<int:manager_id>')
+@login_required
+@cached_page('users', 'idps', 'progress', 'team_rollups')
+def team(manager_id):
+    """Rollup of everyone below a manager and of each direct report's team (HR or managers above)"""
+    if not can_view_team(current_user, manager_id):
+        abort(403)
+    manager = User.query.get_or_404(manager_id)
+    rollup = team_rollup(manager_id)
+    return jsonify({
+        'manager': {'id': manager.id, 'name': manager.name},
+        'team': rollup_json(rollup) if rollup else None,
+        'direct_reports': [
+            {'id': report.id, 'name': report.name, 'team': rollup_json(report_rollup) if report_rollup else None}
+            for report, report_rollup in direct_reports(manager_id)
+        ],
+    })
@@ -1,6 +1,10 @@
+import time
 from flask import Blueprint, render_template, redirect, url_for, request, flash
 from flask_login import login_user, logout_user, login_required, current_user
-from models.models import db, User
+from models.models import db, User, password_hash_method
+from services.login_guard import login_guard, LoginOverloaded
+from services.metrics import metrics
+from services.tenancy import get_company, default_company_id
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -22,9 +26,30 @@ def login():
         email = request.form.get('email')
         password = request.form.get('password')
         
+        account = (email or '').strip().lower()
+        
+        # Reject throttled attempts before spending CPU on hashing
+        rejected = login_guard.admit(request.remote_addr, account)
+        if rejected:
+            flash('Too many login attempts. Please wait a few minutes and try again.', 'error')
+            return render_template('login.html'), 429
+        
         user = User.query.filter_by(email=email).first()
         
-        if user and user.check_password(password):
+        started = time.perf_counter()
+        try:
+            valid = bool(user) and login_guard.verifier.verify(user.password_hash, password or '')
+            if valid and user.password_needs_rehash():
+                user.password_hash = login_guard.verifier.hash(password, password_hash_method())
+                db.session.commit()
+        except LoginOverloaded:
+            flash('Login is busy right now. Please try again in a few seconds.', 'error')
+            return render_template('login.html'), 503
+        finally:
+            metrics.observe('login_verify_seconds', time.perf_counter() - started)
+        
+        if valid:
+            login_guard.record_success(account)
             login_user(user, remember=True)
             flash('Login successful!', 'success')
             
@@ -33,6 +58,7 @@ def login():
             else:
                 return redirect(url_for('employee.dashboard'))
         else:
+            login_guard.record_failure(request.remote_addr, account)
             flash('Invalid email or password', 'error')
     
     return render_template('login.html')
@@ -46,13 +72,20 @@ def register():
         name = request.form.get('name')
         email = request.form.get('email')
         password = request.form.get('password')
-        role = request.form.get('role', 'employee')
+        company_slug = request.form.get('company', '').strip().lower()
+        
+        company = get_company(company_slug) if company_slug else None
+        if company_slug and company is None:
+            flash('Unknown company code', 'error')
+            return redirect(url_for('auth.register'))
         
         if User.query.filter_by(email=email).first():
             flash('Email already registered', 'error')
             return redirect(url_for('auth.register'))
         
-        user = User(name=name, email=email, role=role)
+        # Self-registration only creates employees; HR promotes them (see hr.promote_to_hr)
+        user = User(name=name, email=email, role='employee',
+                    company_id=company.id if company else default_company_id())
         user.set_password(password)
         
         db.session.add(user)
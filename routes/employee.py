@@ -1,7 +1,12 @@
 from flask import Blueprint, render_template, redirect, url_for, request, flash
 from flask_login import login_required, current_user
 from functools import wraps
-from models.models import db, IDP, Progress
+from sqlalchemy.orm.exc import StaleDataError
+from models.models import db, User, IDP, Progress
+from ai_engine.role_suggestions import update_role_suggestions
+from services.archive import archived_status_counts, archived_idps
+from services.cache import cached_page
+from services.hierarchy import can_view_team, team_rollup, management_chain, direct_reports
 
 employee_bp = Blueprint('employee', __name__, url_prefix='/employee')
 
@@ -18,17 +23,48 @@ def employee_required(f):
 @login_required
 @employee_required
 def dashboard():
-    user_idps = IDP.query.filter_by(user_id=current_user.id).all()
+    user_idps = IDP.query.filter(IDP.user_id == current_user.id, IDP.status != 'superseded').all()
+    
+    archived = archived_status_counts(current_user.id)
+    archived.pop('superseded', None)
     
     stats = {
-        'total': len(user_idps),
+        'total': len(user_idps) + sum(archived.values()),
         'pending': len([idp for idp in user_idps if idp.status == 'pending']),
         'in_progress': len([idp for idp in user_idps if idp.status == 'in_progress']),
-        'completed': len([idp for idp in user_idps if idp.status == 'completed'])
+        'completed': len([idp for idp in user_idps if idp.status == 'completed']) + archived.get('completed', 0),
+        'archived': sum(archived.values())
     }
     
     return render_template('employee_dashboard.html', idps=user_idps, stats=stats)
 
+@employee_bp.route('/archive')
+@login_required
+@employee_required
+def archive():
+    """Read-only list of the employee's archived IDPs"""
+    return render_template('idp_archive.html', employee=current_user, idps=archived_idps(current_user.id, include_superseded=False),
+                         back_url=url_for('employee.dashboard'))
+
+@employee_bp.route('/team', defaults={'manager_id': None})
+@employee_bp.route('/team/<int:manager_id>')
+@login_required
+@employee_required
+@cached_page('users', 'idps', 'progress', 'team_rollups')
+def team(manager_id):
+    """IDP rollup of the employee's team, or of a team below them"""
+    manager_id = manager_id or current_user.id
+    if not can_view_team(current_user, manager_id):
+        flash('Access denied', 'error')
+        return redirect(url_for('employee.dashboard'))
+    
+    manager = User.query.get_or_404(manager_id)
+    # Managers above the viewer are not theirs to browse
+    chain = [above for above in management_chain(manager_id)
+             if above.id == current_user.id or can_view_team(current_user, above.id)]
+    return render_template('team.html', manager=manager, rollup=team_rollup(manager_id), chain=chain,
+                         reports=direct_reports(manager_id), team_endpoint='employee.team', member_endpoint=None)
+
 @employee_bp.route('/idp/<int:idp_id>')
 @login_required
 @employee_required
@@ -53,10 +89,32 @@ def progress_page(idp_id):
         flash('Access denied', 'error')
         return redirect(url_for('employee.dashboard'))
     
-    progress = Progress.query.filter_by(idp_id=idp.id).order_by(Progress.updated_at.desc()).first()
+    progress = _latest_progress(idp)
     
     return render_template('employee_progress_update.html', idp=idp, progress=progress)
 
+def _latest_progress(idp):
+    return Progress.query.filter_by(idp_id=idp.id).order_by(Progress.updated_at.desc()).first()
+
+def _changed_since_form(row, field):
+    """Whether row was saved after the form carrying its version in `field` was rendered"""
+    submitted = request.form.get(field)
+    if submitted is None:
+        return False
+    return submitted != (str(row.version) if row else '')
+
+def _progress_conflict(idp_id, submitted):
+    """Show the latest saved values next to the submitted ones instead of overwriting them"""
+    db.session.rollback()
+    idp = db.session.get(IDP, idp_id)
+    if idp is None:
+        flash('This IDP no longer exists', 'error')
+        return redirect(url_for('employee.dashboard'))
+    
+    page = render_template('employee_progress_update.html', idp=idp, progress=_latest_progress(idp),
+                           conflict=submitted)
+    return page, 409
+
 @employee_bp.route('/idp/<int:idp_id>/update', methods=['POST'])
 @login_required
 @employee_required
@@ -70,12 +128,17 @@ def update_progress(idp_id):
     completion = request.form.get('completion', 0, type=int)
     feedback = request.form.get('feedback', '')
     status = request.form.get('status', idp.status)
+    submitted = {'completion': completion, 'feedback': feedback, 'status': status}
+    
+    # Another tab or HR saved this plan after the form was opened
+    progress = _latest_progress(idp)
+    if _changed_since_form(idp, 'idp_version') or _changed_since_form(progress, 'progress_version'):
+        return _progress_conflict(idp_id, submitted)
     
     # Update IDP status
     idp.status = status
     
     # Create or update progress entry
-    progress = Progress.query.filter_by(idp_id=idp.id).first()
     if progress:
         progress.completion = completion
         progress.feedback = feedback
@@ -87,7 +150,11 @@ def update_progress(idp_id):
         )
         db.session.add(progress)
     
-    db.session.commit()
+    try:
+        db.session.commit()
+    except StaleDataError:
+        # ... or did so between the check above and this write
+        return _progress_conflict(idp_id, submitted)
     
     flash('Progress updated successfully!', 'success')
     return redirect(url_for('employee.idp_detail', idp_id=idp_id))
@@ -111,6 +178,7 @@ def edit_profile():
         current_user.target_role = request.form.get('target_role', current_user.target_role)
         
         db.session.commit()
+        update_role_suggestions([current_user.id])
         
         flash('Profile updated successfully!', 'success')
         return redirect(url_for('employee.profile'))
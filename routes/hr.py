@@ -1,10 +1,27 @@
-from flask import Blueprint, render_template, redirect, url_for, request, flash
+from flask import (Blueprint, render_template, redirect, url_for, request, flash, Response, stream_with_context,
+                   abort, jsonify, current_app, send_from_directory)
 from flask_login import login_required, current_user
 from functools import wraps
-from models.models import db, User, Role, IDP
-from ai_engine.recommender import generate_smart_recommendations
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
+from models.models import db, User, Role, RoleSkill, IDP
+from ai_engine.recommender import (generate_smart_recommendations, stream_idp_generation, enrich_idps,
+                                   input_fingerprint, find_generated_plan, supersede_generated_plans)
+from ai_engine.skill_stats import parse_skill_weights
+from ai_engine.role_suggestions import get_role_suggestions, update_role_suggestions
+from services.cache import cached_page
+from services.jobs import jobs, stream_events
+from services.audit import audit_writer, audit_history, AUDITED_TABLES
+from services.archive import archived_status_counts, archived_idps
+from services.profiling import slowest_profiles, load_profile, profile_dir
+from services.search import SearchError, SEARCH_SCOPES, search as search_plans
+from services.hierarchy import HierarchyError, set_manager, team_rollup, management_chain, direct_reports
+from services.trends import TrendError, trend_range, trend_range_key, completion_trend, chart_points
+from services.export import (ExportError, EXPORT_FORMATS, stream_export,
+                             export_filename, parse_date)
 import pandas as pd
 import os
+import uuid
 from werkzeug.utils import secure_filename
 
 hr_bp = Blueprint('hr', __name__, url_prefix='/hr')
@@ -18,6 +35,8 @@ def hr_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if not current_user.is_authenticated or current_user.role != 'hr':
+            if request.blueprint == 'api':
+                abort(403)
             flash('Access denied. HR privileges required.', 'error')
             return redirect(url_for('auth.login'))
         return f(*args, **kwargs)
@@ -26,12 +45,19 @@ def hr_required(f):
 @hr_bp.route('/dashboard')
 @login_required
 @hr_required
+@cached_page('users', 'idps')
 def dashboard():
     total_employees = User.query.filter_by(role='employee').count()
-    total_idps = IDP.query.count()
+    total_idps = IDP.query.filter(IDP.status != 'superseded').count()
     pending_idps = IDP.query.filter_by(status='pending').count()
     completed_idps = IDP.query.filter_by(status='completed').count()
     
+    # Plans moved to the archive still count
+    archived = archived_status_counts()
+    archived.pop('superseded', None)
+    total_idps += sum(archived.values())
+    completed_idps += archived.get('completed', 0)
+    
     recent_employees = User.query.filter_by(role='employee').order_by(User.created_at.desc()).limit(5).all()
     
     stats = {
@@ -46,8 +72,10 @@ def dashboard():
 @hr_bp.route('/employees')
 @login_required
 @hr_required
+@cached_page('users')
 def employees():
-    all_employees = User.query.filter_by(role='employee').all()
+    # Left unevaluated so the cached employee table fragment skips the query
+    all_employees = User.query.filter_by(role='employee').order_by(User.id)
     return render_template('hr_employees.html', employees=all_employees)
 
 @hr_bp.route('/employee/<int:user_id>')
@@ -59,8 +87,73 @@ def employee_detail(user_id):
         flash('Invalid employee', 'error')
         return redirect(url_for('hr.employees'))
     
-    idps = IDP.query.filter_by(user_id=user_id).all()
-    return render_template('hr_employee_detail.html', employee=employee, idps=idps)
+    idps = IDP.query.filter(IDP.user_id == user_id, IDP.status != 'superseded').all()
+    suggestions = get_role_suggestions(employee)
+    archived_count = sum(archived_status_counts(user_id).values())
+    return render_template('hr_employee_detail.html', employee=employee, idps=idps, suggestions=suggestions,
+                         archived_count=archived_count, team=team_rollup(user_id))
+
+@hr_bp.route('/employee/<int:user_id>/manager', methods=['POST'])
+@login_required
+@hr_required
+def set_employee_manager(user_id):
+    """Set or clear an employee's direct manager (by email)"""
+    employee = User.query.get_or_404(user_id)
+    email = request.form.get('manager_email', '').strip()
+    
+    manager = None
+    if email:
+        manager = User.query.filter_by(email=email).first()
+        if manager is None:
+            flash(f'No user with email {email}', 'error')
+            return redirect(url_for('hr.employee_detail', user_id=user_id))
+    
+    try:
+        set_manager(employee, manager)
+        db.session.commit()
+    except HierarchyError as e:
+        db.session.rollback()
+        flash(str(e), 'error')
+        return redirect(url_for('hr.employee_detail', user_id=user_id))
+    
+    flash(f'{employee.name} now reports to {manager.name}.' if manager else f'{employee.name} has no manager now.', 'success')
+    return redirect(url_for('hr.employee_detail', user_id=user_id))
+
+@hr_bp.route('/employee/<int:user_id>/promote', methods=['POST'])
+@login_required
+@hr_required
+def promote_to_hr(user_id):
+    """Give an employee of this company HR access"""
+    employee = User.query.get_or_404(user_id)
+    if employee.role != 'employee':
+        flash('Invalid employee', 'error')
+        return redirect(url_for('hr.employees'))
+    
+    employee.role = 'hr'
+    db.session.commit()
+    
+    flash(f'{employee.name} now has HR access.', 'success')
+    return redirect(url_for('hr.employees'))
+
+@hr_bp.route('/team/<int:manager_id>')
+@login_required
+@hr_required
+@cached_page('users', 'idps', 'progress', 'team_rollups')
+def team(manager_id):
+    """IDP rollup of everyone below a manager, with their direct reports' teams"""
+    manager = User.query.get_or_404(manager_id)
+    return render_template('team.html', manager=manager, rollup=team_rollup(manager_id),
+                         chain=management_chain(manager_id), reports=direct_reports(manager_id),
+                         team_endpoint='hr.team', member_endpoint='hr.employee_detail')
+
+@hr_bp.route('/employee/<int:user_id>/archive')
+@login_required
+@hr_required
+def employee_archive(user_id):
+    """Read-only list of an employee's archived IDPs"""
+    employee = User.query.get_or_404(user_id)
+    return render_template('idp_archive.html', employee=employee, idps=archived_idps(user_id),
+                         back_url=url_for('hr.employee_detail', user_id=user_id))
 
 @hr_bp.route('/employee/add', methods=['GET', 'POST'])
 @login_required
@@ -76,7 +169,7 @@ def add_employee():
         current_role = request.form.get('current_role', '')
         target_role = request.form.get('target_role', '')
         
-        if User.query.filter_by(email=email).first():
+        if User.query.execution_options(all_companies=True).filter_by(email=email).first():
             flash('Email already exists', 'error')
             return redirect(url_for('hr.add_employee'))
         
@@ -94,6 +187,7 @@ def add_employee():
         
         db.session.add(user)
         db.session.commit()
+        update_role_suggestions([user.id])
         
         flash(f'Employee {name} added successfully!', 'success')
         return redirect(url_for('hr.employees'))
@@ -129,6 +223,8 @@ def upload_csv():
                 
                 added_count = 0
                 skipped_count = 0
+                added = []
+                reporting_lines = []
                 
                 # Process each row
                 for index, row in df.iterrows():
@@ -136,7 +232,7 @@ def upload_csv():
                     name = str(row['name']).strip()
                     
                     # Check if user already exists
-                    if User.query.filter_by(email=email).first():
+                    if User.query.execution_options(all_companies=True).filter_by(email=email).first():
                         skipped_count += 1
                         continue
                     
@@ -157,14 +253,33 @@ def upload_csv():
                     user.set_password(password)
                     
                     db.session.add(user)
+                    added.append(user)
                     added_count += 1
+                    
+                    manager_email = row.get('manager_email')
+                    if pd.notna(manager_email) and str(manager_email).strip():
+                        reporting_lines.append((user, str(manager_email).strip()))
+                
+                db.session.flush()
+                added_ids = [user.id for user in added]
+                
+                # Managers may be listed anywhere in the file, so link them once everyone exists
+                if reporting_lines:
+                    emails = {email for _, email in reporting_lines}
+                    managers = {m.email: m for m in User.query.filter(User.email.in_(emails))}
+                    for user, email in reporting_lines:
+                        if email not in managers:
+                            raise HierarchyError(f'Unknown manager {email} for {user.email}')
+                        set_manager(user, managers[email])
                 
                 db.session.commit()
+                update_role_suggestions(added_ids)
                 
                 flash(f'CSV processed: {added_count} employees added, {skipped_count} skipped (already exist)', 'success')
                 return redirect(url_for('hr.employees'))
                 
             except Exception as e:
+                db.session.rollback()
                 flash(f'Error processing CSV: {str(e)}', 'error')
                 return redirect(request.url)
         else:
@@ -180,30 +295,27 @@ def generate_idp(user_id):
     employee = User.query.get_or_404(user_id)
     
     if request.method == 'POST':
-        target_role_name = request.form.get('target_role')
-        
-        # Update employee target role
-        employee.target_role = target_role_name
-        db.session.commit()
-        
-        # Find the role and its required skills
-        target_role = Role.query.filter_by(role_name=target_role_name).first()
-        
-        if not target_role:
-            flash('Target role not found. Using manual skill input.', 'warning')
-            required_skills = request.form.get('required_skills', '').split(',')
-            required_skills = [s.strip() for s in required_skills if s.strip()]
-        else:
-            required_skills = target_role.get_required_skills_list()
+        idempotency_key = request.form.get('idempotency_key') or None
+        target_role_name, required_skills, skill_weights, warning = _resolve_target_role(employee)
+        if warning:
+            flash(warning, 'warning')
         
         if not required_skills:
             flash('No required skills defined for this role', 'error')
             return redirect(url_for('hr.employee_detail', user_id=user_id))
         
+        fingerprint = input_fingerprint(employee, target_role_name, required_skills, skill_weights)
+        # Repeated submissions and unchanged inputs keep the existing plan
+        if find_generated_plan(employee.id, fingerprint, idempotency_key):
+            flash(f'{employee.name} already has an up-to-date IDP for {target_role_name}.', 'info')
+            return redirect(url_for('hr.employee_detail', user_id=user_id))
+        
         # Generate SMART recommendations
-        recommendations = generate_smart_recommendations(employee, target_role_name, required_skills)
+        recommendations = generate_smart_recommendations(employee, target_role_name, required_skills, skill_weights)
         
-        # Save IDPs to database
+        # Replace the previous generated plan and save the new IDPs
+        supersede_generated_plans(employee.id)
+        idps = []
         for rec in recommendations:
             idp = IDP(
                 user_id=employee.id,
@@ -211,17 +323,124 @@ def generate_idp(user_id):
                 action=rec['action'],
                 timeline=rec['timeline'],
                 metric=rec['metric'],
-                status=rec['status']
+                status=rec['status'],
+                source=rec['source'],
+                input_fingerprint=fingerprint,
+                idempotency_key=idempotency_key,
+                active_fingerprint=None if idps else fingerprint
             )
             db.session.add(idp)
+            idps.append(idp)
         
-        db.session.commit()
+        try:
+            # Read ids before the commit expires the new rows (else one reload query per IDP)
+            db.session.flush()
+            uncovered = [idp.id for idp in idps if idp.source == 'template']
+            db.session.commit()
+        except StaleDataError:
+            # The employee updated a plan that was about to be superseded
+            db.session.rollback()
+            flash(f'{employee.name} updated one of their plans while the new IDP was being generated. '
+                  'Please review and generate again.', 'error')
+            return redirect(url_for('hr.employee_detail', user_id=user_id))
+        except IntegrityError:
+            # A concurrent submission saved a plan for the same inputs first
+            db.session.rollback()
+            flash(f'{employee.name} already has an up-to-date IDP for {target_role_name}.', 'info')
+            return redirect(url_for('hr.employee_detail', user_id=user_id))
         
-        flash(f'IDP generated successfully for {employee.name}!', 'success')
+        # Skills missing from the catalog get a detailed Gemini plan in the background
+        if uncovered and current_app.config.get('IDP_AUTO_ENRICH', True):
+            jobs.start(enrich_idps, uncovered, owner_id=current_user.id)
+            flash(f'IDP generated successfully for {employee.name}! '
+                  f'Detailed plans for {len(uncovered)} uncommon skill(s) are being prepared.', 'success')
+        else:
+            flash(f'IDP generated successfully for {employee.name}!', 'success')
         return redirect(url_for('hr.employee_detail', user_id=user_id))
     
     roles = Role.query.all()
-    return render_template('hr_generate_idp.html', employee=employee, roles=roles)
+    suggestions = get_role_suggestions(employee)
+    return render_template('hr_generate_idp.html', employee=employee, roles=roles, suggestions=suggestions,
+                           idempotency_key=uuid.uuid4().hex)
+
+@hr_bp.route('/idp/<int:idp_id>/enrich', methods=['POST'])
+@login_required
+@hr_required
+def enrich_idp(idp_id):
+    """Flag an IDP for a detailed Gemini-generated plan"""
+    idp = IDP.query.get_or_404(idp_id)
+    jobs.start(enrich_idps, [idp.id], owner_id=current_user.id)
+    flash(f'A detailed plan for {idp.skill_gap} is being prepared. Refresh in a moment to see it.', 'info')
+    return redirect(url_for('hr.employee_detail', user_id=idp.user_id))
+
+def _resolve_target_role(employee):
+    """
+    Read the target role from the IDP form and save it on the employee
+    
+    Returns:
+        (target role name, required skills, skill weights or None, warning or None)
+    """
+    target_role_name = request.form.get('target_role')
+    
+    # Update employee target role
+    employee.target_role = target_role_name
+    db.session.commit()
+    
+    # Find the role and its required skills
+    target_role = Role.query.filter_by(role_name=target_role_name).first()
+    
+    if not target_role:
+        required_skills = request.form.get('required_skills', '').split(',')
+        required_skills = [s.strip() for s in required_skills if s.strip()]
+        return target_role_name, required_skills, None, 'Target role not found. Using manual skill input.'
+    
+    return target_role_name, target_role.get_required_skills_list(), target_role.get_skill_weights(), None
+
+@hr_bp.route('/generate-idp/<int:user_id>/start', methods=['POST'])
+@login_required
+@hr_required
+def start_idp_stream(user_id):
+    """Start IDP generation in the background and return the URL to stream it from"""
+    employee = User.query.get_or_404(user_id)
+    idempotency_key = request.form.get('idempotency_key') or None
+    target_role_name, required_skills, skill_weights, warning = _resolve_target_role(employee)
+    
+    if not required_skills:
+        return jsonify({'error': 'No required skills defined for this role'}), 400
+    
+    fingerprint = input_fingerprint(employee, target_role_name, required_skills, skill_weights)
+    if find_generated_plan(employee.id, fingerprint, idempotency_key):
+        flash(f'{employee.name} already has an up-to-date IDP for {target_role_name}.', 'info')
+        return jsonify({'redirect': url_for('hr.employee_detail', user_id=employee.id)})
+    
+    # A double-submitted form joins the job already running for the same inputs on any worker; if
+    # both start at once, the unique active_fingerprint makes the later job stop at its first action
+    job = jobs.start(stream_idp_generation, employee.id, target_role_name, required_skills, skill_weights,
+                     fingerprint, idempotency_key, owner_id=current_user.id, key=f'idp:{employee.id}:{fingerprint}')
+    return jsonify({
+        'job_id': job.id,
+        'stream_url': url_for('hr.idp_stream', user_id=employee.id, job_id=job.id),
+        'warning': warning
+    }), 202
+
+@hr_bp.route('/generate-idp/<int:user_id>/stream/<job_id>')
+@login_required
+@hr_required
+def idp_stream(user_id, job_id):
+    """Server-Sent Events feed of an IDP generation job, from any worker"""
+    job = jobs.get(job_id)
+    if job is None or job.owner_id != current_user.id:
+        abort(404)
+    
+    # Bounded responses: EventSource reconnects with Last-Event-ID, so sync workers are freed between them
+    return Response(
+        stream_with_context(stream_events(
+            job.id, request.headers.get('Last-Event-ID'), current_app.config.get('SSE_RESPONSE_SECONDS', 5),
+            current_app.config.get('SSE_RETRY_MS', 500), current_app.config.get('JOB_STALE_SECONDS', 300)
+        )),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 @hr_bp.route('/create-manual-idp/<int:user_id>', methods=['GET', 'POST'])
 @login_required
@@ -262,8 +481,9 @@ def create_manual_idp(user_id):
 @hr_bp.route('/roles')
 @login_required
 @hr_required
+@cached_page('users', 'roles')
 def roles():
-    all_roles = Role.query.all()
+    all_roles = Role.query.order_by(Role.id)
     return render_template('hr_roles.html', roles=all_roles)
 
 @hr_bp.route('/role/add', methods=['GET', 'POST'])
@@ -279,11 +499,19 @@ def add_role():
             flash('Role already exists', 'error')
             return redirect(url_for('hr.add_role'))
         
+        try:
+            weights = parse_skill_weights(request.form.get('skill_weights', ''))
+        except ValueError as e:
+            flash(f'Invalid skill weights: {str(e)}', 'error')
+            return redirect(url_for('hr.add_role'))
+        
         role = Role(
             role_name=role_name,
             required_skills=required_skills,
             description=description
         )
+        for skill, weight in weights.items():
+            role.skill_weights.append(RoleSkill(skill=skill, weight=weight))
         
         db.session.add(role)
         db.session.commit()
@@ -296,16 +524,119 @@ def add_role():
 @hr_bp.route('/reports')
 @login_required
 @hr_required
+@cached_page('users', 'idps', 'daily_idp_stats', vary=lambda: trend_range_key(request.args))
 def reports():
     # Aggregate statistics
-    all_idps = IDP.query.all()
-    all_employees = User.query.filter_by(role='employee').all()
+    total_employees = User.query.filter_by(role='employee').count()
+    status_counts = dict(db.session.query(IDP.status, db.func.count(IDP.id)).group_by(IDP.status).all())
+    for status, count in archived_status_counts().items():
+        status_counts[status] = status_counts.get(status, 0) + count
+    status_counts.pop('superseded', None)
     
     idp_by_status = {
-        'pending': IDP.query.filter_by(status='pending').count(),
-        'in_progress': IDP.query.filter_by(status='in_progress').count(),
-        'completed': IDP.query.filter_by(status='completed').count()
+        'pending': status_counts.get('pending', 0),
+        'in_progress': status_counts.get('in_progress', 0),
+        'completed': status_counts.get('completed', 0)
     }
     
+    # Completion over time, from the daily rollups
+    trend_days = request.args.get('days', 90, type=int)
+    trend_role = request.args.get('role') or None
+    try:
+        start, end = trend_range(days=trend_days)
+    except TrendError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('hr.reports'))
+    trend = completion_trend(start, end, trend_role)
+    chart = {key: chart_points(trend, key, 600, 150) for key in ('completion_rate', 'average_completion')}
+    
     return render_template('hr_reports.html', idp_by_status=idp_by_status, 
-                         total_employees=len(all_employees), total_idps=len(all_idps))
+                         total_employees=total_employees, total_idps=sum(status_counts.values()),
+                         trend=trend, chart=chart, trend_days=trend_days, trend_role=trend_role or '')
+
+@hr_bp.route('/audit')
+@login_required
+@hr_required
+def audit_log():
+    """Who changed what, filtered by entity, actor and date range"""
+    entity_type = request.args.get('entity_type') or None
+    entity_id = request.args.get('entity_id', type=int)
+    actor_id = request.args.get('actor_id', type=int)
+    
+    try:
+        start = parse_date(request.args.get('start'))
+        end = parse_date(request.args.get('end'), end_of_day=True)
+    except ExportError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('hr.audit_log'))
+    
+    # Show changes made moments ago too
+    audit_writer.flush()
+    events = audit_history(entity_type, entity_id, actor_id, start, end, limit=200)
+    actor_ids = {e.actor_id for e in events if e.actor_id}
+    actors = dict(db.session.query(User.id, User.name).filter(User.id.in_(actor_ids)).all()) if actor_ids else {}
+    
+    return render_template('hr_audit.html', events=events, actors=actors, entity_types=AUDITED_TABLES)
+
+@hr_bp.route('/search')
+@login_required
+@hr_required
+def search():
+    """Full-text search over IDP actions, metrics, skill gaps and progress feedback"""
+    query = request.args.get('q', '').strip()
+    scope = request.args.get('scope', 'all')
+    results = None
+    
+    if query:
+        try:
+            results = search_plans(query, scope, page=request.args.get('page', 1, type=int))
+        except SearchError as e:
+            flash(str(e), 'error')
+            return redirect(url_for('hr.search'))
+    
+    return render_template('hr_search.html', query=query, scope=scope, scopes=SEARCH_SCOPES, results=results)
+
+@hr_bp.route('/profiles')
+@login_required
+@hr_required
+def profiles():
+    """Slowest profiled requests with their SQL"""
+    captured = slowest_profiles(current_user.company_id)
+    return render_template('hr_profiles.html', profiles=captured, profile_dir=profile_dir())
+
+@hr_bp.route('/profiles/<name>.collapsed')
+@login_required
+@hr_required
+def profile_stacks(name):
+    """Collapsed stacks of one profiled request, for flamegraph.pl or speedscope"""
+    profile = load_profile(name)
+    if profile is None or profile.get('company_id') not in (current_user.company_id, None):
+        abort(404)
+    return send_from_directory(profile_dir(), f'{name}.collapsed', mimetype='text/plain', as_attachment=True)
+
+@hr_bp.route('/export/<dataset>')
+@login_required
+@hr_required
+def export_data(dataset):
+    """Stream employees, IDPs or progress as CSV, JSON Lines or Parquet"""
+    fmt = request.args.get('format', 'csv').lower()
+    
+    try:
+        stream = stream_export(
+            dataset,
+            fmt,
+            role=request.args.get('role') or None,
+            status=request.args.get('status') or None,
+            start=parse_date(request.args.get('start')),
+            end=parse_date(request.args.get('end'), end_of_day=True)
+        )
+    except ExportError as e:
+        flash(f'Export failed: {str(e)}', 'error')
+        return redirect(url_for('hr.reports'))
+    
+    mimetype = EXPORT_FORMATS[fmt][0]
+    return Response(
+        stream_with_context(stream),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={export_filename(dataset, fmt)}'}
+    )
@@ -0,0 +1,154 @@
+"""
+Archival of finished IDPs
+
+Completed and superseded IDPs with no activity for ARCHIVE_AFTER_DAYS are
+moved, together with their progress, from idps/progress into idps_archive and
+progress_archive (``flask archive run``, also the last step of the nightly
+pipeline). The hot tables then only hold plans people are working on, so
+status counts and per-employee listings stay small.
+
+Every moved batch is added to archive_rollups (per employee and status at the
+time of archiving), and dashboards and reports add those rollups to the live
+counts, so totals do not change when plans are archived. Archived plans are
+only ever shown read-only.
+"""
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from models.models import db, IDP, Progress, ArchivedIDP, ArchivedProgress, ArchiveRollup
+from services.cache import bump_data_version
+
+ARCHIVABLE_STATUSES = ('completed', 'superseded')
+
+
+def archive_cutoff(days=None):
+    if days is None:
+        days = current_app.config.get('ARCHIVE_AFTER_DAYS', 180)
+    return datetime.utcnow() - timedelta(days=days)
+
+
+def _archivable_ids(cutoff, limit):
+    recent_progress = (db.select(Progress.id)
+                       .where(Progress.idp_id == IDP.id, Progress.updated_at >= cutoff)
+                       .exists())
+    return list(db.session.execute(
+        db.select(IDP.id)
+        .where(IDP.status.in_(ARCHIVABLE_STATUSES), IDP.created_at < cutoff, ~recent_progress)
+        .order_by(IDP.id)
+        .limit(limit)
+    ).scalars())
+
+
+def _add_to_rollups(ids):
+    idp_counts = db.session.execute(
+        db.select(IDP.company_id, IDP.user_id, IDP.status, db.func.count(IDP.id))
+        .where(IDP.id.in_(ids))
+        .group_by(IDP.company_id, IDP.user_id, IDP.status)
+    ).all()
+    progress_totals = {
+        (user_id, status): (count, total or 0)
+        for user_id, status, count, total in db.session.execute(
+            db.select(IDP.user_id, IDP.status, db.func.count(Progress.completion), db.func.sum(Progress.completion))
+            .join(IDP, Progress.idp_id == IDP.id)
+            .where(IDP.id.in_(ids))
+            .group_by(IDP.user_id, IDP.status)
+        )
+    }
+
+    user_ids = {user_id for _, user_id, _, _ in idp_counts}
+    existing = {
+        (rollup.user_id, rollup.status): rollup
+        for rollup in ArchiveRollup.query.filter(ArchiveRollup.user_id.in_(user_ids))
+    }
+    for company_id, user_id, status, count in idp_counts:
+        rollup = existing.get((user_id, status))
+        if rollup is None:
+            rollup = ArchiveRollup(company_id=company_id, user_id=user_id, status=status,
+                                   idp_count=0, progress_count=0, completion_sum=0)
+            db.session.add(rollup)
+        progress_count, completion_sum = progress_totals.get((user_id, status), (0, 0))
+        rollup.idp_count += count
+        rollup.progress_count += progress_count
+        rollup.completion_sum += int(completion_sum)
+
+
+def _move_batch(ids, now):
+    # Archived rows are read-only, so the optimistic lock versions are not kept
+    idp_columns = [column.name for column in IDP.__table__.columns if column.name in ArchivedIDP.__table__.c]
+    progress_columns = [column.name for column in Progress.__table__.columns
+                        if column.name in ArchivedProgress.__table__.c]
+    archived_at = db.literal(now, db.DateTime)
+
+    _add_to_rollups(ids)
+    db.session.execute(ArchivedIDP.__table__.insert().from_select(
+        idp_columns + ['archived_at'],
+        db.select(*[IDP.__table__.c[name] for name in idp_columns], archived_at).where(IDP.id.in_(ids))
+    ))
+    moved_progress = db.session.execute(ArchivedProgress.__table__.insert().from_select(
+        progress_columns + ['archived_at'],
+        db.select(*[Progress.__table__.c[name] for name in progress_columns], archived_at)
+        .where(Progress.idp_id.in_(ids))
+    )).rowcount
+    db.session.execute(db.delete(Progress).where(Progress.idp_id.in_(ids))
+                       .execution_options(synchronize_session=False))
+    db.session.execute(db.delete(IDP).where(IDP.id.in_(ids))
+                       .execution_options(synchronize_session=False))
+    db.session.commit()
+    return moved_progress
+
+
+def archive_idps(days=None, batch_size=None, limit=None):
+    """
+    Move finished IDPs without recent activity and their progress to the archive
+
+    Args:
+        days: Days without activity (default ARCHIVE_AFTER_DAYS)
+        batch_size: IDPs per transaction (default ARCHIVE_BATCH_SIZE)
+        limit: Stop after about this many IDPs (optional)
+
+    Returns:
+        (IDPs archived, progress entries archived)
+    """
+    cutoff = archive_cutoff(days)
+    batch_size = batch_size or current_app.config.get('ARCHIVE_BATCH_SIZE', 1000)
+    now = datetime.utcnow()
+    archived = progress = 0
+
+    while limit is None or archived < limit:
+        ids = _archivable_ids(cutoff, batch_size if limit is None else min(batch_size, limit - archived))
+        if not ids:
+            break
+        progress += _move_batch(ids, now)
+        archived += len(ids)
+
+    if archived:
+        bump_data_version('idps', 'progress')
+    return archived, progress
+
+
+def archived_status_counts(user_id=None):
+    """Archived IDPs per status, for one employee or the whole company"""
+    query = db.session.query(ArchiveRollup.status, db.func.sum(ArchiveRollup.idp_count))
+    if user_id is not None:
+        query = query.filter(ArchiveRollup.user_id == user_id)
+    return {status: int(count) for status, count in query.group_by(ArchiveRollup.status).all()}
+
+
+def archived_progress_totals():
+    """(number of archived progress entries, sum of their completion)"""
+    count, total = db.session.query(
+        db.func.coalesce(db.func.sum(ArchiveRollup.progress_count), 0),
+        db.func.coalesce(db.func.sum(ArchiveRollup.completion_sum), 0)
+    ).one()
+    return int(count), int(total)
+
+
+def archived_idps(user_id, include_superseded=True):
+    """An employee's archived IDPs with their progress, newest first"""
+    query = (ArchivedIDP.query
+             .options(db.selectinload(ArchivedIDP.progress_entries))
+             .filter_by(user_id=user_id))
+    if not include_superseded:
+        query = query.filter(ArchivedIDP.status != 'superseded')
+    return query.order_by(ArchivedIDP.created_at.desc()).all()
@@ -0,0 +1,191 @@
+"""
+Fingerprinted static assets
+
+``flask assets build`` minifies every stylesheet and script under static/,
+names each copy after a hash of its content (css/style.css ->
+css/style.3f2a9c1b7d4e.css) and writes it to static/dist together with
+gzip and, when the brotli package is installed, brotli versions and a
+manifest.json mapping source names to hashed ones.
+
+Templates link assets with ``asset_url('css/style.css')``. With a manifest
+that resolves to /assets/<hashed name>, served precompressed according to
+Accept-Encoding and cached by browsers for a year as immutable: a changed
+file gets a new name, so repeat page loads never revalidate. Without a build
+it falls back to the plain /static URL.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+
+from flask import current_app, request, send_from_directory, url_for
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip only
+    brotli = None
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+ASSET_EXTENSIONS = ('.css', '.js')
+HASH_LENGTH = 12
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Preferred first
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+# Quoted strings and url(...) are copied verbatim; comments are dropped
+CSS_TOKENS = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'|url\(\s*[^)'"\s]*\s*\)|/\*.*?\*/)''', re.S | re.I)
+
+
+def _minify_css_code(text):
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+    # Only after the colon: a space before it is a descendant selector (`a :hover`)
+    return re.sub(r':\s+', ':', text)
+
+
+def minify_css(text):
+    """
+    Drop comments and collapse whitespace outside strings and url() values
+
+    Spaces around `+`, `-` and `~` are kept, as calc() and selectors need them.
+    """
+    parts, code = [], []
+    for i, part in enumerate(CSS_TOKENS.split(text)):
+        if i % 2 == 0:
+            code.append(part)
+        elif not part.startswith('/*'):
+            parts.extend((_minify_css_code(''.join(code)), part))
+            code = []
+    parts.append(_minify_css_code(''.join(code)))
+    return ''.join(parts).replace(';}', '}').strip()
+
+
+def minify_js(text):
+    """
+    Drop comments that start a line, indentation and blank lines
+
+    Deliberately line based: statements keep their line breaks (so automatic
+    semicolon insertion is unaffected) and template literals are kept as is.
+    Code after a block comment closing on the same line is kept.
+    """
+    lines, in_template, in_comment = [], False, False
+    for line in text.splitlines():
+        stripped = line.strip()
+        if not in_template:
+            while in_comment or stripped.startswith('/*'):
+                if not in_comment:
+                    stripped = stripped[2:]
+                end = stripped.find('*/')
+                in_comment = end < 0
+                if in_comment:
+                    break
+                stripped = stripped[end + 2:].strip()
+            if in_comment or not stripped or stripped.startswith('//'):
+                continue
+            line = stripped
+        lines.append(line)
+        if len(re.findall(r'(?<!\\)`', line)) % 2:
+            in_template = not in_template
+    return '\n'.join(lines) + '\n'
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+def _source_files(static_folder):
+    for root, dirs, files in os.walk(static_folder):
+        if os.path.abspath(root) == os.path.abspath(static_folder):
+            dirs[:] = [name for name in dirs if name != DIST_DIR]
+        for name in sorted(files):
+            if name.endswith(ASSET_EXTENSIONS):
+                path = os.path.join(root, name)
+                yield os.path.relpath(path, static_folder).replace(os.sep, '/'), path
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def build_assets(static_folder):
+    """
+    Minify, fingerprint and precompress the stylesheets and scripts in static/
+
+    Args:
+        static_folder: The app's static folder; output goes to its dist/ subfolder
+
+    Returns:
+        Manifest of source name -> hashed name
+    """
+    dist = os.path.join(static_folder, DIST_DIR)
+    if os.path.isdir(dist):
+        shutil.rmtree(dist)
+
+    manifest = {}
+    for name, path in _source_files(static_folder):
+        base, ext = os.path.splitext(name)
+        with open(path, encoding='utf-8') as f:
+            data = MINIFIERS[ext](f.read()).encode('utf-8')
+        hashed = f'{base}.{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}{ext}'
+        target = os.path.join(dist, hashed)
+        _write(target, data)
+        # mtime=0 keeps the .gz byte-identical between builds
+        _write(target + '.gz', gzip.compress(data, 9, mtime=0))
+        if brotli is not None:
+            _write(target + '.br', brotli.compress(data, quality=11))
+        manifest[name] = hashed
+
+    _write(os.path.join(dist, MANIFEST_NAME), json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    return manifest
+
+
+def load_manifest(app):
+    path = os.path.join(app.static_folder, DIST_DIR, MANIFEST_NAME)
+    try:
+        with open(path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    app.extensions['asset_manifest'] = manifest
+    # Part of page ETags: pages cached before a rebuild link assets that no longer exist
+    app.extensions['asset_version'] = hashlib.sha256(
+        json.dumps(manifest, sort_keys=True).encode('utf-8')).hexdigest()[:HASH_LENGTH]
+    return manifest
+
+
+def asset_url(filename):
+    """URL of the fingerprinted build of a static asset, or its /static URL if not built"""
+    hashed = current_app.extensions.get('asset_manifest', {}).get(filename)
+    if hashed is None:
+        return url_for('static', filename=filename)
+    return url_for('assets', filename=hashed)
+
+
+def serve_asset(filename):
+    dist = os.path.join(current_app.static_folder, DIST_DIR)
+    mimetype = mimetypes.guess_type(filename)[0]
+    for encoding, suffix in ENCODINGS:
+        path = safe_join(dist, filename + suffix)
+        if request.accept_encodings[encoding] and path and os.path.isfile(path):
+            response = send_from_directory(dist, filename + suffix, mimetype=mimetype)
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(dist, filename, mimetype=mimetype)
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def init_assets(app):
+    """Serve built assets from /assets and expose asset_url() to templates"""
+    load_manifest(app)
+    app.add_url_rule('/assets/<path:filename>', 'assets', serve_asset)
+    app.jinja_env.globals['asset_url'] = asset_url
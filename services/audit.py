@@ -0,0 +1,360 @@
+"""
+Write-behind audit log
+
+Inserts, updates and deletes of users, roles, IDPs and progress are captured
+from the ORM flush (with per-column old/new values), held on the session
+until the transaction commits and then handed to an in-memory queue. A
+background thread writes the queue to audit_events in batches through its own
+connection, so requests never wait on audit inserts.
+
+- The queue is bounded (AUDIT_QUEUE_SIZE). When it is full the request that
+  hits the limit writes a batch itself, slowing producers down instead of
+  dropping events or growing memory.
+- Pending events are flushed when the process exits (atexit).
+- Rolled-back transactions produce no events; a rolled-back savepoint drops
+  only the events flushed inside it.
+"""
+import atexit
+import json
+import queue
+import threading
+from datetime import datetime
+
+from flask import g, has_app_context, has_request_context, session as http_session
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models.models import db, AuditEvent
+from services.metrics import metrics
+
+AUDITED_TABLES = ('users', 'roles', 'idps', 'progress')
+REDACTED_COLUMNS = {'password_hash'}
+MAX_VALUE_LENGTH = 500
+
+
+def _month(moment):
+    return moment.year * 100 + moment.month
+
+
+def _value(value):
+    if isinstance(value, str) and len(value) > MAX_VALUE_LENGTH:
+        return value[:MAX_VALUE_LENGTH] + '...'
+    return value
+
+
+def _actor_id():
+    if has_app_context() and 'audit_actor_id' in g:
+        return g.audit_actor_id
+    if has_request_context():
+        user_id = http_session.get('_user_id')
+        return int(user_id) if user_id else None
+    return None
+
+
+def _changes(obj, action):
+    if action == 'delete':
+        return {}
+    state = db.inspect(obj)
+    changes = {}
+    for attr in state.mapper.column_attrs:
+        key = attr.key
+        if key in REDACTED_COLUMNS:
+            if action == 'update' and state.attrs[key].history.has_changes():
+                changes[key] = '[changed]'
+            continue
+        if action == 'create':
+            value = getattr(obj, key)
+            if value is not None:
+                changes[key] = _value(value)
+        else:
+            history = state.attrs[key].history
+            if history.has_changes():
+                old = history.deleted[0] if history.deleted else None
+                new = history.added[0] if history.added else None
+                if old != new:
+                    changes[key] = [_value(old), _value(new)]
+    return changes
+
+
+def _collect_audit_events(session, flush_context):
+    now = datetime.utcnow()
+    actor_id = _actor_id()
+    pending = session.info.setdefault('audit_events', [])
+    for action, objects in (('create', session.new), ('update', session.dirty), ('delete', session.deleted)):
+        for obj in objects:
+            table = getattr(obj, '__tablename__', None)
+            if table not in AUDITED_TABLES:
+                continue
+            changes = _changes(obj, action)
+            if action == 'update' and not changes:
+                continue
+            pending.append({
+                'month': _month(now),
+                'created_at': now,
+                'actor_id': actor_id,
+                'action': action,
+                'entity_type': table,
+                'entity_id': getattr(obj, 'id', None),
+                'company_id': obj.company_id,
+                'changes': json.dumps(changes, separators=(',', ':'), default=str) if changes else None,
+            })
+
+
+def _mark_savepoint(session, transaction):
+    # Events flushed after this mark belong to the savepoint
+    if transaction.nested:
+        marks = session.info.setdefault('audit_savepoints', {})
+        marks[transaction] = len(session.info.get('audit_events', ()))
+
+
+def _enqueue_after_commit(session):
+    # Releasing a savepoint fires after_commit too; enqueue once the outer transaction commits
+    if session.in_nested_transaction():
+        return
+    session.info.pop('audit_savepoints', None)
+    events = session.info.pop('audit_events', None)
+    if events:
+        audit_writer.enqueue(events)
+
+
+def _discard_on_rollback(session, previous_transaction):
+    if previous_transaction.nested:
+        # Only the savepoint's events go; the outer transaction's stay pending
+        mark = session.info.get('audit_savepoints', {}).pop(previous_transaction, None)
+        if mark is not None and 'audit_events' in session.info:
+            del session.info['audit_events'][mark:]
+        return
+    if previous_transaction.parent is not None:
+        # A failed flush inside a transaction; the enclosing savepoint or transaction decides
+        return
+    session.info.pop('audit_savepoints', None)
+    session.info.pop('audit_events', None)
+
+
+class AuditWriter:
+    """Bounded queue drained in batches by a background thread"""
+
+    def __init__(self):
+        self.app = None
+        self.queue = None
+        self.batch_size = 500
+        self.interval = 1.0
+        self._thread = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread_lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.queue = queue.Queue(maxsize=app.config.get('AUDIT_QUEUE_SIZE', 10000))
+        self.batch_size = app.config.get('AUDIT_BATCH_SIZE', 500)
+        self.interval = app.config.get('AUDIT_FLUSH_INTERVAL', 1.0)
+
+        if not event.contains(Session, 'after_flush', _collect_audit_events):
+            event.listen(Session, 'after_flush', _collect_audit_events)
+            event.listen(Session, 'after_transaction_create', _mark_savepoint)
+            event.listen(Session, 'after_commit', _enqueue_after_commit)
+            event.listen(Session, 'after_soft_rollback', _discard_on_rollback)
+            atexit.register(self.shutdown)
+
+    def _ensure_thread(self):
+        # Started lazily so forking servers get a writer in each worker process
+        if self._thread is None or not self._thread.is_alive():
+            with self._thread_lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._stop.clear()
+                    self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+                    self._thread.start()
+
+    def enqueue(self, events):
+        if self.queue is None:
+            return
+        self._ensure_thread()
+        for item in events:
+            try:
+                self.queue.put_nowait(item)
+            except queue.Full:
+                # Backpressure: the producer pays for one batch write, then retries
+                metrics.inc('audit_backpressure_total')
+                self._write_batch()
+                self.queue.put(item)
+        metrics.set_gauge('audit_queue_depth', self.queue.qsize())
+        if self.queue.qsize() >= self.batch_size:
+            self._wake.set()
+
+    def _drain(self):
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write_batch(self):
+        """Write up to one batch; returns the number of events written"""
+        batch = self._drain()
+        if not batch:
+            return 0
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(AuditEvent.__table__.insert(), batch)
+            metrics.inc('audit_events_written_total', len(batch))
+        except Exception as e:
+            metrics.inc('audit_events_dropped_total', len(batch))
+            print(f"Error writing audit events: {e}")
+        return len(batch)
+
+    def flush(self):
+        """Write everything queued so far (needs an app context)"""
+        while self._write_batch():
+            pass
+        metrics.set_gauge('audit_queue_depth', self.queue.qsize() if self.queue else 0)
+
+    def _run(self):
+        with self.app.app_context():
+            while not self._stop.is_set():
+                self._wake.wait(self.interval)
+                self._wake.clear()
+                self.flush()
+            self.flush()
+
+    def shutdown(self, timeout=10):
+        """Stop the writer and flush pending events"""
+        if self.queue is None:
+            return
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout)
+        if not self.queue.empty():
+            with self.app.app_context():
+                self.flush()
+
+
+audit_writer = AuditWriter()
+
+
+def audit_history(entity_type=None, entity_id=None, actor_id=None, start=None, end=None, limit=100):
+    """
+    Most recent audit events matching the filters
+
+    The month bounds let MySQL prune partitions before using the
+    (entity_type, entity_id, created_at) or (actor_id, created_at) index.
+
+    Args:
+        entity_type: Table name, e.g. 'idps' (optional)
+        entity_id: Row id, used together with entity_type (optional)
+        actor_id: User who made the changes (optional)
+        start: Earliest datetime, inclusive (optional)
+        end: Latest datetime, inclusive (optional)
+        limit: Maximum number of events
+
+    Returns:
+        List of AuditEvent, newest first
+    """
+    query = AuditEvent.query
+    if entity_type:
+        query = query.filter(AuditEvent.entity_type == entity_type)
+        if entity_id is not None:
+            query = query.filter(AuditEvent.entity_id == entity_id)
+    if actor_id is not None:
+        query = query.filter(AuditEvent.actor_id == actor_id)
+    if start:
+        query = query.filter(AuditEvent.month >= _month(start), AuditEvent.created_at >= start)
+    if end:
+        query = query.filter(AuditEvent.month <= _month(end), AuditEvent.created_at <= end)
+    return query.order_by(AuditEvent.created_at.desc(), AuditEvent.id.desc()).limit(limit).all()
+
+
+def _partitions():
+    """Existing month partitions of audit_events on MySQL as {name: upper bound}, else None"""
+    if db.engine.dialect.name != 'mysql':
+        return None
+    rows = db.session.execute(db.text(
+        "SELECT PARTITION_NAME, PARTITION_DESCRIPTION FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'audit_events' AND PARTITION_NAME IS NOT NULL"
+    )).all()
+    return {name: description for name, description in rows} or None
+
+
+def _next_month(month):
+    year, mon = divmod(month, 100)
+    return (year + 1) * 100 + 1 if mon == 12 else month + 1
+
+
+def add_month_partitions(months_ahead=3):
+    """
+    Split the MySQL catch-all partition so each upcoming month has its own
+
+    Returns:
+        Names of the partitions created (empty when not on a partitioned MySQL table)
+    """
+    partitions = _partitions()
+    if partitions is None:
+        return []
+
+    month = _month(datetime.utcnow())
+    wanted = []
+    for _ in range(months_ahead + 1):
+        if f'p{month}' not in partitions:
+            wanted.append(month)
+        month = _next_month(month)
+    if not wanted:
+        return []
+
+    parts = ', '.join(f'PARTITION p{m} VALUES LESS THAN ({_next_month(m)})' for m in wanted)
+    db.session.execute(db.text(
+        f'ALTER TABLE audit_events REORGANIZE PARTITION pmax INTO ({parts}, PARTITION pmax VALUES LESS THAN MAXVALUE)'
+    ))
+    db.session.commit()
+    return [f'p{m}' for m in wanted]
+
+
+def ensure_audit_partitions(months_ahead=3):
+    """
+    Partition audit_events by month on MySQL, however the table was created
+
+    database/schema.sql creates it with only the catch-all pmax partition; a
+    table made by db.create_all() is not partitioned and, if it predates the
+    (id, month) primary key, is re-keyed first. Then the current and next
+    `months_ahead` months get their own partitions. Called at startup and by
+    ``flask audit add-partitions``.
+
+    Returns:
+        Names of the partitions created (empty when not on MySQL)
+    """
+    if db.engine.dialect.name != 'mysql':
+        return []
+    if _partitions() is None:
+        primary_key = db.inspect(db.engine).get_pk_constraint('audit_events')['constrained_columns']
+        rekey = '' if set(primary_key) == {'id', 'month'} else 'DROP PRIMARY KEY, ADD PRIMARY KEY (id, month) '
+        db.session.execute(db.text(
+            f'ALTER TABLE audit_events {rekey}PARTITION BY RANGE (month) (PARTITION pmax VALUES LESS THAN MAXVALUE)'
+        ))
+        db.session.commit()
+    return add_month_partitions(months_ahead)
+
+
+def prune_audit_events(before_month):
+    """
+    Remove audit events older than a month (YYYYMM, exclusive)
+
+    On a partitioned MySQL table whole month partitions are dropped, which is
+    instant; elsewhere the rows are deleted.
+
+    Returns:
+        Number of rows deleted, or of partitions dropped on MySQL
+    """
+    partitions = _partitions()
+    if partitions is not None:
+        old = [name for name, bound in partitions.items()
+               if bound != 'MAXVALUE' and int(bound) <= before_month]
+        if old:
+            db.session.execute(db.text(f'ALTER TABLE audit_events DROP PARTITION {", ".join(old)}'))
+            db.session.commit()
+        return len(old)
+
+    deleted = AuditEvent.query.filter(AuditEvent.month < before_month).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
@@ -0,0 +1,214 @@
+"""
+Page and fragment caching keyed on data versions.
+
+Every committed write to a tracked table bumps a per-table counter in
+``data_versions``. Cached HTML fragments and page ETags embed those counters,
+so they are invalidated automatically by any write from any worker:
+
+    {% cache 'employee_table', data_version('users') %} ... {% endcache %}
+
+Templates themselves are compiled once and kept as bytecode on disk.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import g, request, session, make_response, current_app, has_app_context
+from jinja2 import nodes, FileSystemBytecodeCache
+from jinja2.ext import Extension
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session
+
+from models.models import db, DataVersion
+
+TRACKED_TABLES = ('users', 'roles', 'idps', 'progress', 'gemini_usage', 'team_rollups',
+                  'daily_idp_stats', 'role_suggestions')
+
+
+class FragmentCache:
+    """Small thread-safe LRU for rendered HTML fragments"""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+fragment_cache = FragmentCache()
+
+
+class FragmentCacheExtension(Extension):
+    """Jinja tag: {% cache 'name', key_part, ... %}body{% endcache %}"""
+
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method('_render_cached', [nodes.List(args)]), [], [], body
+        ).set_lineno(lineno)
+
+    def _render_cached(self, key_parts, caller):
+        # Fragments are per company; versions are shared, so a write by one
+        # company also refreshes the others' fragments
+        key = ':'.join(str(part) for part in [g.get('company_id')] + key_parts)
+        html = fragment_cache.get(key)
+        if html is None:
+            html = caller()
+            fragment_cache.set(key, html)
+        return html
+
+
+def get_data_versions():
+    """Return {namespace: version}, read once per request"""
+    if 'data_versions' not in g:
+        g.data_versions = {row.namespace: row.version for row in DataVersion.query.all()}
+    return g.data_versions
+
+
+def data_version(*namespaces):
+    """Version token for one or more tables, e.g. data_version('users', 'idps')"""
+    versions = get_data_versions()
+    return '.'.join(str(versions.get(name, 0)) for name in namespaces)
+
+
+def bump_data_version(*namespaces):
+    """Invalidate caches for tables changed outside the ORM unit of work"""
+    if not namespaces:
+        return
+    with db.engine.begin() as conn:
+        conn.execute(
+            update(DataVersion)
+            .where(DataVersion.namespace.in_(namespaces))
+            .values(version=DataVersion.version + 1)
+        )
+    if has_app_context():
+        g.pop('data_versions', None)
+
+
+def _collect_changed_tables(session, flush_context):
+    changed = session.info.setdefault('changed_tables', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(obj, '__tablename__', None)
+        if table in TRACKED_TABLES:
+            changed.add(table)
+
+
+def _bump_after_commit(session):
+    # Releasing a savepoint fires after_commit too; bump once the outer transaction commits
+    if session.in_nested_transaction():
+        return
+    changed = session.info.pop('changed_tables', None)
+    if changed:
+        bump_data_version(*sorted(changed))
+
+
+def _discard_on_rollback(session, previous_transaction):
+    # A rolled back savepoint (or a failed flush inside one) leaves earlier changes of the
+    # outer transaction pending
+    if previous_transaction.parent is not None:
+        return
+    session.info.pop('changed_tables', None)
+
+
+def page_etag(*namespaces, extra=''):
+    """ETag for the current user viewing the current URL at current data versions"""
+    raw = '|'.join([
+        current_app.config['TEMPLATE_VERSION'],
+        current_app.extensions.get('asset_version', ''),
+        request.full_path,
+        str(session.get('_user_id')),
+        data_version(*namespaces),
+        extra,
+    ])
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def cached_page(*namespaces, vary=None):
+    """
+    Serve 304 Not Modified when none of the given tables changed
+
+    The namespaces must cover every table the response renders, including
+    'users' for HTML pages (the navigation bar shows the logged-in user).
+    Pages with pending flash messages are never cached, since the same
+    URL renders differently once the message has been shown. `vary` returns
+    a string for anything else the page depends on, such as a date range
+    relative to today.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if request.method != 'GET' or session.get('_flashes'):
+                return f(*args, **kwargs)
+
+            etag = page_etag(*namespaces, extra=vary() if vary else '')
+            if etag in request.if_none_match:
+                response = make_response('', 304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return decorated_function
+    return decorator
+
+
+def _template_version(template_folder):
+    latest = 0
+    for root, _, files in os.walk(template_folder):
+        for name in files:
+            latest = max(latest, int(os.path.getmtime(os.path.join(root, name))))
+    return str(latest)
+
+
+def init_cache(app):
+    """Enable bytecode caching, the {% cache %} tag and data version tracking"""
+    cache_dir = app.config.get('TEMPLATE_CACHE_DIR') or os.path.join(app.instance_path, 'jinja_cache')
+    os.makedirs(cache_dir, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    app.jinja_env.globals['data_version'] = data_version
+
+    fragment_cache.max_entries = app.config.get('FRAGMENT_CACHE_SIZE', 256)
+    app.config.setdefault('TEMPLATE_VERSION',
+                          _template_version(os.path.join(app.root_path, app.template_folder)))
+
+    if not event.contains(Session, 'after_flush', _collect_changed_tables):
+        event.listen(Session, 'after_flush', _collect_changed_tables)
+        event.listen(Session, 'after_commit', _bump_after_commit)
+        event.listen(Session, 'after_soft_rollback', _discard_on_rollback)
+
+
+def seed_data_versions():
+    """Create missing version rows (call inside an app context after create_all)"""
+    existing = {row.namespace for row in DataVersion.query.all()}
+    for namespace in TRACKED_TABLES:
+        if namespace not in existing:
+            db.session.add(DataVersion(namespace=namespace, version=0))
+    db.session.commit()
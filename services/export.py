@@ -0,0 +1,265 @@
+"""
+Streaming data export for employees, IDPs and progress entries.
+
+Rows are read through server-side cursors (``yield_per``) and written out
+chunk by chunk, so memory use stays flat no matter how many rows are dumped.
+The same generators back the HR download endpoint and the ``flask export``
+CLI command.
+"""
+import csv
+import io
+import json
+import os
+import tempfile
+from datetime import datetime, date, timedelta
+
+from sqlalchemy import select, or_
+from models.models import db, User, IDP, Progress
+
+DEFAULT_CHUNK_SIZE = 1000
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+DATASET_COLUMNS = {
+    'employees': [
+        ('id', User.id),
+        ('name', User.name),
+        ('email', User.email),
+        ('skills', User.skills),
+        ('experience', User.experience),
+        ('goal', User.goal),
+        ('current_role', User.current_role),
+        ('target_role', User.target_role),
+        ('created_at', User.created_at),
+    ],
+    'idps': [
+        ('id', IDP.id),
+        ('user_id', IDP.user_id),
+        ('employee_email', User.email),
+        ('target_role', User.target_role),
+        ('skill_gap', IDP.skill_gap),
+        ('action', IDP.action),
+        ('timeline', IDP.timeline),
+        ('metric', IDP.metric),
+        ('status', IDP.status),
+        ('created_at', IDP.created_at),
+    ],
+    'progress': [
+        ('id', Progress.id),
+        ('idp_id', Progress.idp_id),
+        ('user_id', IDP.user_id),
+        ('skill_gap', IDP.skill_gap),
+        ('status', IDP.status),
+        ('completion', Progress.completion),
+        ('feedback', Progress.feedback),
+        ('updated_at', Progress.updated_at),
+    ],
+}
+
+
+class ExportError(ValueError):
+    """Raised for unknown datasets, formats or malformed filters."""
+
+
+def parse_date(value, end_of_day=False):
+    """
+    Parse a YYYY-MM-DD filter value
+
+    Args:
+        value: Date string or None
+        end_of_day: Return the exclusive upper bound (next midnight)
+
+    Returns:
+        datetime or None
+    """
+    if not value:
+        return None
+    try:
+        parsed = datetime.strptime(value.strip(), '%Y-%m-%d')
+    except ValueError:
+        raise ExportError(f'Invalid date "{value}", expected YYYY-MM-DD')
+    return parsed + timedelta(days=1) if end_of_day else parsed
+
+
+def build_export_query(dataset, role=None, status=None, start=None, end=None):
+    """
+    Build the SELECT statement for a dataset with optional filters
+
+    Args:
+        dataset: 'employees', 'idps' or 'progress'
+        role: Matches the employee's current or target role
+        status: IDP status (idps and progress only)
+        start: Inclusive lower datetime bound
+        end: Exclusive upper datetime bound
+
+    Returns:
+        SQLAlchemy Select ordered by primary key
+    """
+    if dataset not in DATASET_COLUMNS:
+        raise ExportError(f'Unknown dataset "{dataset}"')
+
+    columns = [col for _, col in DATASET_COLUMNS[dataset]]
+
+    if dataset == 'employees':
+        query = select(*columns).where(User.role == 'employee')
+        date_column, order_column = User.created_at, User.id
+    elif dataset == 'idps':
+        query = select(*columns).join(User, IDP.user_id == User.id)
+        date_column, order_column = IDP.created_at, IDP.id
+    else:
+        query = (select(*columns)
+                 .join(IDP, Progress.idp_id == IDP.id)
+                 .join(User, IDP.user_id == User.id))
+        date_column, order_column = Progress.updated_at, Progress.id
+
+    if role:
+        query = query.where(or_(User.current_role == role, User.target_role == role))
+    if status:
+        if dataset == 'employees':
+            raise ExportError('Status filter applies to idps and progress only')
+        query = query.where(IDP.status == status)
+    if start:
+        query = query.where(date_column >= start)
+    if end:
+        query = query.where(date_column < end)
+
+    return query.order_by(order_column)
+
+
+def iter_row_chunks(query, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield lists of result rows using a server-side cursor"""
+    result = db.session.execute(query.execution_options(yield_per=chunk_size))
+    try:
+        for chunk in result.partitions(chunk_size):
+            yield chunk
+    finally:
+        result.close()
+
+
+def _serialize(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _csv_chunks(header, chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for chunk in chunks:
+        writer.writerows([[_serialize(v) for v in row] for row in chunk])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _jsonl_chunks(header, chunks):
+    for chunk in chunks:
+        yield ''.join(
+            json.dumps(dict(zip(header, map(_serialize, row))), ensure_ascii=False) + '\n'
+            for row in chunk
+        )
+
+
+def _arrow_schema(pa, dataset):
+    fields = []
+    for name, column in DATASET_COLUMNS[dataset]:
+        python_type = column.type.python_type
+        if python_type is int:
+            arrow_type = pa.int64()
+        elif python_type is datetime:
+            arrow_type = pa.timestamp('us')
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(name, arrow_type))
+    return pa.schema(fields)
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ExportError('Parquet export requires the pyarrow package')
+    return pa, pq
+
+
+def _write_parquet(dataset, chunks, path):
+    pa, pq = _require_pyarrow()
+    schema = _arrow_schema(pa, dataset)
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in chunks:
+            columns = list(zip(*chunk))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                schema=schema,
+            ))
+
+
+def _parquet_chunks(dataset, chunks, block_size=64 * 1024):
+    # Parquet needs a footer written after all row groups, so spool to a
+    # temp file one row group at a time and stream the file back out.
+    fd, path = tempfile.mkstemp(suffix='.parquet')
+    os.close(fd)
+    try:
+        _write_parquet(dataset, chunks, path)
+        with open(path, 'rb') as fh:
+            while True:
+                block = fh.read(block_size)
+                if not block:
+                    break
+                yield block
+    finally:
+        os.remove(path)
+
+
+def stream_export(dataset, fmt='csv', chunk_size=DEFAULT_CHUNK_SIZE, **filters):
+    """
+    Stream an export as an iterator of str/bytes blocks
+
+    Args:
+        dataset: 'employees', 'idps' or 'progress'
+        fmt: 'csv', 'jsonl' or 'parquet'
+        chunk_size: Rows fetched per round trip
+        **filters: role, status, start, end (see build_export_query)
+
+    Returns:
+        Generator of output blocks
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ExportError(f'Unknown format "{fmt}"')
+    if fmt == 'parquet':
+        _require_pyarrow()
+
+    query = build_export_query(dataset, **filters)
+    header = [name for name, _ in DATASET_COLUMNS[dataset]]
+    chunks = iter_row_chunks(query, chunk_size)
+
+    if fmt == 'csv':
+        return _csv_chunks(header, chunks)
+    if fmt == 'jsonl':
+        return _jsonl_chunks(header, chunks)
+    return _parquet_chunks(dataset, chunks)
+
+
+def export_to_file(path, dataset, fmt='csv', chunk_size=DEFAULT_CHUNK_SIZE, **filters):
+    """Write an export straight to a file path (used by the CLI)"""
+    if fmt == 'parquet':
+        query = build_export_query(dataset, **filters)
+        _write_parquet(dataset, iter_row_chunks(query, chunk_size), path)
+        return
+
+    with open(path, 'w', encoding='utf-8', newline='') as fh:
+        for block in stream_export(dataset, fmt, chunk_size, **filters):
+            fh.write(block)
+
+
+def export_filename(dataset, fmt):
+    """Download filename such as idps_20240131.csv"""
+    return f"{dataset}_{datetime.utcnow():%Y%m%d}.{EXPORT_FORMATS[fmt][1]}"
@@ -0,0 +1,146 @@
+"""
+Gemini token accounting and quotas
+
+Every Gemini call is counted per company and UTC day in gemini_usage:
+prompt and response tokens as reported by the SDK, or estimated locally
+(about CHARS_PER_TOKEN characters per token) when the response carries no
+usage metadata. Before a call is sent, the day's usage plus the prompt and
+GEMINI_RESPONSE_TOKEN_ESTIMATE must stay within the company's
+GEMINI_DAILY_CALL_QUOTA/GEMINI_DAILY_TOKEN_QUOTA and the deployment-wide
+GEMINI_GLOBAL_DAILY_TOKEN_QUOTA; refused calls are counted as rejected and the
+caller falls back to a template action. Concurrent calls are checked
+independently, so a quota can be overshot by the calls already in flight.
+
+Usage is written on its own connection, outside the caller's session, so
+recording a call never commits or flushes the caller's pending changes.
+"""
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy.exc import DBAPIError, IntegrityError
+
+from models.models import db, GeminiUsage
+from services.cache import bump_data_version
+from services.metrics import metrics
+
+CHARS_PER_TOKEN = 4
+USAGE_COUNTERS = ('calls', 'failures', 'rejected', 'estimated_calls', 'prompt_tokens', 'response_tokens')
+
+
+def estimate_tokens(text):
+    """Rough token count of text for budgets and when the API reports no usage"""
+    return -(-len(text or '') // CHARS_PER_TOKEN)
+
+
+def _today():
+    return datetime.utcnow().date()
+
+
+def check_quota(company_id, prompt_tokens):
+    """
+    Whether a call with this prompt may be sent now
+
+    Returns:
+        None if it may, otherwise the reason it may not
+    """
+    config = current_app.config
+    expected = prompt_tokens + config.get('GEMINI_RESPONSE_TOKEN_ESTIMATE', 300)
+    call_quota = config.get('GEMINI_DAILY_CALL_QUOTA', 0)
+    token_quota = config.get('GEMINI_DAILY_TOKEN_QUOTA', 0)
+    global_quota = config.get('GEMINI_GLOBAL_DAILY_TOKEN_QUOTA', 0)
+    if not (call_quota or token_quota or global_quota):
+        return None
+
+    table = GeminiUsage.__table__
+    tokens = db.func.coalesce(db.func.sum(table.c.prompt_tokens + table.c.response_tokens), 0)
+    with db.engine.connect() as conn:
+        calls, used = conn.execute(
+            db.select(db.func.coalesce(db.func.sum(table.c.calls), 0), tokens)
+            .where(table.c.company_id == company_id, table.c.day == _today())
+        ).one()
+        used_globally = conn.execute(db.select(tokens).where(table.c.day == _today())).scalar() \
+            if global_quota else 0
+
+    if call_quota and calls + 1 > call_quota:
+        return f'daily call quota of {call_quota} reached'
+    if token_quota and used + expected > token_quota:
+        return f'daily token quota of {token_quota} reached'
+    if global_quota and used_globally + expected > global_quota:
+        return f'global daily token quota of {global_quota} reached'
+    return None
+
+
+def _increment(conn, company_id, day, counts, now):
+    table = GeminiUsage.__table__
+    return conn.execute(
+        table.update()
+        .where(table.c.company_id == company_id, table.c.day == day)
+        .values(updated_at=now, **{name: table.c[name] + value for name, value in counts.items()})
+    ).rowcount
+
+
+def record_usage(company_id, prompt_tokens=0, response_tokens=0, estimated=False, failed=False, rejected=False):
+    """Add one call (or one rejected call) to the company's usage for today"""
+    counts = {
+        'calls': 0 if rejected else 1,
+        'failures': int(failed),
+        'rejected': int(rejected),
+        'estimated_calls': int(estimated and not rejected),
+        'prompt_tokens': prompt_tokens,
+        'response_tokens': response_tokens,
+    }
+    day, now = _today(), datetime.utcnow()
+    if rejected:
+        metrics.inc('gemini_quota_rejections_total', company=company_id)
+    else:
+        metrics.inc('gemini_prompt_tokens_total', prompt_tokens, company=company_id)
+        metrics.inc('gemini_response_tokens_total', response_tokens, company=company_id)
+
+    try:
+        try:
+            with db.engine.begin() as conn:
+                if not _increment(conn, company_id, day, counts, now):
+                    conn.execute(GeminiUsage.__table__.insert().values(
+                        company_id=company_id, day=day, updated_at=now, **counts))
+        except IntegrityError:
+            # Another worker created today's row first
+            with db.engine.begin() as conn:
+                _increment(conn, company_id, day, counts, now)
+    except DBAPIError as e:
+        # Losing one call's accounting is better than failing the plan it was for
+        current_app.logger.warning('Could not record Gemini usage: %s', e)
+        return
+    bump_data_version('gemini_usage')
+
+
+def usage_summary(days=30):
+    """
+    Gemini usage of the current company: today, the last `days` days and quotas
+
+    Returns:
+        Dictionary for the stats API
+    """
+    config = current_app.config
+    since = _today() - timedelta(days=days - 1)
+    rows = GeminiUsage.query.filter(GeminiUsage.day >= since).all()
+
+    def totals(selected):
+        result = {name: sum(getattr(row, name) for row in selected) for name in USAGE_COUNTERS}
+        result['estimated_cost'] = round(
+            result['prompt_tokens'] / 1000 * config.get('GEMINI_PROMPT_COST_PER_1K', 0.0)
+            + result['response_tokens'] / 1000 * config.get('GEMINI_RESPONSE_COST_PER_1K', 0.0), 4)
+        return result
+
+    window = totals(rows)
+    calls = window['calls']
+    return {
+        'today': totals([row for row in rows if row.day == _today()]),
+        f'last_{days}_days': window,
+        'average_tokens_per_call': round((window['prompt_tokens'] + window['response_tokens']) / calls, 1)
+        if calls else None,
+        'quotas': {
+            'daily_calls': config.get('GEMINI_DAILY_CALL_QUOTA', 0) or None,
+            'daily_tokens': config.get('GEMINI_DAILY_TOKEN_QUOTA', 0) or None,
+            'global_daily_tokens': config.get('GEMINI_GLOBAL_DAILY_TOKEN_QUOTA', 0) or None,
+        },
+    }
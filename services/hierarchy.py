@@ -0,0 +1,417 @@
+"""
+Reporting lines and team rollups
+
+Every user may have a direct manager (users.manager_id) in the same
+company. The reporting lines are also kept as a closure table,
+user_hierarchy: one row per (manager at any level, report) with their
+distance, plus a depth-0 row per user. Everyone below a manager is then a
+single indexed lookup (``ancestor_id = :manager AND depth > 0``) instead of
+a recursive walk.
+
+team_rollups holds, per manager, the team's headcount, IDP status counts
+(live and archived, superseded excluded), progress completion totals and the
+most common missing skills. It is kept current on every ORM flush:
+
+- IDP status and progress completion changes are applied as increments to
+  the rollups of all of the employee's managers in one UPDATE
+- a new user gets their closure rows; a manager change moves the user's
+  whole subtree and recomputes the rollups of the old and new managers
+- archiving is neutral, since rollups count archived plans too
+
+Skill gaps are computed by the nightly pipeline, whose team_rollups step
+refreshes every rollup (``flask team refresh``) and so also repairs drift
+from writes made outside the ORM. ``flask team rebuild`` recreates the
+closure table from users.manager_id.
+"""
+import json
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models.models import db, User, IDP, Progress, SkillGap, ArchiveRollup, UserHierarchy, TeamRollup
+from services.cache import bump_data_version
+from services.tenancy import current_company_id
+
+STATUS_COLUMNS = {'pending': 'pending_idps', 'in_progress': 'in_progress_idps', 'completed': 'completed_idps'}
+DELTA_COLUMNS = tuple(STATUS_COLUMNS.values()) + ('progress_count', 'completion_sum')
+TOP_GAPS = 10
+MAX_DEPTH = 100
+CHUNK_SIZE = 500
+
+hierarchy = UserHierarchy.__table__
+rollups = TeamRollup.__table__
+
+
+class HierarchyError(ValueError):
+    """Raised when a reporting line would be invalid (other company, cycle)."""
+
+
+def _chunks(ids):
+    ids = sorted(ids)
+    for start in range(0, len(ids), CHUNK_SIZE):
+        yield ids[start:start + CHUNK_SIZE]
+
+
+def _ancestor_ids(conn, user_id):
+    return set(conn.execute(
+        db.select(hierarchy.c.ancestor_id)
+        .where(hierarchy.c.descendant_id == user_id, hierarchy.c.depth > 0)
+    ).scalars())
+
+
+def _move_subtree(conn, user_id, company_id, manager_id):
+    """
+    Re-attach a user and everyone below them under manager_id (None: no manager)
+
+    Returns:
+        Managers whose team changed
+    """
+    subtree = list(conn.execute(
+        db.select(hierarchy.c.descendant_id).where(hierarchy.c.ancestor_id == user_id)
+    ).scalars())
+    if manager_id is not None and manager_id in subtree:
+        raise HierarchyError('A user cannot report to someone in their own team')
+
+    old_ancestors = _ancestor_ids(conn, user_id)
+    # Ids are fetched first: MySQL cannot delete from a table it reads in a subquery
+    for ancestor_chunk in _chunks(old_ancestors):
+        for subtree_chunk in _chunks(subtree):
+            conn.execute(hierarchy.delete().where(hierarchy.c.ancestor_id.in_(ancestor_chunk),
+                                                  hierarchy.c.descendant_id.in_(subtree_chunk)))
+    if manager_id is None:
+        return old_ancestors
+
+    above = hierarchy.alias('above')
+    below = hierarchy.alias('below')
+    conn.execute(hierarchy.insert().from_select(
+        ['company_id', 'ancestor_id', 'descendant_id', 'depth'],
+        db.select(db.literal(company_id), above.c.ancestor_id, below.c.descendant_id,
+                  above.c.depth + below.c.depth + 1)
+        .select_from(above.join(below, db.true()))
+        .where(above.c.descendant_id == manager_id, below.c.ancestor_id == user_id)
+    ))
+    return old_ancestors | _ancestor_ids(conn, user_id)
+
+
+def _team_totals(conn, manager_ids):
+    """manager id -> {rollup column: value} for the given managers, from the base tables"""
+    team = (db.select(hierarchy.c.ancestor_id, hierarchy.c.descendant_id, hierarchy.c.depth)
+            .where(hierarchy.c.ancestor_id.in_(manager_ids), hierarchy.c.depth > 0)
+            .subquery('team'))
+    idps, progress, archived, gaps = IDP.__table__, Progress.__table__, ArchiveRollup.__table__, SkillGap.__table__
+    totals = {}
+
+    for manager_id, headcount, direct in conn.execute(
+        db.select(team.c.ancestor_id, db.func.count(),
+                  db.func.sum(db.case((team.c.depth == 1, 1), else_=0)))
+        .group_by(team.c.ancestor_id)
+    ):
+        totals[manager_id] = dict({column: 0 for column in DELTA_COLUMNS},
+                                  headcount=headcount, direct_reports=int(direct or 0), top_gaps=None)
+
+    def add(manager_id, column, value):
+        if column in DELTA_COLUMNS and manager_id in totals:
+            totals[manager_id][column] += int(value or 0)
+
+    for manager_id, status, count in conn.execute(
+        db.select(team.c.ancestor_id, idps.c.status, db.func.count())
+        .join(idps, idps.c.user_id == team.c.descendant_id)
+        .group_by(team.c.ancestor_id, idps.c.status)
+    ):
+        add(manager_id, STATUS_COLUMNS.get(status), count)
+    for manager_id, count, total in conn.execute(
+        db.select(team.c.ancestor_id, db.func.count(progress.c.completion), db.func.sum(progress.c.completion))
+        .join(idps, idps.c.user_id == team.c.descendant_id)
+        .join(progress, progress.c.idp_id == idps.c.id)
+        .group_by(team.c.ancestor_id)
+    ):
+        add(manager_id, 'progress_count', count)
+        add(manager_id, 'completion_sum', total)
+    for manager_id, status, count, progress_count, completion_sum in conn.execute(
+        db.select(team.c.ancestor_id, archived.c.status, db.func.sum(archived.c.idp_count),
+                  db.func.sum(archived.c.progress_count), db.func.sum(archived.c.completion_sum))
+        .join(archived, archived.c.user_id == team.c.descendant_id)
+        .group_by(team.c.ancestor_id, archived.c.status)
+    ):
+        add(manager_id, STATUS_COLUMNS.get(status), count)
+        add(manager_id, 'progress_count', progress_count)
+        add(manager_id, 'completion_sum', completion_sum)
+
+    missing = {}
+    for manager_id, skills in conn.execute(
+        db.select(team.c.ancestor_id, gaps.c.missing_skills)
+        .join(gaps, gaps.c.user_id == team.c.descendant_id)
+        .where(gaps.c.missing_count > 0)
+    ):
+        counts = missing.setdefault(manager_id, Counter())
+        counts.update({skill.strip() for skill in (skills or '').split(',') if skill.strip()})
+    for manager_id, counts in missing.items():
+        if manager_id in totals:
+            totals[manager_id]['top_gaps'] = json.dumps(counts.most_common(TOP_GAPS))
+    return totals
+
+
+def _recompute(conn, manager_ids):
+    """Replace the rollups of the given managers; managers without reports lose theirs"""
+    written = 0
+    now = datetime.utcnow()
+    for chunk in _chunks(manager_ids):
+        totals = _team_totals(conn, chunk)
+        companies = dict(conn.execute(db.select(User.__table__.c.id, User.__table__.c.company_id)
+                                      .where(User.__table__.c.id.in_(list(totals)))).all()) if totals else {}
+        conn.execute(rollups.delete().where(rollups.c.manager_id.in_(chunk)))
+        if totals:
+            conn.execute(rollups.insert(), [
+                dict(values, manager_id=manager_id, company_id=companies[manager_id], updated_at=now)
+                for manager_id, values in totals.items()
+            ])
+        written += len(totals)
+    return written
+
+
+def _previous(obj, key):
+    """Value of an attribute before this flush"""
+    history = db.inspect(obj).attrs[key].history
+    if history.deleted:
+        return history.deleted[0]
+    return None if history.added else getattr(obj, key)
+
+
+def _idp_owners(conn, idp_ids, known):
+    missing = [idp_id for idp_id in idp_ids if idp_id not in known]
+    for chunk in _chunks(set(missing)):
+        known.update(conn.execute(db.select(IDP.__table__.c.id, IDP.__table__.c.user_id)
+                                  .where(IDP.__table__.c.id.in_(chunk))).all())
+    return known
+
+
+def _collect_deltas(session, conn):
+    """user id -> Counter of rollup column increments caused by this flush"""
+    deltas = {}
+
+    def add(user_id, column, amount):
+        if user_id is not None and column is not None and amount:
+            deltas.setdefault(user_id, Counter())[column] += amount
+
+    changed = [(obj, 'new') for obj in session.new] + [(obj, 'dirty') for obj in session.dirty] \
+        + [(obj, 'deleted') for obj in session.deleted]
+    owners = {}
+    for obj, change in changed:
+        if isinstance(obj, IDP):
+            owners[obj.id] = obj.user_id
+            if change != 'dirty':
+                add(_previous(obj, 'user_id') if change == 'deleted' else obj.user_id,
+                    STATUS_COLUMNS.get(_previous(obj, 'status') if change == 'deleted' else obj.status or 'pending'),
+                    1 if change == 'new' else -1)
+                continue
+            old = (_previous(obj, 'user_id'), _previous(obj, 'status'))
+            if old != (obj.user_id, obj.status):
+                add(old[0], STATUS_COLUMNS.get(old[1]), -1)
+                add(obj.user_id, STATUS_COLUMNS.get(obj.status), 1)
+
+    entries = [(obj, change) for obj, change in changed if isinstance(obj, Progress)]
+    if not entries:
+        return deltas
+    owners = _idp_owners(conn, {idp_id for obj, _ in entries for idp_id in (obj.idp_id, _previous(obj, 'idp_id'))
+                                if idp_id is not None}, owners)
+    for obj, change in entries:
+        old_idp, old_completion = _previous(obj, 'idp_id'), _previous(obj, 'completion')
+        if change != 'new' and old_completion is not None:
+            add(owners.get(old_idp), 'progress_count', -1)
+            add(owners.get(old_idp), 'completion_sum', -old_completion)
+        if change != 'deleted' and obj.completion is not None:
+            add(owners.get(obj.idp_id), 'progress_count', 1)
+            add(owners.get(obj.idp_id), 'completion_sum', obj.completion)
+    return deltas
+
+
+def _apply_delta(conn, user_id, delta, now):
+    values = {column: rollups.c[column] + amount for column, amount in delta.items() if amount}
+    if values:
+        conn.execute(rollups.update().where(rollups.c.manager_id.in_(
+            db.select(hierarchy.c.ancestor_id).where(hierarchy.c.descendant_id == user_id, hierarchy.c.depth > 0)
+        )).values(updated_at=now, **values))
+
+
+def _sync_hierarchy(session, flush_context):
+    changed = list(session.new) + list(session.dirty) + list(session.deleted)
+    if not any(isinstance(obj, (User, IDP, Progress)) for obj in changed):
+        return
+    conn = session.connection()
+    now = datetime.utcnow()
+
+    # Increments first, along the reporting lines as they were before this flush
+    for user_id, delta in _collect_deltas(session, conn).items():
+        _apply_delta(conn, user_id, delta, now)
+
+    affected = set()
+    users = [obj for obj in changed if isinstance(obj, User)]
+    for user in users:
+        if user in session.new:
+            conn.execute(hierarchy.insert().values(company_id=user.company_id, ancestor_id=user.id,
+                                                   descendant_id=user.id, depth=0))
+    for user in users:
+        if user in session.deleted:
+            affected |= _ancestor_ids(conn, user.id)
+            conn.execute(hierarchy.delete().where(db.or_(hierarchy.c.ancestor_id == user.id,
+                                                         hierarchy.c.descendant_id == user.id)))
+            conn.execute(rollups.delete().where(rollups.c.manager_id == user.id))
+        elif user in session.new:
+            if user.manager_id is not None:
+                affected |= _move_subtree(conn, user.id, user.company_id, user.manager_id)
+        elif _previous(user, 'manager_id') != user.manager_id:
+            affected |= _move_subtree(conn, user.id, user.company_id, user.manager_id)
+    if affected:
+        _recompute(conn, affected)
+
+
+def set_manager(user, manager):
+    """
+    Make manager the user's direct manager (None removes it); the caller commits
+
+    Raises:
+        HierarchyError: If the manager is the user, belongs to another company
+            or reports to the user (directly or not)
+    """
+    if manager is None:
+        user.manager_id = None
+        return
+    if manager.id == user.id:
+        raise HierarchyError('A user cannot be their own manager')
+    if manager.company_id != user.company_id:
+        raise HierarchyError('The manager must belong to the same company')
+    below_user = db.session.execute(
+        db.select(UserHierarchy.depth).where(UserHierarchy.ancestor_id == user.id,
+                                             UserHierarchy.descendant_id == manager.id)
+        .execution_options(all_companies=True)
+    ).first()
+    if below_user is not None:
+        raise HierarchyError(f'{manager.name} reports to {user.name}')
+    user.manager_id = manager.id
+
+
+def _company_filter(column):
+    company_id = current_company_id()
+    return column == company_id if company_id is not None else db.true()
+
+
+def refresh_team_rollups(manager_ids=None):
+    """
+    Recompute team rollups from the base tables
+
+    Args:
+        manager_ids: Only these managers (default: every manager of the current
+            company, or of all companies outside a tenant scope)
+
+    Returns:
+        Number of rollups written
+    """
+    conn = db.session.connection()
+    if manager_ids is None:
+        manager_ids = set(conn.execute(
+            db.select(hierarchy.c.ancestor_id).distinct()
+            .where(hierarchy.c.depth > 0, _company_filter(hierarchy.c.company_id))
+        ).scalars())
+        conn.execute(rollups.delete().where(_company_filter(rollups.c.company_id)))
+    written = _recompute(conn, manager_ids)
+    db.session.commit()
+    bump_data_version('team_rollups')
+    return written
+
+
+def rebuild_hierarchy():
+    """
+    Recreate the closure table from users.manager_id, then refresh the rollups
+
+    Returns:
+        Number of closure rows written
+
+    Raises:
+        HierarchyError: If manager_id contains a cycle
+    """
+    conn = db.session.connection()
+    users = User.__table__
+    conn.execute(hierarchy.delete().where(_company_filter(hierarchy.c.company_id)))
+    written = conn.execute(hierarchy.insert().from_select(
+        ['company_id', 'ancestor_id', 'descendant_id', 'depth'],
+        db.select(users.c.company_id, users.c.id, users.c.id, db.literal(0)).where(_company_filter(users.c.company_id))
+    )).rowcount
+
+    # Each pass extends the paths found by the previous one by one level
+    for depth in range(MAX_DEPTH):
+        added = conn.execute(hierarchy.insert().from_select(
+            ['company_id', 'ancestor_id', 'descendant_id', 'depth'],
+            db.select(users.c.company_id, hierarchy.c.ancestor_id, users.c.id, hierarchy.c.depth + 1)
+            .join(hierarchy, hierarchy.c.descendant_id == users.c.manager_id)
+            .where(hierarchy.c.depth == depth, _company_filter(users.c.company_id))
+        )).rowcount
+        if not added:
+            break
+        written += added
+    else:
+        db.session.rollback()
+        raise HierarchyError(f'Reporting lines are deeper than {MAX_DEPTH} levels or contain a cycle')
+
+    refresh_team_rollups()
+    return written
+
+
+def ensure_hierarchy():
+    """Add closure rows for users created outside the ORM (call after create_all/upgrade_schema)"""
+    users = User.__table__
+    self_row = (db.select(hierarchy.c.ancestor_id)
+                .where(hierarchy.c.ancestor_id == users.c.id, hierarchy.c.descendant_id == users.c.id)
+                .exists())
+    missing = db.session.execute(db.select(users.c.id).where(~self_row).limit(1)).first()
+    if missing is None:
+        return 0
+    managed = db.session.execute(db.select(users.c.id).where(users.c.manager_id.isnot(None)).limit(1)).first()
+    if managed is not None:
+        return rebuild_hierarchy()
+    added = db.session.execute(hierarchy.insert().from_select(
+        ['company_id', 'ancestor_id', 'descendant_id', 'depth'],
+        db.select(users.c.company_id, users.c.id, users.c.id, db.literal(0)).where(~self_row)
+    )).rowcount
+    db.session.commit()
+    return added
+
+
+def team_rollup(manager_id):
+    return TeamRollup.query.get(manager_id)
+
+
+def management_chain(user_id):
+    """The user's managers, top-most first"""
+    return (User.query.join(UserHierarchy, UserHierarchy.ancestor_id == User.id)
+            .filter(UserHierarchy.descendant_id == user_id, UserHierarchy.depth > 0)
+            .order_by(UserHierarchy.depth.desc()).all())
+
+
+def direct_reports(manager_id):
+    """(report, their own team rollup or None) for each direct report, by name"""
+    return (db.session.query(User, TeamRollup)
+            .outerjoin(TeamRollup, TeamRollup.manager_id == User.id)
+            .filter(User.manager_id == manager_id)
+            .order_by(User.name).all())
+
+
+def manages(manager_id, user_id):
+    """True if user_id is below manager_id at any depth"""
+    return db.session.execute(
+        db.select(UserHierarchy.depth)
+        .where(UserHierarchy.ancestor_id == manager_id, UserHierarchy.descendant_id == user_id,
+               UserHierarchy.depth > 0)
+    ).first() is not None
+
+
+def can_view_team(viewer, manager_id):
+    """HR sees every team of their company; others their own team and the teams below it"""
+    return viewer.role == 'hr' or viewer.id == manager_id or manages(viewer.id, manager_id)
+
+
+def init_hierarchy(app):
+    """Keep user_hierarchy and team_rollups in step with ORM writes"""
+    if not event.contains(Session, 'after_flush', _sync_hierarchy):
+        event.listen(Session, 'after_flush', _sync_hierarchy)
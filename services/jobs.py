@@ -0,0 +1,229 @@
+"""
+Background jobs with Server-Sent Event streaming
+
+Long-running work (IDP generation) runs on a small thread pool inside its own
+app context. Each job has a status row in background_jobs and appends its
+events to job_events as they happen, so any worker can serve its stream:
+`stream_events()` reads the events after the `Last-Event-ID` a reconnecting
+EventSource sends, formats them as text/event-stream and polls for new ones.
+A reconnect that lands on another worker simply continues from the table.
+
+Each response ends after a short window and the browser reconnects for the
+rest, so a stream never ties up a sync worker for the whole job. A window of
+0 sends only the events stored so far, turning the stream into short polling
+of the job's rows. Events are written on their own connection, so emitting
+never commits work the job function has not committed itself.
+"""
+import json
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app, g
+
+from models.models import db, BackgroundJob, JobEvent
+from services.tenancy import current_company_id, default_company_id
+
+HEARTBEAT_SECONDS = 15
+POLL_SECONDS = 0.25
+
+
+class Job:
+    """
+    Handle a job function emits its events through
+
+    Jobs started by JobRunner (with an id) store every event right away; a
+    Job created directly, e.g. by a CLI command, keeps them in `events`.
+    """
+
+    def __init__(self, job_id=None, owner_id=None, company_id=None):
+        self.id = job_id
+        self.owner_id = owner_id
+        self.company_id = company_id
+        self.events = []
+        self.started = time.monotonic()
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def emit(self, event, data):
+        if self.id is None:
+            self.events.append((event, data))
+            return
+        jobs_table, events_table = BackgroundJob.__table__, JobEvent.__table__
+        now = datetime.utcnow()
+        with db.engine.begin() as conn:
+            conn.execute(events_table.insert().values(job_id=self.id, event=event, data=json.dumps(data),
+                                                      created_at=now))
+            conn.execute(jobs_table.update().where(jobs_table.c.id == self.id).values(updated_at=now))
+
+    def finish(self):
+        if self.id is None:
+            return
+        table = BackgroundJob.__table__
+        now = datetime.utcnow()
+        with db.engine.begin() as conn:
+            conn.execute(table.update().where(table.c.id == self.id)
+                         .values(status='finished', updated_at=now, finished_at=now))
+
+
+class JobRunner:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _get_executor(self, app):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=app.config.get('JOB_WORKERS', 4),
+                                                    thread_name_prefix='job')
+            return self._executor
+
+    def _prune(self, retention, stale):
+        """Delete jobs finished more than `retention` seconds ago, and abandoned ones, with their events"""
+        jobs_table, events_table = BackgroundJob.__table__, JobEvent.__table__
+        now = datetime.utcnow()
+        expired = db.or_(jobs_table.c.finished_at < now - timedelta(seconds=retention),
+                         jobs_table.c.updated_at < now - timedelta(seconds=retention + stale))
+        with db.engine.begin() as conn:
+            conn.execute(events_table.delete().where(events_table.c.job_id.in_(
+                db.select(jobs_table.c.id).where(expired).scalar_subquery()
+            )))
+            conn.execute(jobs_table.delete().where(expired))
+
+    def start(self, fn, *args, owner_id=None, key=None):
+        """
+        Run fn(job, *args) in the background inside an app context, scoped to
+        the caller's company
+
+        Args:
+            key: Deduplication key; while a job with the same key is running
+                 (on any worker), that job is returned instead of starting another
+
+        Returns:
+            The new (or already running) Job
+        """
+        app = current_app._get_current_object()
+        stale = app.config.get('JOB_STALE_SECONDS', 300)
+        self._prune(app.config.get('JOB_RETENTION_SECONDS', 600), stale)
+
+        table = BackgroundJob.__table__
+        company_id = current_company_id() or default_company_id()
+        now = datetime.utcnow()
+        with db.engine.begin() as conn:
+            if key is not None:
+                running = conn.execute(
+                    db.select(table.c.id, table.c.owner_id)
+                    .where(table.c.dedup_key == key, table.c.status == 'running',
+                           table.c.updated_at >= now - timedelta(seconds=stale))
+                    .limit(1)
+                ).first()
+                if running is not None:
+                    return Job(running.id, running.owner_id, company_id)
+            job = Job(uuid.uuid4().hex, owner_id, company_id)
+            conn.execute(table.insert().values(id=job.id, company_id=company_id, owner_id=owner_id, dedup_key=key,
+                                               status='running', created_at=now, updated_at=now))
+
+        def run():
+            with app.app_context():
+                g.audit_actor_id = job.owner_id
+                g.company_id = job.company_id
+                try:
+                    fn(job, *args)
+                except Exception as e:
+                    db.session.rollback()
+                    traceback.print_exc()
+                    job.emit('error', {'message': str(e)})
+                finally:
+                    job.finish()
+
+        self._get_executor(app).submit(run)
+        return job
+
+    def get(self, job_id):
+        """
+        The stored job of the current company, whichever worker runs it
+
+        Returns:
+            Row with id, owner_id, status, ... or None
+        """
+        table = BackgroundJob.__table__
+        query = db.select(table).where(table.c.id == job_id)
+        company_id = current_company_id()
+        if company_id is not None:
+            query = query.where(table.c.company_id == company_id)
+        with db.engine.connect() as conn:
+            return conn.execute(query).first()
+
+
+def format_event(event_id, event, payload):
+    """SSE message for an event whose data is already JSON text"""
+    return f'id: {event_id}\nevent: {event}\ndata: {payload}\n\n'
+
+
+def _read_events(job_id, after):
+    """
+    The job's status and last update, then its events after id `after`
+
+    The status is read first: a job seen as finished has all of its events
+    committed, so they are all in the second query.
+    """
+    jobs_table, events_table = BackgroundJob.__table__, JobEvent.__table__
+    with db.engine.connect() as conn:
+        job = conn.execute(db.select(jobs_table.c.status, jobs_table.c.updated_at)
+                           .where(jobs_table.c.id == job_id)).first()
+        events = conn.execute(db.select(events_table.c.id, events_table.c.event, events_table.c.data)
+                              .where(events_table.c.job_id == job_id, events_table.c.id > after)
+                              .order_by(events_table.c.id)).all()
+    return job, events
+
+
+def stream_events(job_id, last_event_id=None, max_seconds=5, retry_ms=500, stale_seconds=300):
+    """
+    Yield a stored job's events as SSE messages until it finishes or max_seconds pass
+
+    Args:
+        job_id: Job to follow
+        last_event_id: Last-Event-ID header of a reconnecting client (optional)
+        max_seconds: End the response after this long; the client reconnects
+            with Last-Event-ID and continues where it stopped. 0 sends the
+            events stored so far and ends
+        retry_ms: Reconnect delay sent to the client
+        stale_seconds: A running job without events for this long is reported
+            as failed (its worker died)
+    """
+    try:
+        position = int(last_event_id) if last_event_id is not None else 0
+    except ValueError:
+        position = 0
+
+    yield f'retry: {retry_ms}\n\n'
+    deadline = time.monotonic() + max_seconds
+    last_sent = time.monotonic()
+    while True:
+        job, events = _read_events(job_id, position)
+        if job is None:
+            return
+        for event_id, event, payload in events:
+            yield format_event(event_id, event, payload)
+            position = event_id
+        if events:
+            last_sent = time.monotonic()
+        if job.status != 'running':
+            return
+        if job.updated_at < datetime.utcnow() - timedelta(seconds=stale_seconds):
+            yield format_event(position, 'error', json.dumps({'message': 'The job stopped before finishing'}))
+            return
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        if time.monotonic() - last_sent >= HEARTBEAT_SECONDS:
+            yield ': keep-alive\n\n'
+            last_sent = time.monotonic()
+        time.sleep(min(POLL_SECONDS, remaining))
+
+
+jobs = JobRunner()
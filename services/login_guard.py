@@ -0,0 +1,146 @@
+"""
+Login admission control
+
+Password hashes (scrypt) are deliberately expensive. To stop a login burst
+from pinning every request worker:
+
+- sliding-window limits on failed attempts per IP and per account reject
+  abusive traffic before any hashing happens; successful logins are not
+  counted, so many people behind one NAT address can sign in at once
+- verification runs on a small dedicated thread pool whose queue depth is
+  bounded; when it is full the login is rejected immediately (503) instead
+  of queueing behind other logins
+- hashes made with outdated parameters are transparently upgraded on the
+  next successful login
+
+Limits are tracked per worker process.
+"""
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from services.metrics import metrics
+
+
+class LoginOverloaded(Exception):
+    """Raised when the verification queue is full or verification timed out."""
+
+
+class SlidingWindowLimiter:
+    """Allow at most `limit` events per key within `window` seconds"""
+
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self._events = defaultdict(deque)
+        self._lock = threading.Lock()
+
+    def _trim(self, events, now):
+        while events and events[0] <= now - self.window:
+            events.popleft()
+
+    def is_blocked(self, key):
+        now = time.monotonic()
+        with self._lock:
+            events = self._events.get(key)
+            if not events:
+                return False
+            self._trim(events, now)
+            if not events:
+                del self._events[key]
+                return False
+            return len(events) >= self.limit
+
+    def record(self, key):
+        now = time.monotonic()
+        with self._lock:
+            events = self._events[key]
+            self._trim(events, now)
+            events.append(now)
+
+    def reset(self, key):
+        with self._lock:
+            self._events.pop(key, None)
+
+
+class PasswordVerifier:
+    """Bounded executor for password hash checks"""
+
+    def __init__(self, workers=2, queue_depth=16, timeout=5.0):
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='login-hash')
+        self._slots = threading.BoundedSemaphore(workers + queue_depth)
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def _release(self, _future):
+        with self._lock:
+            self._in_flight -= 1
+            metrics.set_gauge('login_hash_in_flight', self._in_flight)
+        self._slots.release()
+
+    def submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            metrics.inc('login_rejected_total', reason='overloaded')
+            raise LoginOverloaded('Password verification queue is full')
+        with self._lock:
+            self._in_flight += 1
+            metrics.set_gauge('login_hash_in_flight', self._in_flight)
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(self._release)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            metrics.inc('login_rejected_total', reason='timeout')
+            raise LoginOverloaded('Password verification timed out')
+
+    def verify(self, password_hash, password):
+        return self.submit(check_password_hash, password_hash, password)
+
+    def hash(self, password, method):
+        return self.submit(generate_password_hash, password, method)
+
+
+class LoginGuard:
+    """Throttling plus offloaded verification, configured from app config"""
+
+    def __init__(self):
+        self.ip_limiter = None
+        self.account_limiter = None
+        self.verifier = None
+
+    def init_app(self, app):
+        config = app.config
+        self.ip_limiter = SlidingWindowLimiter(config['LOGIN_IP_LIMIT'], config['LOGIN_IP_WINDOW'])
+        self.account_limiter = SlidingWindowLimiter(config['LOGIN_ACCOUNT_FAILURE_LIMIT'],
+                                                    config['LOGIN_ACCOUNT_WINDOW'])
+        self.verifier = PasswordVerifier(config['LOGIN_HASH_WORKERS'], config['LOGIN_HASH_QUEUE_DEPTH'],
+                                         config['LOGIN_HASH_TIMEOUT'])
+
+    def admit(self, ip, account):
+        """
+        Check throttles before any hashing
+
+        Returns:
+            None if admitted, otherwise the rejection reason ('ip' or 'account')
+        """
+        if self.ip_limiter.is_blocked(ip):
+            metrics.inc('login_rejected_total', reason='ip')
+            return 'ip'
+        if self.account_limiter.is_blocked(account):
+            metrics.inc('login_rejected_total', reason='account')
+            return 'account'
+        return None
+
+    def record_failure(self, ip, account):
+        self.ip_limiter.record(ip)
+        self.account_limiter.record(account)
+
+    def record_success(self, account):
+        self.account_limiter.reset(account)
+
+
+login_guard = LoginGuard()
@@ -0,0 +1,132 @@
+"""
+In-process request metrics
+
+Every request is timed per endpoint into a fixed-bucket histogram (exported
+in Prometheus text format at /metrics) and a small ring buffer of recent
+samples used for p50/p95/p99 in the JSON view (/metrics?format=json).
+Counters and gauges can be recorded from anywhere with `metrics.inc()` and
+`metrics.set_gauge()`. Values are per worker process.
+"""
+import threading
+import time
+from collections import defaultdict, deque
+
+from flask import g, request, Response, jsonify, abort, current_app
+from flask_login import current_user
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+RECENT_SAMPLES = 1024
+
+
+def _label_str(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in sorted(labels)) + '}'
+
+
+class Histogram:
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, value):
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+        self.count += 1
+        self.total += value
+        self.recent.append(value)
+
+    def percentile(self, pct):
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(pct / 100.0 * len(ordered)))]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = defaultdict(Histogram)
+        self.counters = defaultdict(float)
+        self.gauges = {}
+
+    def observe(self, name, value, **labels):
+        with self._lock:
+            self.histograms[(name, tuple(labels.items()))].observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        with self._lock:
+            self.counters[(name, tuple(labels.items()))] += amount
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self.gauges[(name, tuple(labels.items()))] = value
+
+    def render_prometheus(self):
+        lines = []
+        with self._lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                lines.append(f'{name}{_label_str(labels)} {value:g}')
+            for (name, labels), value in sorted(self.gauges.items()):
+                lines.append(f'{name}{_label_str(labels)} {value:g}')
+            for (name, labels), hist in sorted(self.histograms.items()):
+                for bound, count in zip(LATENCY_BUCKETS, hist.buckets):
+                    lines.append(f'{name}_bucket{_label_str(labels + (("le", bound),))} {count}')
+                lines.append(f'{name}_bucket{_label_str(labels + (("le", "+Inf"),))} {hist.count}')
+                lines.append(f'{name}_sum{_label_str(labels)} {hist.total:.6f}')
+                lines.append(f'{name}_count{_label_str(labels)} {hist.count}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        def ms(value):
+            return round(value * 1000, 2) if value is not None else None
+
+        with self._lock:
+            return {
+                'counters': {f'{n}{_label_str(l)}': v for (n, l), v in self.counters.items()},
+                'gauges': {f'{n}{_label_str(l)}': v for (n, l), v in self.gauges.items()},
+                'latency_ms': {
+                    f'{n}{_label_str(l)}': {
+                        'count': h.count,
+                        'p50': ms(h.percentile(50)),
+                        'p95': ms(h.percentile(95)),
+                        'p99': ms(h.percentile(99)),
+                    }
+                    for (n, l), h in self.histograms.items()
+                },
+            }
+
+
+metrics = MetricsRegistry()
+
+
+def init_metrics(app):
+    """Time every request and expose /metrics"""
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop('request_started', None)
+        if started is not None and request.endpoint != 'metrics':
+            metrics.observe('http_request_duration_seconds', time.perf_counter() - started,
+                            endpoint=request.endpoint or 'unknown')
+            metrics.inc('http_requests_total', endpoint=request.endpoint or 'unknown',
+                        status=response.status_code)
+        return response
+
+    @app.route('/metrics', endpoint='metrics')
+    def metrics_endpoint():
+        token = current_app.config.get('METRICS_TOKEN')
+        authorized = (token and request.headers.get('Authorization') == f'Bearer {token}') or \
+            (current_user.is_authenticated and current_user.role == 'hr')
+        if not authorized:
+            abort(403)
+        if request.args.get('format') == 'json':
+            return jsonify(metrics.summary())
+        return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,330 @@
+"""
+Nightly batch pipeline
+
+Recomputes derived data outside of HTTP requests (``flask pipeline run``):
+
+1. employees - in id-range chunks, optionally across worker processes:
+   recompute each employee's skill gap for their target role into
+   skill_gaps, flag generated IDPs whose input fingerprint no longer
+   matches as stale, and with --regenerate replace them with a fresh
+   catalog plan (uncovered skills are left as 'template' actions for
+   ``flask idp enrich``)
+2. skill_demand - demand/scarcity rollup, per company
+3. role_suggestions - best-fit roles for every employee, per company
+4. archive - move finished IDPs without recent activity to the archive
+5. team_rollups - recompute every manager's team rollup, including the
+   top skill gaps from step 1
+6. daily_stats - record today's IDP counts and completion for trend reports
+
+Chunks span all companies; each employee is checked against their own
+company's role catalog, with a skill matcher fitted on that company's
+vocabulary only.
+
+Every chunk and step is checkpointed in pipeline_chunks as it finishes; a
+failed or interrupted run resumes from the first unfinished chunk.
+"""
+import multiprocessing
+import time
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from models.models import db, User, Role, IDP, SkillGap, PipelineRun, PipelineChunk
+from ai_engine.gap_analysis import analyze_skill_gap
+from ai_engine.skill_matcher import get_skill_matcher
+from ai_engine.skill_stats import refresh_skill_demand
+from ai_engine.role_suggestions import refresh_role_suggestions
+from ai_engine.recommender import (input_fingerprint, generate_smart_recommendations,
+                                   supersede_generated_plans)
+from services.cache import bump_data_version
+from services.audit import audit_writer
+from services.archive import archive_idps
+from services.hierarchy import refresh_team_rollups
+from services.trends import aggregate_daily_stats
+from services.tenancy import tenant_scope
+
+CHUNKED_STEPS = ('employees',)
+DEFAULT_CHUNK_SIZE = 5000
+
+
+class PipelineError(Exception):
+    """Raised for invalid pipeline options."""
+
+
+def _load_roles():
+    """(company id, role name) -> (required skills, skill weights)"""
+    roles = Role.query.options(db.selectinload(Role.skill_weights)).all()
+    return {(role.company_id, role.role_name): (role.get_required_skills_list(), role.get_skill_weights())
+            for role in roles}
+
+
+def _company_matcher(matchers, company_id):
+    # Same vocabulary as the company's own requests, so other tenants' skills never match
+    if company_id not in matchers:
+        with tenant_scope(company_id):
+            matchers[company_id] = get_skill_matcher()
+    return matchers[company_id]
+
+
+def process_employee_chunk(first_id, last_id, regenerate=False, roles=None):
+    """
+    Recompute gaps and IDP staleness for employees with first_id <= id <= last_id
+
+    Returns:
+        (employees processed, IDPs flagged stale, employees regenerated)
+    """
+    roles = roles if roles is not None else _load_roles()
+    matchers = {}
+    threshold = current_app.config.get('SKILL_MATCH_THRESHOLD', 0.7)
+
+    employees = (User.query
+                 .filter(User.role == 'employee', User.id.between(first_id, last_id))
+                 .order_by(User.id)
+                 .all())
+    plans = {}
+    for idp_id, user_id, fingerprint in db.session.execute(
+        db.select(IDP.id, IDP.user_id, IDP.input_fingerprint)
+        .where(IDP.user_id.between(first_id, last_id),
+               IDP.input_fingerprint.isnot(None),
+               IDP.status.in_(('pending', 'in_progress')))
+    ):
+        plans.setdefault(user_id, []).append((idp_id, fingerprint))
+
+    now = datetime.utcnow()
+    gap_rows, stale_ids, fresh_ids, to_regenerate = [], [], [], []
+    for employee in employees:
+        required, weights = roles.get((employee.company_id, employee.target_role), ([], {}))
+        fingerprint = input_fingerprint(employee, employee.target_role, required, weights) if required else None
+        if required:
+            gap = analyze_skill_gap(employee.get_skills_list(), required,
+                                    matcher=_company_matcher(matchers, employee.company_id), threshold=threshold)
+            gap_rows.append({
+                'company_id': employee.company_id,
+                'user_id': employee.id,
+                'target_role': employee.target_role,
+                'total_required': gap['total_required'],
+                'missing_count': len(gap['missing_skills']),
+                'gap_percentage': gap['gap_percentage'],
+                'missing_skills': ', '.join(gap['missing_skills']),
+                'input_fingerprint': fingerprint,
+                'computed_at': now,
+            })
+
+        employee_plans = plans.get(employee.id, [])
+        for idp_id, plan_fingerprint in employee_plans:
+            (fresh_ids if plan_fingerprint == fingerprint else stale_ids).append(idp_id)
+        if regenerate and required and employee_plans and \
+                all(plan_fingerprint != fingerprint for _, plan_fingerprint in employee_plans):
+            to_regenerate.append((employee, required, weights, fingerprint))
+
+    db.session.execute(db.delete(SkillGap).where(SkillGap.user_id.between(first_id, last_id)))
+    if gap_rows:
+        db.session.execute(db.insert(SkillGap), gap_rows)
+    if stale_ids:
+        db.session.execute(db.update(IDP).where(IDP.id.in_(stale_ids)).values(stale=True))
+    if fresh_ids:
+        db.session.execute(db.update(IDP).where(IDP.id.in_(fresh_ids), IDP.stale.is_(True)).values(stale=False))
+
+    regenerated = 0
+    for employee, required, weights, fingerprint in to_regenerate:
+        recommendations = generate_smart_recommendations(employee, employee.target_role, required, weights)
+        try:
+            with db.session.begin_nested():
+                supersede_generated_plans(employee.id)
+                for i, rec in enumerate(recommendations):
+                    db.session.add(IDP(user_id=employee.id, company_id=employee.company_id,
+                                       input_fingerprint=fingerprint,
+                                       active_fingerprint=None if i else fingerprint, **rec))
+        except IntegrityError:
+            # HR generated a plan for the same inputs meanwhile; keep theirs
+            continue
+        regenerated += 1
+
+    db.session.commit()
+    if stale_ids or fresh_ids:
+        bump_data_version('idps')
+    return len(employees), len(stale_ids), regenerated
+
+
+def _archive_step():
+    return archive_idps()[0]
+
+
+GLOBAL_STEPS = {
+    'skill_demand': refresh_skill_demand,
+    'role_suggestions': refresh_role_suggestions,
+    'archive': _archive_step,
+    'team_rollups': refresh_team_rollups,
+    'daily_stats': aggregate_daily_stats,
+}
+ALL_STEPS = CHUNKED_STEPS + tuple(GLOBAL_STEPS)
+
+
+def _plan_chunks(run, chunk_size):
+    """Split employee ids into contiguous ranges of about chunk_size employees"""
+    ids = db.session.execute(
+        db.select(User.id).where(User.role == 'employee').order_by(User.id)
+        .execution_options(yield_per=50000)
+    ).scalars()
+    index, batch = 0, []
+    for user_id in ids:
+        batch.append(user_id)
+        if len(batch) == chunk_size:
+            db.session.add(PipelineChunk(run_id=run.id, step='employees', chunk_index=index,
+                                         first_id=batch[0], last_id=batch[-1]))
+            index, batch = index + 1, []
+    if batch:
+        db.session.add(PipelineChunk(run_id=run.id, step='employees', chunk_index=index,
+                                     first_id=batch[0], last_id=batch[-1]))
+    db.session.commit()
+
+
+# Worker processes build their own app (and DB connections) once
+_worker_app = None
+
+
+def _init_worker(database_uri, overrides):
+    global _worker_app
+    from config import Config
+    from app import create_app
+
+    Config.SQLALCHEMY_DATABASE_URI = database_uri
+    _worker_app = create_app()
+    _worker_app.config.update(overrides)
+
+
+def _run_chunk_in_worker(args):
+    chunk_id, first_id, last_id, regenerate = args
+    with _worker_app.app_context():
+        result = process_employee_chunk(first_id, last_id, regenerate)
+        # Pool workers can be terminated without running atexit hooks
+        audit_writer.flush()
+        return (chunk_id,) + result
+
+
+def _picklable_config(app):
+    return {key: value for key, value in app.config.items()
+            if key.isupper() and isinstance(value, (str, int, float, bool, type(None)))}
+
+
+def _finish_chunk(chunk_id, processed, stale, regenerated):
+    chunk = db.session.get(PipelineChunk, chunk_id)
+    chunk.status = 'done'
+    chunk.processed = processed
+    chunk.stale = stale
+    chunk.regenerated = regenerated
+    chunk.finished_at = datetime.utcnow()
+    db.session.commit()
+
+
+def _run_employee_step(run, workers, echo):
+    pending = (PipelineChunk.query
+               .filter_by(run_id=run.id, step='employees', status='pending')
+               .order_by(PipelineChunk.chunk_index)
+               .all())
+    tasks = [(chunk.id, chunk.first_id, chunk.last_id, run.regenerate) for chunk in pending]
+    total = PipelineChunk.query.filter_by(run_id=run.id, step='employees').count()
+    done = total - len(tasks)
+
+    if workers <= 1:
+        roles = _load_roles()
+        for chunk_id, first_id, last_id, regenerate in tasks:
+            _finish_chunk(chunk_id, *process_employee_chunk(first_id, last_id, regenerate, roles))
+            done += 1
+            echo(f'  employees: chunk {done}/{total}')
+        return
+
+    app = current_app._get_current_object()
+    context = multiprocessing.get_context('spawn')
+    pool = context.Pool(workers, initializer=_init_worker,
+                        initargs=(app.config['SQLALCHEMY_DATABASE_URI'], _picklable_config(app)))
+    try:
+        for result in pool.imap_unordered(_run_chunk_in_worker, tasks):
+            _finish_chunk(*result)
+            done += 1
+            echo(f'  employees: chunk {done}/{total}')
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+
+def run_pipeline(steps=ALL_STEPS, chunk_size=DEFAULT_CHUNK_SIZE, workers=1, regenerate=False,
+                 resume=True, echo=print):
+    """
+    Run (or resume) the batch pipeline
+
+    Args:
+        steps: Step names to run, in ALL_STEPS order
+        chunk_size: Employees per chunk (new runs only)
+        workers: Worker processes for chunked steps (1 = in process)
+        regenerate: Give employees with only stale plans a fresh catalog plan (new runs only)
+        resume: Continue the latest unfinished run instead of starting a new one
+        echo: Progress callback
+
+    Returns:
+        The PipelineRun
+    """
+    unknown = set(steps) - set(ALL_STEPS)
+    if unknown:
+        raise PipelineError(f'Unknown steps: {", ".join(sorted(unknown))}')
+    steps = [step for step in ALL_STEPS if step in steps]
+
+    run = None
+    if resume:
+        run = (PipelineRun.query
+               .filter(PipelineRun.status.in_(('running', 'failed')))
+               .order_by(PipelineRun.id.desc())
+               .first())
+        if run is not None:
+            steps = run.steps.split(',')
+            run.status = 'running'
+            run.error = None
+            db.session.commit()
+            echo(f'Resuming pipeline run {run.id}')
+    if run is None:
+        run = PipelineRun(steps=','.join(steps), regenerate=regenerate)
+        db.session.add(run)
+        db.session.commit()
+        if 'employees' in steps:
+            _plan_chunks(run, chunk_size)
+        echo(f'Started pipeline run {run.id}')
+
+    try:
+        for step in steps:
+            started = time.perf_counter()
+            if step in CHUNKED_STEPS:
+                _run_employee_step(run, workers, echo)
+            elif not PipelineChunk.query.filter_by(run_id=run.id, step=step, status='done').first():
+                processed = GLOBAL_STEPS[step]()
+                db.session.add(PipelineChunk(run_id=run.id, step=step, chunk_index=0, status='done',
+                                             processed=processed, finished_at=datetime.utcnow()))
+                db.session.commit()
+            else:
+                continue
+            echo(f'{step}: done in {time.perf_counter() - started:.1f}s')
+    except Exception as e:
+        db.session.rollback()
+        run.status = 'failed'
+        run.error = str(e)
+        db.session.commit()
+        raise
+
+    run.status = 'completed'
+    run.finished_at = datetime.utcnow()
+    db.session.commit()
+    return run
+
+
+def run_summary(run):
+    """Totals across a run's checkpoints"""
+    totals = db.session.execute(
+        db.select(db.func.coalesce(db.func.sum(PipelineChunk.processed), 0),
+                  db.func.coalesce(db.func.sum(PipelineChunk.stale), 0),
+                  db.func.coalesce(db.func.sum(PipelineChunk.regenerated), 0))
+        .where(PipelineChunk.run_id == run.id, PipelineChunk.step == 'employees')
+    ).one()
+    return {'employees': totals[0], 'stale_idps': totals[1], 'regenerated': totals[2]}
@@ -0,0 +1,223 @@
+"""
+Opt-in request profiling
+
+A request is profiled when any of these apply:
+
+- PROFILE_ALL_REQUESTS is set
+- it carries ``X-Profile: <PROFILE_TOKEN>``, or ``X-Profile: 1`` from a
+  logged-in HR user
+- it is picked by PROFILE_SAMPLE_RATE (share of requests, 0 disables)
+
+While a profiled request runs, a sampler thread records the request
+thread's Python stack every PROFILE_INTERVAL seconds, and every SQL
+statement is timed. On completion two files are written to PROFILE_DIR
+(default <instance>/profiles):
+
+- <id>.collapsed: one ``frame;frame;frame count`` line per distinct stack,
+  the input format of flamegraph.pl and speedscope
+- <id>.json: method, path, status, duration, company and the SQL executed
+
+Only the newest PROFILE_KEEP profiles are kept. HR sees their company's
+slowest captured requests at /hr/profiles. Work done by background jobs
+(streamed IDP generation) runs on other threads and is not sampled.
+"""
+import hmac
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+
+from flask import g, request, current_app, has_request_context
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+PROFILE_HEADER = 'X-Profile'
+SKIPPED_ENDPOINTS = ('static', 'assets', 'metrics', 'hr.profiles', 'hr.profile_stacks')
+MAX_RECORDED_QUERIES = 500
+PROFILE_NAME = re.compile(r'^[0-9]{8}-[0-9]{6}-[0-9a-f]{8}$')
+
+
+class StackSampler:
+    """Counts the distinct stacks of one thread, sampled from a helper thread"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(f'{frame.f_globals.get("__name__", "?")}:{frame.f_code.co_name}')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def collapsed(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+class RequestProfile:
+    def __init__(self, interval):
+        self.started_at = datetime.utcnow()
+        self.started = time.perf_counter()
+        self.status = 500
+        self.queries = []
+        self.query_count = 0
+        self.sql_seconds = 0.0
+        self.sampler = StackSampler(threading.get_ident(), interval)
+        self.sampler.start()
+
+    def add_query(self, statement, seconds):
+        self.query_count += 1
+        self.sql_seconds += seconds
+        if len(self.queries) < MAX_RECORDED_QUERIES:
+            self.queries.append({'sql': statement, 'ms': round(seconds * 1000, 3)})
+
+
+def _should_profile():
+    if request.endpoint in SKIPPED_ENDPOINTS:
+        return False
+    config = current_app.config
+    if config.get('PROFILE_ALL_REQUESTS'):
+        return True
+    header = request.headers.get(PROFILE_HEADER)
+    if header:
+        token = config.get('PROFILE_TOKEN')
+        if token and hmac.compare_digest(header, token):
+            return True
+        if current_user.is_authenticated and current_user.role == 'hr':
+            return True
+    rate = config.get('PROFILE_SAMPLE_RATE', 0.0)
+    return rate > 0 and random.random() < rate
+
+
+def _start_profile():
+    if _should_profile():
+        g.profile = RequestProfile(current_app.config.get('PROFILE_INTERVAL', 0.005))
+
+
+def _record_status(response):
+    profile = g.get('profile')
+    if profile is not None:
+        profile.status = response.status_code
+    return response
+
+
+def _finish_profile(exc):
+    profile = g.pop('profile', None)
+    if profile is None:
+        return
+    duration = time.perf_counter() - profile.started
+    profile.sampler.stop()
+    try:
+        _write_profile(profile, duration)
+    except OSError as e:
+        current_app.logger.warning('Could not write request profile: %s', e)
+
+
+def profile_dir(app=None):
+    app = app or current_app
+    return app.config.get('PROFILE_DIR') or os.path.join(app.instance_path, 'profiles')
+
+
+def _write_profile(profile, duration):
+    directory = profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    name = f'{profile.started_at:%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}'
+    with open(os.path.join(directory, name + '.collapsed'), 'w', encoding='utf-8') as f:
+        f.write(profile.sampler.collapsed())
+    with open(os.path.join(directory, name + '.json'), 'w', encoding='utf-8') as f:
+        json.dump({
+            'name': name,
+            'started_at': profile.started_at.isoformat(),
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'endpoint': request.endpoint,
+            'status': profile.status,
+            'company_id': g.get('company_id'),
+            'duration_ms': round(duration * 1000, 2),
+            'samples': sum(profile.sampler.stacks.values()),
+            'query_count': profile.query_count,
+            'sql_ms': round(profile.sql_seconds * 1000, 2),
+            'queries': profile.queries,
+        }, f)
+    _prune(directory, current_app.config.get('PROFILE_KEEP', 200))
+
+
+def _prune(directory, keep):
+    paths = sorted((os.path.join(directory, name) for name in os.listdir(directory) if name.endswith('.json')),
+                   key=os.path.getmtime)
+    for path in paths[:max(0, len(paths) - keep)]:
+        for suffix in ('.json', '.collapsed'):
+            try:
+                os.remove(path[:-5] + suffix)
+            except FileNotFoundError:
+                pass
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and g.get('profile') is not None:
+        conn.info['profile_query_start'] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop('profile_query_start', None)
+    profile = g.get('profile') if has_request_context() else None
+    if started is not None and profile is not None:
+        profile.add_query(statement, time.perf_counter() - started)
+
+
+def load_profile(name):
+    """Metadata and queries of a captured request, or None"""
+    if not PROFILE_NAME.match(name or ''):
+        return None
+    try:
+        with open(os.path.join(profile_dir(), name + '.json'), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def slowest_profiles(company_id, limit=50):
+    """A company's captured requests (and anonymous ones), slowest first"""
+    directory = profile_dir()
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for filename in os.listdir(directory):
+        if filename.endswith('.json'):
+            profile = load_profile(filename[:-5])
+            # Requests made before login (no company) are shown to everyone
+            if profile is not None and profile.get('company_id') in (company_id, None):
+                profiles.append(profile)
+    profiles.sort(key=lambda profile: profile['duration_ms'], reverse=True)
+    return profiles[:limit]
+
+
+def init_profiling(app):
+    """Profile opted-in requests; register before other request hooks so they are included"""
+    app.before_request(_start_profile)
+    app.after_request(_record_status)
+    app.teardown_request(_finish_profile)
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
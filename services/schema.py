@@ -0,0 +1,160 @@
+"""
+Schema upgrades for existing databases
+
+`db.create_all()` creates missing tables but never alters existing ones. This
+adds columns and indexes that were introduced on a model after its table was
+created, so older SQLite/MySQL databases keep working without a migration
+tool. Columns are added as nullable; rows created before the upgrade keep
+NULL, or get the column's default if it has a constant one. Derived tables in
+REBUILDABLE_TABLES are dropped and recreated empty when their primary key
+changes or they lack a declared unique constraint (their rows may already
+break it). Unique constraints that are no longer declared on the model are
+dropped; SQLite cannot drop a constraint written into CREATE TABLE (such as
+the old global `UNIQUE (role_name)` on roles), so such a table is recreated
+from the model with its rows copied over. Anything more involved needs a
+manual migration.
+"""
+from sqlalchemy.schema import CreateTable
+
+from models.models import db
+
+# Tables that only hold recomputable data (refilled by `flask pipeline run`)
+REBUILDABLE_TABLES = ('skill_demand', 'role_suggestions')
+
+
+def _declared_unique_columns(table):
+    unique = {tuple(c.name for c in constraint.columns)
+              for constraint in table.constraints if isinstance(constraint, db.UniqueConstraint)}
+    unique.update((column.name,) for column in table.columns if column.unique)
+    unique.update(tuple(c.name for c in index.columns) for index in table.indexes if index.unique)
+    return unique
+
+
+def _literal_default(column):
+    if column.default is not None and column.default.is_scalar:
+        return db.literal(column.default.arg, column.type).compile(
+            dialect=db.engine.dialect, compile_kwargs={'literal_binds': True})
+    return None
+
+
+def _copy_rebuild(table, present):
+    """
+    Recreate a SQLite table from its model and copy the rows over
+
+    Follows SQLite's procedure for schema changes ALTER TABLE cannot make:
+    create the new table, copy, drop the old one, rename. Columns the old
+    table lacks are created nullable, as ADD COLUMN would.
+
+    Args:
+        table: Model table
+        present: Names of the columns the existing table has
+    """
+    preparer = db.engine.dialect.identifier_preparer
+    connection = db.session.connection()
+    name = preparer.quote(table.name)
+    temporary = preparer.quote(f'{table.name}__rebuild')
+
+    relaxed = [column for column in table.columns
+               if column.name not in present and not column.nullable and not column.primary_key]
+    for column in relaxed:
+        column.nullable = True
+    try:
+        create = str(CreateTable(table).compile(dialect=db.engine.dialect)).strip()
+    finally:
+        for column in relaxed:
+            column.nullable = False
+
+    targets, values = [], []
+    for column in table.columns:
+        value = preparer.quote(column.name) if column.name in present else _literal_default(column)
+        if value is not None:
+            targets.append(preparer.quote(column.name))
+            values.append(str(value))
+    for statement in (
+        create.replace(f'CREATE TABLE {name} (', f'CREATE TABLE {temporary} (', 1),
+        f'INSERT INTO {temporary} ({", ".join(targets)}) SELECT {", ".join(values)} FROM {name}',
+        f'DROP TABLE {name}',
+        f'ALTER TABLE {temporary} RENAME TO {name}',
+    ):
+        connection.exec_driver_sql(statement)
+    for index in table.indexes:
+        index.create(bind=connection)
+
+
+def upgrade_schema():
+    """
+    Add missing columns and indexes to existing tables (call after create_all)
+
+    Returns:
+        List of the DDL statements that were executed
+    """
+    inspector = db.inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    preparer = db.engine.dialect.identifier_preparer
+    executed = []
+
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+
+        if table.name in REBUILDABLE_TABLES:
+            primary_key = inspector.get_pk_constraint(table.name)['constrained_columns']
+            present_unique = {tuple(constraint['column_names'])
+                              for constraint in inspector.get_unique_constraints(table.name)}
+            present_unique.update(tuple(index['column_names']) for index in inspector.get_indexes(table.name)
+                                  if index['unique'])
+            if (set(primary_key) != {column.name for column in table.primary_key.columns}
+                    or not _declared_unique_columns(table) <= present_unique):
+                table.drop(bind=db.session.connection())
+                table.create(bind=db.session.connection())
+                executed.append(f'REBUILD TABLE {table.name}')
+                continue
+
+        if db.engine.dialect.name == 'mysql':
+            declared = _declared_unique_columns(table)
+            for constraint in inspector.get_unique_constraints(table.name):
+                if tuple(constraint['column_names']) not in declared:
+                    ddl = f'ALTER TABLE {preparer.quote(table.name)} DROP INDEX {preparer.quote(constraint["name"])}'
+                    db.session.execute(db.text(ddl))
+                    executed.append(ddl)
+        elif db.engine.dialect.name == 'sqlite':
+            declared = _declared_unique_columns(table)
+            if any(tuple(constraint['column_names']) not in declared
+                   for constraint in inspector.get_unique_constraints(table.name)):
+                _copy_rebuild(table, {column['name'] for column in inspector.get_columns(table.name)})
+                executed.append(f'REBUILD TABLE {table.name} (rows copied)')
+                continue
+            for index in inspector.get_indexes(table.name):
+                if index['unique'] and tuple(index['column_names']) not in declared:
+                    ddl = f'DROP INDEX {preparer.quote(index["name"])}'
+                    db.session.execute(db.text(ddl))
+                    executed.append(ddl)
+
+        present = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in present:
+                continue
+            ddl = (f'ALTER TABLE {preparer.quote(table.name)} ADD COLUMN {preparer.quote(column.name)} '
+                   f'{column.type.compile(dialect=db.engine.dialect)}')
+            default = _literal_default(column)
+            if default is not None:
+                ddl += f' DEFAULT {default}'
+            db.session.execute(db.text(ddl))
+            executed.append(ddl)
+
+        indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+        indexes.update(constraint['name'] for constraint in inspector.get_unique_constraints(table.name))
+        for index in table.indexes:
+            if index.name not in indexes:
+                index.create(bind=db.session.connection())
+                executed.append(f'CREATE INDEX {index.name}')
+        for constraint in table.constraints:
+            if isinstance(constraint, db.UniqueConstraint) and constraint.name and constraint.name not in indexes:
+                columns = ', '.join(preparer.quote(column.name) for column in constraint.columns)
+                ddl = (f'CREATE UNIQUE INDEX {preparer.quote(constraint.name)} '
+                       f'ON {preparer.quote(table.name)} ({columns})')
+                db.session.execute(db.text(ddl))
+                executed.append(ddl)
+
+    db.session.commit()
+    return executed
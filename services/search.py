@@ -0,0 +1,235 @@
+"""
+Full-text search over IDP plans and progress feedback
+
+IDP.action, IDP.metric, IDP.skill_gap and Progress.feedback are indexed by
+the database itself, so the index is updated in the same transaction as
+every write (ORM, bulk Core updates, archival deletes):
+
+- SQLite: FTS5 tables idps_fts/progress_fts over the base tables
+  (external content), kept in sync by triggers; results are ranked by bm25
+  and words are stemmed (``blocked`` finds ``block``)
+- MySQL: InnoDB FULLTEXT indexes ft_idps_text/ft_progress_feedback, ranked
+  by MATCH ... AGAINST relevance
+
+``ensure_search_index()`` creates whatever is missing at startup and fills
+the SQLite index from existing rows. All terms of a query must match; quoted
+text is matched as a phrase. Archived IDPs are not searched.
+"""
+import re
+
+from flask import current_app
+from markupsafe import Markup, escape
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+from models.models import db
+from services.tenancy import current_company_id
+
+SEARCH_SCOPES = ('all', 'idps', 'progress')
+DEFAULT_PER_PAGE = 20
+MAX_PER_PAGE = 100
+SNIPPET_WORDS = 16
+SNIPPET_CHARS = 160
+# Match markers inside raw snippets; replaced by <mark> after escaping
+MARK_START, MARK_END = '\x02', '\x03'
+
+# Base table -> (SQLite FTS table, MySQL FULLTEXT index, indexed columns)
+SEARCH_INDEXES = {
+    'idps': ('idps_fts', 'ft_idps_text', ('action', 'metric', 'skill_gap')),
+    'progress': ('progress_fts', 'ft_progress_feedback', ('feedback',)),
+}
+
+
+class SearchError(Exception):
+    """Raised for invalid search options or a missing index."""
+
+
+class SearchResults:
+    def __init__(self, hits, total, page, per_page):
+        self.hits = hits
+        self.total = total
+        self.page = page
+        self.per_page = per_page
+
+    @property
+    def pages(self):
+        return max(1, -(-self.total // self.per_page))
+
+
+def _sqlite_triggers(table, fts, columns):
+    names = ', '.join(columns)
+    new_values = ', '.join(f'new.{column}' for column in columns)
+    old_values = ', '.join(f'old.{column}' for column in columns)
+    insert = f'INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new_values});'
+    delete = f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old_values});"
+    return [
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN {insert} END',
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN {delete} END',
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF {names} ON {table} '
+        f'BEGIN {delete} {insert} END',
+    ]
+
+
+def ensure_search_index():
+    """
+    Create missing full-text indexes (call after create_all/upgrade_schema)
+
+    Returns:
+        List of the indexes that were created
+    """
+    dialect = db.engine.dialect.name
+    created = []
+    if dialect == 'sqlite':
+        existing = set(db.session.execute(db.text("SELECT name FROM sqlite_master WHERE type = 'table'")).scalars())
+        for table, (fts, _, columns) in SEARCH_INDEXES.items():
+            if fts in existing:
+                continue
+            try:
+                db.session.execute(db.text(
+                    f"CREATE VIRTUAL TABLE {fts} USING fts5({', '.join(columns)}, content='{table}', "
+                    f"content_rowid='id', tokenize='porter unicode61')"
+                ))
+            except OperationalError as e:
+                db.session.rollback()
+                current_app.logger.warning('Full-text search disabled, FTS5 is not available: %s', e)
+                return created
+            for ddl in _sqlite_triggers(table, fts, columns):
+                db.session.execute(db.text(ddl))
+            db.session.execute(db.text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+            created.append(fts)
+    elif dialect == 'mysql':
+        inspector = db.inspect(db.engine)
+        for table, (_, index, columns) in SEARCH_INDEXES.items():
+            if index not in {existing['name'] for existing in inspector.get_indexes(table)}:
+                db.session.execute(db.text(f'ALTER TABLE {table} ADD FULLTEXT INDEX {index} ({", ".join(columns)})'))
+                created.append(index)
+    db.session.commit()
+    return created
+
+
+def parse_query(text):
+    """
+    Split a query into required terms; "quoted text" stays one phrase
+
+    Returns:
+        List of terms, each a space-separated run of words
+    """
+    terms = []
+    for phrase, word in re.findall(r'"([^"]*)"|(\S+)', text or ''):
+        words = re.findall(r'\w+', phrase or word)
+        if words:
+            terms.append(' '.join(words))
+    return terms
+
+
+def highlight(snippet):
+    """HTML for a raw snippet: escaped, with matches wrapped in <mark>"""
+    return Markup(str(escape(snippet or '')).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>'))
+
+
+def _make_snippet(body, terms):
+    """Window of body around the first matching word, matches marked (MySQL has no snippet())"""
+    body = ' '.join((body or '').split())
+    words = {word.lower() for term in terms for word in term.split()}
+    pattern = re.compile(r'\b(' + '|'.join(re.escape(word) for word in words) + r')\b', re.I) if words else None
+    match = pattern.search(body) if pattern else None
+    start = max(0, match.start() - SNIPPET_CHARS // 3) if match else 0
+    window = body[start:start + SNIPPET_CHARS]
+    if pattern:
+        window = pattern.sub(lambda m: f'{MARK_START}{m.group(0)}{MARK_END}', window)
+    return ('…' if start else '') + window + ('…' if start + SNIPPET_CHARS < len(body) else '')
+
+
+def _sqlite_hits(scope):
+    parts = []
+    if scope in ('all', 'idps'):
+        parts.append(
+            "SELECT 'idp' AS kind, i.id AS id, i.id AS idp_id, i.user_id AS user_id, i.skill_gap AS skill_gap, "
+            "i.status AS status, -bm25(idps_fts) AS score, "
+            f"snippet(idps_fts, -1, char(2), char(3), '…', {SNIPPET_WORDS}) AS snippet "
+            "FROM idps_fts JOIN idps i ON i.id = idps_fts.rowid "
+            "WHERE idps_fts MATCH :query AND (:company_id IS NULL OR i.company_id = :company_id)"
+        )
+    if scope in ('all', 'progress'):
+        parts.append(
+            "SELECT 'progress' AS kind, p.id AS id, p.idp_id AS idp_id, i.user_id AS user_id, "
+            "i.skill_gap AS skill_gap, i.status AS status, -bm25(progress_fts) AS score, "
+            f"snippet(progress_fts, 0, char(2), char(3), '…', {SNIPPET_WORDS}) AS snippet "
+            "FROM progress_fts JOIN progress p ON p.id = progress_fts.rowid JOIN idps i ON i.id = p.idp_id "
+            "WHERE progress_fts MATCH :query AND (:company_id IS NULL OR p.company_id = :company_id)"
+        )
+    return ' UNION ALL '.join(parts)
+
+
+def _mysql_hits(scope):
+    parts = []
+    if scope in ('all', 'idps'):
+        parts.append(
+            "SELECT 'idp' AS kind, i.id AS id, i.id AS idp_id, i.user_id AS user_id, i.skill_gap AS skill_gap, "
+            "i.status AS status, MATCH(i.action, i.metric, i.skill_gap) AGAINST(:query IN BOOLEAN MODE) AS score, "
+            "CONCAT_WS(' - ', i.skill_gap, i.action, i.metric) AS snippet "
+            "FROM idps i WHERE MATCH(i.action, i.metric, i.skill_gap) AGAINST(:query IN BOOLEAN MODE) "
+            "AND (:company_id IS NULL OR i.company_id = :company_id)"
+        )
+    if scope in ('all', 'progress'):
+        parts.append(
+            "SELECT 'progress' AS kind, p.id AS id, p.idp_id AS idp_id, i.user_id AS user_id, "
+            "i.skill_gap AS skill_gap, i.status AS status, "
+            "MATCH(p.feedback) AGAINST(:query IN BOOLEAN MODE) AS score, p.feedback AS snippet "
+            "FROM progress p JOIN idps i ON i.id = p.idp_id "
+            "WHERE MATCH(p.feedback) AGAINST(:query IN BOOLEAN MODE) "
+            "AND (:company_id IS NULL OR p.company_id = :company_id)"
+        )
+    return ' UNION ALL '.join(parts)
+
+
+def search(text, scope='all', page=1, per_page=DEFAULT_PER_PAGE):
+    """
+    Ranked full-text search of the current company's IDPs and progress feedback
+
+    Args:
+        text: Search terms; "quoted text" is matched as a phrase
+        scope: 'all', 'idps' or 'progress'
+        page: 1-based page number
+        per_page: Hits per page (max MAX_PER_PAGE)
+
+    Returns:
+        SearchResults whose hits are dicts with kind ('idp' or 'progress'), id,
+        idp_id, user_id, employee, skill_gap, status, score and an HTML snippet
+
+    Raises:
+        SearchError: If the scope is unknown or the index is not available
+    """
+    if scope not in SEARCH_SCOPES:
+        raise SearchError(f'Unknown search scope "{scope}"')
+    page = max(page or 1, 1)
+    per_page = min(max(per_page or DEFAULT_PER_PAGE, 1), MAX_PER_PAGE)
+    terms = parse_query(text)
+    if not terms:
+        return SearchResults([], 0, page, per_page)
+
+    mysql = db.engine.dialect.name == 'mysql'
+    if mysql:
+        hits, query = _mysql_hits(scope), ' '.join(f'+"{term}"' for term in terms)
+    else:
+        hits, query = _sqlite_hits(scope), ' '.join(f'"{term}"' for term in terms)
+    params = {'query': query, 'company_id': current_company_id()}
+
+    try:
+        total = db.session.execute(db.text(f'SELECT COUNT(*) FROM ({hits}) AS hits'), params).scalar()
+        rows = db.session.execute(db.text(
+            f'SELECT hits.*, users.name AS employee FROM ({hits}) AS hits '
+            'JOIN users ON users.id = hits.user_id '
+            'ORDER BY hits.score DESC, hits.kind, hits.id DESC LIMIT :limit OFFSET :offset'
+        ), dict(params, limit=per_page, offset=(page - 1) * per_page)).mappings().all()
+    except (OperationalError, ProgrammingError) as e:
+        db.session.rollback()
+        current_app.logger.warning('Full-text search failed: %s', e)
+        raise SearchError('Search is not available right now')
+
+    results = []
+    for row in rows:
+        hit = dict(row)
+        hit['score'] = float(hit['score'] or 0)
+        hit['snippet'] = highlight(_make_snippet(hit['snippet'], terms) if mysql else hit['snippet'])
+        results.append(hit)
+    return SearchResults(results, total, page, per_page)
@@ -0,0 +1,168 @@
+"""
+Multi-tenant scoping
+
+Every tenant-owned model (TenantMixin) carries a company_id. The current
+company is kept in ``g.company_id``: it is set from the logged-in user at the
+start of each request, captured by background jobs and set explicitly with
+``tenant_scope()`` in CLI commands. While it is set:
+
+- every ORM SELECT, UPDATE and DELETE is filtered to that company through
+  ``with_loader_criteria`` (including joins, relationship loads and
+  ``Model.query.get``), so another company's rows behave as if they did not
+  exist
+- new tenant rows get the company assigned on flush
+
+Checks that must look across companies (email uniqueness) opt out with
+``.execution_options(all_companies=True)``.
+
+Without a current company (CLI maintenance, the batch pipeline) queries see
+every company and new rows default to the first one. Login looks users up
+by email, which is unique across companies, so no company has to be chosen
+to sign in.
+"""
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import g, has_app_context, request
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.orm import Session, with_loader_criteria
+
+from models.models import db, Company, TenantMixin
+
+DEFAULT_COMPANY_SLUG = 'default'
+
+
+def current_company_id():
+    """Company the current request, job or CLI scope is limited to, or None"""
+    if has_app_context():
+        return g.get('company_id')
+    return None
+
+
+def set_current_company(company_id):
+    g.company_id = company_id
+
+
+@contextmanager
+def tenant_scope(company_id):
+    """Limit queries and new rows to one company for the duration of the block"""
+    previous = g.get('company_id')
+    g.company_id = company_id
+    try:
+        yield
+    finally:
+        g.company_id = previous
+
+
+def company_ids():
+    return list(db.session.execute(db.select(Company.id).order_by(Company.id)).scalars())
+
+
+def per_company(fn):
+    """
+    Run a tenant-scoped maintenance function once per company when it is
+    called outside a tenant scope; the (numeric) results are summed
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if current_company_id() is not None:
+            return fn(*args, **kwargs)
+        total = 0
+        for company_id in company_ids():
+            with tenant_scope(company_id):
+                total += fn(*args, **kwargs)
+        return total
+    return wrapper
+
+
+def default_company_id():
+    if has_app_context() and 'default_company_id' in g:
+        return g.default_company_id
+    company_id = db.session.execute(
+        db.select(Company.id).where(Company.slug == DEFAULT_COMPANY_SLUG)
+    ).scalar()
+    if company_id is None:
+        company_id = db.session.execute(db.select(Company.id).order_by(Company.id).limit(1)).scalar()
+    if has_app_context():
+        g.default_company_id = company_id
+    return company_id
+
+
+def _scope_statement(state):
+    company_id = current_company_id()
+    if company_id is None or state.is_column_load or state.is_relationship_load:
+        return
+    if state.execution_options.get('all_companies'):
+        return
+    if not (state.is_select or state.is_update or state.is_delete):
+        return
+    state.statement = state.statement.options(
+        with_loader_criteria(TenantMixin, lambda cls: cls.company_id == company_id, include_aliases=True)
+    )
+
+
+def _assign_company(session, flush_context, instances):
+    company_id = None
+    for obj in session.new:
+        if isinstance(obj, TenantMixin) and obj.company_id is None:
+            if company_id is None:
+                company_id = current_company_id() or default_company_id()
+            obj.company_id = company_id
+
+
+def _load_tenant():
+    # Resolving current_user runs the (unscoped) user loader once per request
+    if request.endpoint not in ('static', 'assets') and current_user.is_authenticated:
+        set_current_company(current_user.company_id)
+
+
+def init_tenancy(app):
+    """Filter ORM queries by the logged-in user's company"""
+    app.before_request(_load_tenant)
+    if not event.contains(Session, 'do_orm_execute', _scope_statement):
+        event.listen(Session, 'do_orm_execute', _scope_statement)
+        event.listen(Session, 'before_flush', _assign_company)
+
+
+def ensure_default_company():
+    """
+    Create the default company and assign it every row that has no company yet
+    (rows from before multi-tenancy). Call after create_all/upgrade_schema.
+    """
+    if default_company_id() is None:
+        db.session.add(Company(name='Default', slug=DEFAULT_COMPANY_SLUG))
+        db.session.commit()
+        g.pop('default_company_id', None)
+    company_id = default_company_id()
+
+    for mapper in db.Model.registry.mappers:
+        model = mapper.class_
+        if issubclass(model, TenantMixin) and mapper.local_table is not None:
+            db.session.execute(
+                model.__table__.update().where(model.__table__.c.company_id.is_(None)).values(company_id=company_id)
+            )
+    db.session.commit()
+    return company_id
+
+
+def create_company(name, slug):
+    """
+    Add a company
+
+    Raises:
+        ValueError: If the slug is empty or already taken
+    """
+    slug = (slug or '').strip().lower()
+    if not slug:
+        raise ValueError('Company slug is required')
+    if db.session.execute(db.select(Company.id).where(Company.slug == slug)).scalar() is not None:
+        raise ValueError(f'Company {slug} already exists')
+    company = Company(name=name, slug=slug)
+    db.session.add(company)
+    db.session.commit()
+    return company
+
+
+def get_company(slug):
+    return db.session.execute(db.select(Company).where(Company.slug == slug)).scalar()
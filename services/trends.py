@@ -0,0 +1,215 @@
+"""
+Daily IDP statistics for trend reports
+
+Once a day (``flask trends aggregate``, also a step of the nightly
+pipeline) the current IDP counts and progress completion totals are grouped
+by company, employee target role and status into daily_idp_stats, one row
+per group for that UTC day. Archived plans are included through
+archive_rollups, superseded plans are left out, matching the reports page.
+
+The job is idempotent: running it again on the same day replaces that day's
+rows. Days on which it did not run have no data point; statuses are not
+stored historically, so past days cannot be reconstructed.
+
+Each run is a full snapshot (three grouped scans of idps, progress and
+archive_rollups), not an increment on the previous day: IDP statuses,
+progress completion and employees' target roles are updated in place
+without a change timestamp or previous value, so there is no set of "rows
+changed since the last run" to apply as deltas. The history is what is
+filled incrementally, one day per run.
+
+Trend reports read only these rows, so a year-long chart is at most
+365 x roles x 3 small rows instead of a scan of idps and progress.
+"""
+from datetime import date, datetime, timedelta
+
+from models.models import db, User, IDP, Progress, ArchiveRollup, DailyIDPStat
+from services.cache import bump_data_version
+from services.tenancy import current_company_id
+
+TREND_STATUSES = ('pending', 'in_progress', 'completed')
+DEFAULT_TREND_DAYS = 90
+MAX_TREND_DAYS = 3660
+
+
+class TrendError(Exception):
+    """Raised for invalid trend ranges."""
+
+
+def _company_filter(column):
+    company_id = current_company_id()
+    return column == company_id if company_id is not None else db.true()
+
+
+def _snapshot():
+    """(company id, role, status) -> [IDPs, progress entries, completion sum]"""
+    users, idps, progress, archived = (User.__table__, IDP.__table__, Progress.__table__,
+                                       ArchiveRollup.__table__)
+    role = db.func.coalesce(users.c.target_role, '')
+    groups = {}
+
+    def add(key, idp_count=0, progress_count=0, completion_sum=0):
+        totals = groups.setdefault(key, [0, 0, 0])
+        totals[0] += int(idp_count or 0)
+        totals[1] += int(progress_count or 0)
+        totals[2] += int(completion_sum or 0)
+
+    live = idps.c.status.in_(TREND_STATUSES)
+    for company_id, role_name, status, count in db.session.execute(
+        db.select(idps.c.company_id, role, idps.c.status, db.func.count())
+        .join(users, users.c.id == idps.c.user_id)
+        .where(live, _company_filter(idps.c.company_id))
+        .group_by(idps.c.company_id, role, idps.c.status)
+    ):
+        add((company_id, role_name, status), idp_count=count)
+    for company_id, role_name, status, count, total in db.session.execute(
+        db.select(idps.c.company_id, role, idps.c.status, db.func.count(progress.c.completion),
+                  db.func.sum(progress.c.completion))
+        .join(idps, idps.c.id == progress.c.idp_id)
+        .join(users, users.c.id == idps.c.user_id)
+        .where(live, _company_filter(idps.c.company_id))
+        .group_by(idps.c.company_id, role, idps.c.status)
+    ):
+        add((company_id, role_name, status), progress_count=count, completion_sum=total)
+    for company_id, role_name, status, count, progress_count, completion_sum in db.session.execute(
+        db.select(archived.c.company_id, role, archived.c.status, db.func.sum(archived.c.idp_count),
+                  db.func.sum(archived.c.progress_count), db.func.sum(archived.c.completion_sum))
+        .join(users, users.c.id == archived.c.user_id)
+        .where(archived.c.status.in_(TREND_STATUSES), _company_filter(archived.c.company_id))
+        .group_by(archived.c.company_id, role, archived.c.status)
+    ):
+        add((company_id, role_name, status), count, progress_count, completion_sum)
+    return groups
+
+
+def aggregate_daily_stats():
+    """
+    Store today's IDP counts and completion per company, target role and status
+
+    Returns:
+        Number of rows written
+    """
+    day, now = datetime.utcnow().date(), datetime.utcnow()
+    groups = _snapshot()
+    table = DailyIDPStat.__table__
+    db.session.execute(table.delete().where(table.c.day == day, _company_filter(table.c.company_id)))
+    if groups:
+        db.session.execute(table.insert(), [
+            {
+                'company_id': company_id,
+                'day': day,
+                'role': role,
+                'status': status,
+                'idp_count': idp_count,
+                'progress_count': progress_count,
+                'completion_sum': completion_sum,
+                'computed_at': now,
+            }
+            for (company_id, role, status), (idp_count, progress_count, completion_sum) in groups.items()
+        ])
+    db.session.commit()
+    bump_data_version('daily_idp_stats')
+    return len(groups)
+
+
+def trend_range(start=None, end=None, days=None):
+    """
+    Resolve an inclusive day range (default: the last DEFAULT_TREND_DAYS days)
+
+    Args:
+        start: First day (date) or None
+        end: Last day (date) or None, default today
+        days: Length of the range when start is not given
+
+    Returns:
+        (start, end) dates
+
+    Raises:
+        TrendError: If the range is reversed or longer than MAX_TREND_DAYS
+    """
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=(days or DEFAULT_TREND_DAYS) - 1)
+    if start > end:
+        raise TrendError('The start of the range is after its end')
+    if (end - start).days + 1 > MAX_TREND_DAYS:
+        raise TrendError(f'Trend ranges are limited to {MAX_TREND_DAYS} days')
+    return start, end
+
+
+def trend_range_key(args):
+    """
+    The range a request's start/end/days arguments resolve to, for page ETags
+
+    Default ranges end today, so the key changes at midnight even when no
+    new rows were aggregated. Invalid ranges give an empty key.
+    """
+    try:
+        start, end = trend_range(parse_day(args.get('start')), parse_day(args.get('end')),
+                                 args.get('days', type=int))
+    except TrendError:
+        return ''
+    return f'{start}:{end}'
+
+
+def completion_trend(start, end, role=None):
+    """
+    Daily IDP counts and completion of the current company between two days
+
+    Args:
+        start: First day (date, inclusive)
+        end: Last day (date, inclusive)
+        role: Only employees targeting this role (optional)
+
+    Returns:
+        List of dicts (day, pending, in_progress, completed, total,
+        completion_rate, average_completion), one per aggregated day
+    """
+    query = (db.session.query(DailyIDPStat.day, DailyIDPStat.status, db.func.sum(DailyIDPStat.idp_count),
+                              db.func.sum(DailyIDPStat.progress_count), db.func.sum(DailyIDPStat.completion_sum))
+             .filter(DailyIDPStat.day.between(start, end)))
+    if role is not None:
+        query = query.filter(DailyIDPStat.role == role)
+
+    points = {}
+    for day, status, idp_count, progress_count, completion_sum in \
+            query.group_by(DailyIDPStat.day, DailyIDPStat.status).order_by(DailyIDPStat.day):
+        point = points.setdefault(day, dict({name: 0 for name in TREND_STATUSES}, progress_count=0, completion_sum=0))
+        point[status] = int(idp_count)
+        point['progress_count'] += int(progress_count)
+        point['completion_sum'] += int(completion_sum)
+
+    trend = []
+    for day, point in points.items():
+        total = sum(point[name] for name in TREND_STATUSES)
+        progress_count, completion_sum = point.pop('progress_count'), point.pop('completion_sum')
+        trend.append(dict(
+            point,
+            day=day,
+            total=total,
+            completion_rate=round(point['completed'] / total * 100, 1) if total else None,
+            average_completion=round(completion_sum / progress_count, 1) if progress_count else None,
+        ))
+    return trend
+
+
+def chart_points(trend, key, width, height):
+    """SVG polyline points for a 0-100 series of a trend, spread over the range's days"""
+    values = [(point['day'], point[key]) for point in trend if point[key] is not None]
+    if not values:
+        return ''
+    first, last = values[0][0], values[-1][0]
+    span = max((last - first).days, 1)
+    return ' '.join(
+        f'{(day - first).days / span * width:.1f},{height - value / 100 * height:.1f}'
+        for day, value in values
+    )
+
+
+def parse_day(value):
+    """YYYY-MM-DD -> date (None for empty values)"""
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value.strip())
+    except ValueError:
+        raise TrendError(f'Invalid date "{value}", expected YYYY-MM-DD')
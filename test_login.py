@@ -1,20 +1,37 @@
+"""
+Print the users in the configured database and check the default passwords
+
+Creates, seeds and upgrades the database like the app does, so it only runs
+when invoked directly (pytest collects this file but must not touch the
+tracked instance/database.db).
+
+Usage:
+    python test_login.py
+"""
 import sys
-sys.path.insert(0, 'D:/downloads/flask-hr-app')
+import os
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    from app import create_app
+    from models.models import User
+
+    app = create_app()
 
-from dotenv import load_dotenv
-load_dotenv()
+    with app.app_context():
+        users = User.query.all()
+        print(f"Total users: {len(users)}")
 
-from app import create_app
-from models.models import db, User
+        for user in users:
+            print(f"\nEmail: {user.email}")
+            print(f"Role: {user.role}")
+            print(f"Password check 'hr123': {user.check_password('hr123')}")
+            print(f"Password check 'emp123': {user.check_password('emp123')}")
 
-app = create_app()
 
-with app.app_context():
-    users = User.query.all()
-    print(f"Total users: {len(users)}")
-    
-    for user in users:
-        print(f"\nEmail: {user.email}")
-        print(f"Role: {user.role}")
-        print(f"Password check 'hr123': {user.check_password('hr123')}")
-        print(f"Password check 'emp123': {user.check_password('emp123')}")
+if __name__ == '__main__':
+    main()
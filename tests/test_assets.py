@@ -0,0 +1,140 @@
+"""
+Asset build and /assets serving against the real static/ tree
+
+Builds a copy of static/ (so the checkout's static/dist is left alone), then
+checks the manifest and the precompressed variants the app serves.
+
+Usage:
+    python -m pytest tests
+"""
+import gzip
+import json
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ['USE_MYSQL'] = 'False'
+
+from config import Config
+from services.assets import (DIST_DIR, MANIFEST_NAME, IMMUTABLE_CACHE_CONTROL, brotli, build_assets,
+                             load_manifest, minify_css, minify_js)
+
+
+@pytest.fixture(scope='module')
+def static_copy(tmp_path_factory):
+    static = tmp_path_factory.mktemp('assets') / 'static'
+    shutil.copytree(os.path.join(ROOT, 'static'), static, ignore=shutil.ignore_patterns(DIST_DIR))
+    manifest = build_assets(str(static))
+    return static, manifest
+
+
+@pytest.fixture(scope='module')
+def client(static_copy, tmp_path_factory):
+    workdir = tmp_path_factory.mktemp('app')
+    Config.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(workdir / 'test.db')
+    Config.TEMPLATE_CACHE_DIR = str(workdir / 'jinja')
+
+    from app import create_app
+    from services.audit import audit_writer
+
+    app = create_app()
+    app.config['TESTING'] = True
+    app.static_folder = str(static_copy[0])
+    load_manifest(app)
+    yield app.test_client()
+    audit_writer.shutdown()
+
+
+def _sources(static):
+    return sorted(
+        os.path.relpath(os.path.join(root, name), static).replace(os.sep, '/')
+        for root, dirs, files in os.walk(static)
+        if DIST_DIR not in os.path.relpath(root, static).split(os.sep)
+        for name in files if name.endswith(('.css', '.js'))
+    )
+
+
+def test_manifest_covers_every_stylesheet_and_script(static_copy):
+    static, manifest = static_copy
+    assert sorted(manifest) == _sources(static)
+
+    with open(static / DIST_DIR / MANIFEST_NAME, encoding='utf-8') as f:
+        assert json.load(f) == manifest
+
+    for name, hashed in manifest.items():
+        base, ext = os.path.splitext(name)
+        assert hashed.startswith(base + '.') and hashed.endswith(ext)
+        built = static / DIST_DIR / hashed
+        assert built.is_file()
+        assert gzip.decompress((static / DIST_DIR / (hashed + '.gz')).read_bytes()) == built.read_bytes()
+        if brotli is not None:
+            assert brotli.decompress((static / DIST_DIR / (hashed + '.br')).read_bytes()) == built.read_bytes()
+
+
+def test_build_is_reproducible(static_copy, tmp_path):
+    static, manifest = static_copy
+    again = tmp_path / 'static'
+    shutil.copytree(static, again, ignore=shutil.ignore_patterns(DIST_DIR))
+    assert build_assets(str(again)) == manifest
+    for hashed in manifest.values():
+        gz = hashed + '.gz'
+        assert (again / DIST_DIR / gz).read_bytes() == (static / DIST_DIR / gz).read_bytes()
+
+
+@pytest.mark.parametrize('encoding, suffix', [('gzip', '.gz'), ('br', '.br'), ('identity', '')])
+def test_assets_served_precompressed(static_copy, client, encoding, suffix):
+    if encoding == 'br' and brotli is None:
+        pytest.skip('brotli is not installed')
+    static, manifest = static_copy
+    for hashed in manifest.values():
+        response = client.get(f'/assets/{hashed}', headers={'Accept-Encoding': encoding})
+        assert response.status_code == 200
+        assert response.headers.get('Content-Encoding') == (encoding if suffix else None)
+        assert response.headers['Cache-Control'] == IMMUTABLE_CACHE_CONTROL
+        assert 'Accept-Encoding' in response.headers['Vary']
+        assert response.data == (static / DIST_DIR / (hashed + suffix)).read_bytes()
+        response.close()
+
+
+def test_pages_link_hashed_assets(static_copy, client):
+    _, manifest = static_copy
+    page = client.get('/login').get_data(as_text=True)
+    assert f'/assets/{manifest["css/base.css"]}' in page
+
+
+def test_minify_css_keeps_strings_urls_and_selectors():
+    css = '''
+    /* header "quoted" */
+    a :hover , p > a { color : red ; }
+    .icon::before { content: "a:  b; }"; }
+    q { quotes: '\\'  x' '  y'; }
+    .bg { background: url(data:image/svg+xml;utf8,<svg a="1"/>) no-repeat, url( "x y.png" ); }
+    .w { width: calc(100% - 10px); }
+    @media (min-width: 600px) and (max-width: 900px) { a { margin: 0 auto } }
+    '''
+    assert minify_css(css) == (
+        'a :hover,p>a{color :red}'
+        '.icon::before{content:"a:  b; }"}'
+        "q{quotes:'\\'  x' '  y'}"
+        '.bg{background:url(data:image/svg+xml;utf8,<svg a="1"/>) no-repeat,url( "x y.png" )}'
+        '.w{width:calc(100% - 10px)}'
+        '@media (min-width:600px) and (max-width:900px){a{margin:0 auto}}'
+    )
+
+
+def test_minify_js_keeps_template_literals():
+    js = 'function f() {\n    // comment\n    return `a\n    b`;\n}\n'
+    assert minify_js(js) == 'function f() {\nreturn `a\n    b`;\n}\n'
+
+
+def test_minify_js_keeps_code_after_block_comments():
+    js = ('/* init */ var x = init();\n'
+          '/* a */ /* b */ run(x);\n'
+          '/*\n * multi\n */ done();\n'
+          '/**/\n'
+          '/* only a comment */\n')
+    assert minify_js(js) == 'var x = init();\nrun(x);\ndone();\n'
@@ -0,0 +1,91 @@
+"""
+Skill matching: near-miss pairs stay gaps, aliases and spelling variants match
+
+Uses a fixed vocabulary like the default role catalog, so the scores do not
+depend on a database.
+
+Usage:
+    python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ['USE_MYSQL'] = 'False'
+
+from config import Config
+from ai_engine.gap_analysis import DEFAULT_MATCH_THRESHOLD, analyze_skill_gap
+from ai_engine.skill_matcher import IMPLIED_SKILL_SCORE, SKILL_ALIASES, SkillMatcher
+
+CATALOG = [
+    'Python', 'SQL', 'Machine Learning', 'Statistics', 'Pandas', 'Data Visualization',
+    'JavaScript', 'React', 'Node.js', 'PostgreSQL', 'REST APIs', 'Git',
+    'Linux', 'Docker', 'Kubernetes', 'CI/CD', 'AWS', 'Terraform', 'Monitoring',
+    'React Native', 'Docker Compose', 'Jython', 'Java',
+]
+
+
+@pytest.fixture(scope='module')
+def matcher():
+    return SkillMatcher(set(CATALOG) | set(SKILL_ALIASES.values()))
+
+
+def score(matcher, required, held):
+    return float(matcher.similarity([required], [held])[0, 0])
+
+
+def test_default_threshold_matches_config():
+    assert Config.SKILL_MATCH_THRESHOLD == DEFAULT_MATCH_THRESHOLD
+
+
+@pytest.mark.parametrize('required, held', [
+    ('React', 'React Native'),
+    ('React Native', 'React'),
+    ('Python', 'Jython'),
+    ('Jython', 'Python'),
+    ('Docker', 'Docker Compose'),
+    ('Docker Compose', 'Docker'),
+    ('JavaScript', 'Java'),
+    ('Java', 'JavaScript'),
+])
+def test_different_skills_do_not_match(matcher, required, held):
+    assert score(matcher, required, held) < DEFAULT_MATCH_THRESHOLD
+
+
+@pytest.mark.parametrize('required, held', [
+    ('PostgreSQL', 'Postgres'),
+    ('React', 'React.js'),
+    ('JavaScript', 'JS'),
+    ('Kubernetes', 'K8s'),
+    ('Node.js', 'NodeJS'),
+    ('Machine Learning', 'ml'),
+])
+def test_aliases_are_exact_matches(matcher, required, held):
+    assert score(matcher, required, held) == pytest.approx(1.0)
+
+
+@pytest.mark.parametrize('required, held', [
+    ('Machine Learning', 'Machine-Learning'),
+    ('Statistics', 'Statistic'),
+    ('Data Visualization', 'Data Visualisation'),
+    ('Docker', 'Dockers'),
+])
+def test_spelling_variants_match(matcher, required, held):
+    assert score(matcher, required, held) >= DEFAULT_MATCH_THRESHOLD
+
+
+def test_implied_skill_gets_partial_credit(matcher):
+    assert score(matcher, 'SQL', 'PostgreSQL') == pytest.approx(IMPLIED_SKILL_SCORE)
+    # Not the other way round
+    assert score(matcher, 'PostgreSQL', 'SQL') < DEFAULT_MATCH_THRESHOLD
+
+
+def test_gap_analysis_keeps_near_misses_as_gaps(matcher):
+    gap = analyze_skill_gap(['React Native', 'Docker', 'Postgres'], ['React', 'Docker Compose', 'PostgreSQL'],
+                            matcher=matcher)
+    assert gap['missing_skills'] == ['React', 'Docker Compose']
+    assert gap['matching_skills'] == ['PostgreSQL']
+    assert gap['partial_matches'] == []